@@ -0,0 +1,624 @@
+#!/usr/bin/env python3
+# Performance benchmarks for setdeb's Qt-free machinery. Run: python3 bench.py <benchmark> [options]
+
+import sys
+import os
+import json
+import time
+import platform
+import tempfile
+import statistics
+import argparse
+import importlib.util
+import subprocess
+import threading
+import queue
+import shutil
+
+from debcore import (AnalysisCache, AptListsIndex, ArtifactStore, DebFile, DpkgStatusIndex, DropFolderWatcher,
+                     FileOwnerIndex, HelperClient, ProcessRunner, apt_record_phase, verify_payload)
+from setdeb_cli import HeadlessWorker
+from bench_fixtures import (fake_tools_env, file_repository_options, install_fake_tools, make_file_repository,
+                            make_status_file, make_synthetic_deb, update_file_repository, write_apt_transcript)
+
+# Fake apt that floods stdout and stderr at the same time
+FLOOD_SCRIPT = r"""
+import sys
+lines = int(sys.argv[1])
+out, err = sys.stdout, sys.stderr
+for i in range(lines):
+    out.write(f"Unpacking package-{i} (1.0-{i}) over (0.9) ...\n")
+    err.write(f"W: warning number {i} from a very chatty maintainer script\n")
+out.flush()
+err.flush()
+"""
+
+
+def _legacy_readline(command, timeout):
+    # The pre-ProcessRunner pattern: stdout line by line, stderr only after wait()
+    result = {}
+
+    def run():
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                   text=True, bufsize=1, errors='replace')
+        count = sum(1 for _ in iter(process.stdout.readline, ''))
+        process.wait()
+        count += len(process.stderr.read().splitlines())
+        result['lines'] = count
+
+    thread = threading.Thread(target=run, daemon=True)
+    started = time.perf_counter()
+    thread.start()
+    thread.join(timeout)
+    return result.get('lines'), time.perf_counter() - started
+
+
+def bench_flood(args):
+    command = [sys.executable, '-c', FLOOD_SCRIPT, str(args.lines)]
+    counted = [0]
+
+    def on_line(stream, line):
+        counted[0] += 1
+
+    runner = ProcessRunner(command, on_line)
+    started = time.perf_counter()
+    runner.run()
+    elapsed = time.perf_counter() - started
+    print(f"ProcessRunner: {counted[0]} lines, {runner.byte_count / 1e6:.1f} MB in {elapsed:.3f}s "
+          f"({counted[0] / elapsed:,.0f} lines/s, {runner.byte_count / 1e6 / elapsed:.1f} MB/s)")
+
+    if args.legacy:
+        lines, elapsed = _legacy_readline(command, args.timeout)
+        if lines is None:
+            print(f"readline loop: stalled (no progress after {args.timeout:.0f}s, stderr pipe full)")
+        else:
+            print(f"readline loop: {lines} lines in {elapsed:.3f}s ({lines / elapsed:,.0f} lines/s)")
+
+
+def bench_cold_start(args):
+    # Whole-process wall time of the headless analysis, the number automation actually pays.
+    # Payload hashing grows with the package, not with startup, so it is left out unless --verify
+    setdeb = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'setdeb.py')
+    command = [sys.executable, setdeb, '--analyze', '--json'] + ([] if args.verify else ['--no-verify']) + args.debs
+    baseline, samples = [], []
+    for _ in range(args.runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, '-c', 'pass'])
+        baseline.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        subprocess.run(command, stdout=subprocess.DEVNULL, check=True)
+        samples.append(time.perf_counter() - started)
+    median = statistics.median(samples) * 1000
+    print(f"--analyze cold start: median {median:.1f} ms, min {min(samples) * 1000:.1f} ms "
+          f"(bare interpreter {statistics.median(baseline) * 1000:.1f} ms) over {args.runs} runs")
+    if median > args.budget:
+        print(f"over budget ({args.budget:.0f} ms)")
+        return 1
+    return 0
+
+
+def bench_startup(args):
+    # The wizard under the offscreen platform: wall time from spawning the process to its first
+    # paint and to "analysis complete", as recorded by SETDEB_STARTUP_PROBE. The wizard closes itself
+    # once both are known.
+    if importlib.util.find_spec('PySide6') is None:
+        print("PySide6 is not installed")
+        return 1
+    setdeb = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'setdeb.py')
+    scratch = tempfile.mkdtemp(prefix='setdeb-startup-')
+    probe = os.path.join(scratch, 'probe.json')
+    env = dict(os.environ, SETDEB_STARTUP_PROBE=probe)
+    env.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    paint, complete = [], []
+    try:
+        for _ in range(args.runs):
+            if os.path.exists(probe):
+                os.unlink(probe)
+            if args.cold:
+                # A fresh cache directory each run: nothing analysed before is reused
+                env['XDG_CACHE_HOME'] = tempfile.mkdtemp(dir=scratch)
+            started = time.time()
+            subprocess.run([sys.executable, setdeb] + args.debs, env=env, timeout=args.timeout, check=False,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                with open(probe) as f:
+                    marks = json.load(f)
+            except (OSError, ValueError):
+                print("the wizard exited without reporting its startup times")
+                return 1
+            paint.append(marks['first_paint'] - started)
+            complete.append(marks['analysis_complete'] - started)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    interactive = statistics.median(max(p, c) for p, c in zip(paint, complete)) * 1000
+    print(f"first paint: median {statistics.median(paint) * 1000:.1f} ms, min {min(paint) * 1000:.1f} ms")
+    print(f"analysis complete: median {statistics.median(complete) * 1000:.1f} ms, "
+          f"min {min(complete) * 1000:.1f} ms")
+    print(f"interactive (both): median {interactive:.1f} ms over {args.runs} runs")
+    if interactive > args.budget:
+        print(f"over budget ({args.budget:.0f} ms)")
+        return 1
+    return 0
+
+
+def bench_decompress(args):
+    # Decode-only and decode+verify throughput of data.tar per worker count
+    directory = args.dir or tempfile.mkdtemp(prefix='setdeb-bench-')
+    for compression in args.formats:
+        path = os.path.join(directory, f'synthetic-{args.size}M-{compression}.deb')
+        if not os.path.exists(path):
+            started = time.perf_counter()
+            make_synthetic_deb(path, files=max(1, args.size // 4), file_size=4 << 20, compression=compression)
+            print(f"built {path} in {time.perf_counter() - started:.1f}s")
+        deb = DebFile(path)
+        for workers in args.workers:
+            started = time.perf_counter()
+            total = 0
+            with deb.open_member(deb.data_member, workers) as stream:
+                while chunk := stream.read(1 << 20):
+                    total += len(chunk)
+            decode = time.perf_counter() - started
+            report = verify_payload(deb, workers=workers, decode_workers=workers)
+            print(f"{compression:>4} {workers} worker(s): decode {total / 1e6 / decode:7.1f} MB/s, "
+                  f"decode+verify {report.mb_per_s:7.1f} MB/s ({'ok' if report.ok else 'FAILED'})")
+        if not args.keep:
+            os.unlink(path)
+
+
+def bench_owners(args):
+    # File-conflict check against a synthetic dpkg info dir (packages x files-per-package .list files)
+    directory = tempfile.mkdtemp(prefix='setdeb-bench-')
+    info_dir = os.path.join(directory, 'info')
+    os.makedirs(info_dir)
+    for i in range(args.packages):
+        paths = ['/.', '/usr', '/usr/lib', f'/usr/lib/pkg{i}'] + \
+                [f'/usr/lib/pkg{i}/file{j}' for j in range(args.files_per_package)]
+        with open(os.path.join(info_dir, f'pkg{i}.list'), 'w') as f:
+            f.write('\n'.join(paths) + '\n')
+    manifest = [(f'/opt/new/file{i}', 0, 'f') for i in range(args.manifest)] + [('/usr/lib/pkg1/file1', 0, 'f')]
+
+    def run(label):
+        index = FileOwnerIndex(info_dir, os.devnull, cache_dir=os.path.join(directory, 'cache'))
+        started = time.perf_counter()
+        read = index.refresh()
+        loaded = time.perf_counter()
+        conflicts = index.conflicts(manifest, 'new')
+        done = time.perf_counter()
+        print(f"{label}: refresh {(loaded - started) * 1000:.0f} ms ({read} lists read, {len(index.paths)} paths), "
+              f"check {len(manifest)} files {(done - loaded) * 1000:.0f} ms, total {(done - started) * 1000:.0f} ms, "
+              f"{len(conflicts)} conflict(s)")
+
+    run("cold")
+    run("cached")
+    with open(os.path.join(info_dir, 'pkg0.list'), 'a') as f:
+        f.write('/usr/bin/added\n')
+    run("one list changed")
+    shutil.rmtree(directory)
+
+
+def bench_verify(args):
+    # md5sums verification throughput per pool size; decompression stays on one thread
+    for workers in args.workers:
+        best = None
+        for _ in range(args.runs):
+            report = verify_payload(DebFile(args.deb), workers=workers)
+            if best is None or report.seconds < best.seconds:
+                best = report
+        status = "ok" if best.ok else f"{len(best.mismatched)} mismatched, {len(best.missing)} missing"
+        print(f"{workers} worker(s): {best.checked} files, {best.bytes / 1e6:.1f} MB in {best.seconds:.3f}s "
+              f"({best.mb_per_s:.1f} MB/s) {status}")
+
+
+# --- Regression suite ---
+# Each metric is (value, unit, better); results go to a JSON file that later runs compare against.
+SUITE_PACKAGES = {
+    # name: make_synthetic_deb arguments (quick mode shrinks the big ones)
+    'small-xz': dict(files=64, file_size=(512, 64 << 10), compression='xz'),
+    'many-files-gz': dict(files=20000, file_size=(64, 4096), compression='gz', control_size=8192),
+    'large-zst': dict(files=64, file_size=1 << 20, compression='zst'),
+}
+
+
+class _SuiteWorker(HeadlessWorker):
+    # A headless worker whose caches and databases all live in the benchmark's scratch directory
+    def __init__(self, scratch, status_path):
+        super().__init__()
+        self.analysis_cache = AnalysisCache(directory=os.path.join(scratch, 'cache'))
+        self.status_index = DpkgStatusIndex(status_path, os.devnull)
+        self.lists_index = AptListsIndex(os.path.join(scratch, 'lists'))
+        self.owner_index = FileOwnerIndex(os.path.join(scratch, 'info'), os.devnull, cache_dir=os.path.join(scratch, 'cache'))
+        self.artifact_store = ArtifactStore(os.path.join(scratch, 'cache'))
+        self.prefetch_dir = os.path.join(scratch, 'archives')
+        self.log_ring.open_file = lambda directory=None, keep=20: os.devnull
+
+
+def _median_time(function, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+def _suite_analyze(results, scratch, status_path, debs, repeat):
+    for name, path in debs.items():
+        def cold():
+            shutil.rmtree(os.path.join(scratch, 'cache'), ignore_errors=True)
+            _SuiteWorker(scratch, status_path).analyze_debs([path])
+        results[f'analyze_cold.{name}'] = (_median_time(cold, repeat) * 1000, 'ms', 'lower')
+
+        def warm():
+            worker = _SuiteWorker(scratch, status_path)
+            worker.analyze_debs([path])
+        results[f'analyze_warm.{name}'] = (_median_time(warm, repeat) * 1000, 'ms', 'lower')
+
+
+def _suite_check_installed(results, scratch, status_path, repeat, queries=20000):
+    worker = _SuiteWorker(scratch, status_path)
+    results['check_if_installed.first_ms'] = (
+        _median_time(lambda: _SuiteWorker(scratch, status_path).check_if_installed('pkg1', '1.0'), repeat) * 1000,
+        'ms', 'lower')
+    worker.check_if_installed('pkg0', '1.0')
+
+    def many():
+        for i in range(queries):
+            worker.check_if_installed(f'pkg{i % 4000}', '1.0-1', 'amd64')
+    results['check_if_installed.per_query_us'] = (_median_time(many, repeat) / queries * 1e6, 'us', 'lower')
+
+
+def _suite_install_loop(results, scratch, status_path, deb, repeat, speed):
+    # run_installation_command against fake sudo + apt replaying a synthetic transcript
+    tools = install_fake_tools(os.path.join(scratch, 'bin'))
+    transcript = write_apt_transcript(os.path.join(scratch, 'apt.transcript'), packages=200, lines_per_package=100)
+    with open(transcript, encoding='utf-8') as f:
+        lines = sum(1 for line in f if not line.split('\t', 2)[1] == '3')
+    saved = dict(os.environ)
+    os.environ.update(fake_tools_env(tools, transcript, speed))
+    try:
+        def run():
+            worker = _SuiteWorker(scratch, status_path)
+            worker.progress_engine = worker._progress_engine([deb])
+            if worker.run_installation_command(['apt', 'install', '--yes', deb], 'password') != 0:
+                raise RuntimeError("fake install failed")
+        elapsed = _median_time(run, repeat)
+    finally:
+        os.environ.clear()
+        os.environ.update(saved)
+    results['install_loop.lines_per_s'] = (lines / elapsed, 'lines/s', 'higher')
+    results['install_loop.wall_ms'] = (elapsed * 1000, 'ms', 'lower')
+
+
+def _suite_ui_log(results, scratch, status_path, repeat, lines=300000, flush_ms=100):
+    # The InstallationPage pattern: a worker thread logs, the UI drains every flush_ms and appends
+    # one joined block. With PySide6 installed the block goes into a real (offscreen) QPlainTextEdit.
+    view = None
+    try:
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+        from PySide6.QtWidgets import QApplication, QPlainTextEdit
+        application = QApplication.instance() or QApplication([])
+        view = QPlainTextEdit()
+        view.setMaximumBlockCount(10000)
+    except ImportError:
+        application = None
+
+    delivered = [0, 0]
+
+    def run():
+        worker = _SuiteWorker(scratch, status_path)
+        done = threading.Event()
+
+        def produce():
+            for i in range(lines):
+                worker.log(f"[APT] Unpacking package-{i} (1.0-{i}) over (0.9) ...")
+            done.set()
+        threading.Thread(target=produce, daemon=True).start()
+        while True:
+            finished = done.wait(flush_ms / 1000)
+            batch, dropped = worker.log_ring.drain()
+            delivered[0] += len(batch)
+            delivered[1] += dropped
+            if batch and view is not None:
+                view.appendPlainText("\n".join(batch))
+                application.processEvents()
+            if finished and not batch:
+                break
+    elapsed = _median_time(run, repeat)
+    results['ui_log.lines_per_s'] = (lines / elapsed, 'lines/s', 'higher')
+    results['ui_log.shown_fraction'] = (delivered[0] / (delivered[0] + delivered[1]), 'ratio', 'higher')
+
+
+def _suite_meta():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ''
+    return {'commit': commit, 'python': sys.version.split()[0], 'machine': platform.machine(),
+            'cpus': os.cpu_count(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+
+def compare_results(baseline, current, threshold):
+    # -> list of regressed metric names; prints one line per metric present in both runs
+    regressions = []
+    for name, entry in sorted(current['results'].items()):
+        old = baseline['results'].get(name)
+        if old is None or not old['value']:
+            print(f"  {name:<40} {entry['value']:>12.2f} {entry['unit']:<8} (new)")
+            continue
+        change = (entry['value'] - old['value']) / old['value']
+        worse = change > threshold if entry['better'] == 'lower' else change < -threshold
+        if worse:
+            regressions.append(name)
+        print(f"  {name:<40} {entry['value']:>12.2f} {entry['unit']:<8} {change:+7.1%} vs {old['value']:.2f}"
+              f"{'  REGRESSION' if worse else ''}")
+    return regressions
+
+
+def bench_suite(args):
+    scratch = tempfile.mkdtemp(prefix='setdeb-suite-')
+    results = {}
+    try:
+        os.makedirs(os.path.join(scratch, 'info'))
+        os.makedirs(os.path.join(scratch, 'lists'))
+        status_path = make_status_file(os.path.join(scratch, 'status'), packages=3000)
+        debs = {}
+        for name, spec in SUITE_PACKAGES.items():
+            spec = dict(spec)
+            if args.quick:
+                spec['files'] = max(16, spec['files'] // 10)
+            debs[name] = make_synthetic_deb(os.path.join(scratch, name + '.deb'), name=name.split('-')[0], **spec)
+        print(f"running suite in {scratch} (repeat {args.repeat})", file=sys.stderr)
+        _suite_analyze(results, scratch, status_path, debs, args.repeat)
+        _suite_check_installed(results, scratch, status_path, args.repeat)
+        _suite_install_loop(results, scratch, status_path, debs['small-xz'], args.repeat, args.speed)
+        _suite_ui_log(results, scratch, status_path, args.repeat)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    report = {'meta': _suite_meta(), 'quick': args.quick,
+              'results': {name: {'value': round(value, 4), 'unit': unit, 'better': better}
+                          for name, (value, unit, better) in results.items()}}
+    status = 0
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('quick') != args.quick:
+            print("warning: baseline and this run differ in --quick", file=sys.stderr)
+        print(f"compared with {args.compare} (commit {baseline['meta'].get('commit') or '?'}):")
+        regressions = compare_results(baseline, report, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} metric(s) regressed by more than {args.threshold:.0%}")
+            status = 1
+    else:
+        for name, entry in sorted(report['results'].items()):
+            print(f"  {name:<40} {entry['value']:>12.2f} {entry['unit']}")
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write('\n')
+    return status
+
+
+def bench_prefetch(args):
+    # Background download of dependencies from a file:// repository: first fetch, reuse of the
+    # download directory, a fresh directory served from the artifact store, and a cancel
+    scratch = tempfile.mkdtemp(prefix='setdeb-prefetch-')
+    try:
+        repository = os.path.join(scratch, 'repo')
+        names = make_file_repository(repository, args.packages, args.files, args.file_size << 10)
+        options = file_repository_options(repository, os.path.join(scratch, 'apt'))
+        update_file_repository(options)
+        app = make_synthetic_deb(os.path.join(scratch, 'benchapp.deb'), files=4, name='benchapp',
+                                 depends=', '.join(names))
+        worker = _SuiteWorker(scratch, make_status_file(os.path.join(scratch, 'status'), 100))
+        worker.lists_index = AptListsIndex(os.path.join(scratch, 'apt', 'lists'))
+        worker.prefetch_options = options
+        worker.analyze_debs([app])
+        plan = worker.install_plan
+        print(f"plan: {len(plan['install'])} dependencies, {plan['download_size'] / 1e6:.1f} MB to download")
+
+        def fetch(label, cancel_after=None):
+            worker.prefetcher = None
+            started = time.perf_counter()
+            if not worker.start_prefetch():
+                print(f"{label}: not started")
+                return 1
+            if cancel_after is not None:
+                time.sleep(cancel_after)
+                worker.cancel_prefetch()
+            worker.prefetcher.wait()
+            elapsed = time.perf_counter() - started
+            found = worker.prefetcher.archives_for(plan['install'])
+            state = "cancelled" if worker.prefetcher.cancelled else f"exit {worker.prefetcher.returncode}"
+            if worker.prefetcher.running() or worker.prefetcher.output or cancel_after is not None:
+                state += ", apt-get ran"
+            print(f"{label}: {elapsed * 1000:.0f} ms, {len(found)}/{len(plan['install'])} archives ready ({state})")
+            return 0 if cancel_after is not None or len(found) == len(plan['install']) else 1
+
+        failed = fetch("first fetch")
+        failed |= fetch("reuse")
+        shutil.rmtree(worker.prefetch_dir)
+        failed |= fetch("from store")
+        shutil.rmtree(worker.prefetch_dir)
+        shutil.rmtree(worker.artifact_store.directory)
+        failed |= fetch("cancel", cancel_after=args.cancel_after)
+        for line in worker.prefetcher.output if failed else ():
+            print(f"  apt-get: {line}")
+        return failed
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+def bench_watch(args):
+    # Drop-folder ingest: a burst of packages copied into a watched directory, then the same
+    # files copied again (new timestamps, same content, so the analysis cache answers)
+    scratch = tempfile.mkdtemp(prefix='setdeb-watch-')
+    try:
+        source, drop = os.path.join(scratch, 'source'), os.path.join(scratch, 'drop')
+        os.makedirs(source)
+        os.makedirs(drop)
+        for i in range(args.packages):
+            make_synthetic_deb(os.path.join(source, f'pkg{i}.deb'), files=args.files, file_size=(256, 8192),
+                               compression='gz', name=f'pkg{i}', seed=i)
+        worker = _SuiteWorker(scratch, make_status_file(os.path.join(scratch, 'status'), 100))
+        worker.analysis_cache.hash_fallback = True
+        batches = queue.Queue()
+        watcher = DropFolderWatcher(drop, batches.put, settle=args.settle)
+        watcher.start()
+        threads = threading.active_count()
+
+        def burst(label):
+            started = time.perf_counter()
+            for i in range(args.packages):
+                shutil.copy(os.path.join(source, f'pkg{i}.deb'), os.path.join(drop, f'pkg{i}.deb'))
+            copied = time.perf_counter()
+            seen, count = set(), 0
+            while len(seen) < args.packages:
+                paths = batches.get(timeout=60)
+                while not batches.empty():
+                    # the CLI analyses everything queued as one batch too
+                    paths += batches.get_nowait()
+                worker.analyze_debs(paths)
+                seen.update(paths)
+                count += 1
+            done = time.perf_counter()
+            analysed = len(worker.package_infos)
+            print(f"{label}: {args.packages} files copied in {(copied - started) * 1000:.0f} ms, all analysed "
+                  f"{(done - copied) * 1000:.0f} ms later in {count} batch(es) (settle {args.settle * 1000:.0f} ms), "
+                  f"{analysed} in the last batch, peak threads {max(threads, threading.active_count())}")
+
+        burst("first burst")
+        burst("same content again")
+        watcher.stop()
+        print(f"watcher: {watcher.mode}")
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+# Explicit triggers of the fake dpkg triggers directory and the package interested in each
+BENCH_TRIGGERS = {'ldconfig': 'libc-bin', 'update-initramfs': 'initramfs-tools', 'bench-cache': 'bench-handler'}
+
+
+def bench_triggers(args):
+    # Back-to-back install jobs through the helper's stand-in executor: dpkg triggers run by every
+    # job (apt's default) against deferred to one pass after the last queued job
+    from setdeb_helper import HelperServer, StandInExecutor
+    scratch = tempfile.mkdtemp(prefix='setdeb-triggers-')
+    try:
+        triggers_dir = os.path.join(scratch, 'triggers')
+        os.makedirs(triggers_dir)
+        for trigger, handler in BENCH_TRIGGERS.items():
+            with open(os.path.join(triggers_dir, trigger), 'w', encoding='utf-8') as f:
+                f.write(handler + '\n')
+        activate = ''.join(f'activate-noawait {trigger}\n' for trigger in BENCH_TRIGGERS)
+        debs = [make_synthetic_deb(os.path.join(scratch, f'pkg{i}.deb'), files=4, compression='gz', name=f'pkg{i}',
+                                   seed=i, triggers=activate) for i in range(args.jobs)]
+        for defer in (False, True):
+            path = os.path.join(scratch, f'helper-{int(defer)}.sock')
+            server = HelperServer(path, os.getuid(), StandInExecutor(args.delay, args.trigger_delay, triggers_dir))
+            ready = threading.Event()
+            thread = threading.Thread(target=server.serve_forever, kwargs={'on_ready': ready.set}, daemon=True)
+            thread.start()
+            ready.wait(10)
+            runs, finished = 0, 0
+            started = time.perf_counter()
+            with HelperClient(path, stand_in=True) as client:
+                for deb in debs:
+                    client.send("install", debs=[deb], defer_triggers=defer)
+                while finished < len(debs):
+                    event = client.read_event(60)
+                    if event is None:
+                        raise RuntimeError("the helper stopped answering")
+                    if event['event'] == 'status' and apt_record_phase(event['record']) == 'triggers':
+                        runs += 1
+                    elif event['event'] == 'finished':
+                        finished += 1
+                elapsed = time.perf_counter() - started
+                client.send("shutdown")
+            thread.join(10)
+            print(f"{'deferred' if defer else 'per job'}: {len(debs)} jobs in {elapsed * 1000:.0f} ms, "
+                  f"{runs} trigger runs ({len(BENCH_TRIGGERS)} triggers, {args.trigger_delay * 1000:.0f} ms each)")
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="setdeb benchmarks")
+    sub = parser.add_subparsers(dest='benchmark', required=True)
+
+    flood = sub.add_parser('flood', help="install pipeline I/O against a fake apt flooding stdout and stderr")
+    flood.add_argument('--lines', type=int, default=200000, help="lines per stream")
+    flood.add_argument('--legacy', action='store_true', help="also run the old blocking readline loop")
+    flood.add_argument('--timeout', type=float, default=10.0, help="give up on the legacy loop after N seconds")
+    flood.set_defaults(func=bench_flood)
+
+    cold = sub.add_parser('cold-start', help="wall time of 'setdeb.py --analyze --json' in a fresh process")
+    cold.add_argument('debs', nargs='+')
+    cold.add_argument('--runs', type=int, default=20)
+    cold.add_argument('--budget', type=float, default=100.0, help="fail above this median, in ms")
+    cold.add_argument('--verify', action='store_true', help="include md5sums verification of the payload")
+    cold.set_defaults(func=bench_cold_start)
+
+    startup = sub.add_parser('startup', help="wizard time to first paint and to analysis complete (offscreen)")
+    startup.add_argument('debs', nargs='+')
+    startup.add_argument('--runs', type=int, default=10)
+    startup.add_argument('--budget', type=float, default=1000.0, help="fail above this median, in ms")
+    startup.add_argument('--timeout', type=float, default=30.0, help="seconds before a run is abandoned")
+    startup.add_argument('--cold', action='store_true', help="empty analysis cache for every run")
+    startup.set_defaults(func=bench_startup)
+
+    verify = sub.add_parser('verify', help="payload md5sums verification throughput")
+    verify.add_argument('deb')
+    verify.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    verify.add_argument('--runs', type=int, default=3, help="best of N per pool size")
+    verify.set_defaults(func=bench_verify)
+
+    decompress = sub.add_parser('decompress', help="parallel xz/zstd decoding on synthetic packages")
+    decompress.add_argument('--size', type=int, default=1024, help="payload size in MB")
+    decompress.add_argument('--formats', nargs='+', default=['xz', 'zst', 'gz'], choices=['xz', 'zst', 'gz', 'none'])
+    decompress.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    decompress.add_argument('--dir', help="where to build (and with --keep, reuse) the packages")
+    decompress.add_argument('--keep', action='store_true')
+    decompress.set_defaults(func=bench_decompress)
+
+    owners = sub.add_parser('owners', help="file-ownership conflict check against synthetic dpkg lists")
+    owners.add_argument('--packages', type=int, default=3000)
+    owners.add_argument('--files-per-package', type=int, default=100)
+    owners.add_argument('--manifest', type=int, default=100000, help="files in the package being checked")
+    owners.set_defaults(func=bench_owners)
+
+    prefetch = sub.add_parser('prefetch', help="background dependency download from a file:// repository")
+    prefetch.add_argument('--packages', type=int, default=20, help="dependencies in the repository")
+    prefetch.add_argument('--files', type=int, default=32, help="files per dependency")
+    prefetch.add_argument('--file-size', type=int, default=64, help="KiB per file")
+    prefetch.add_argument('--cancel-after', type=float, default=0.05, help="seconds before cancelling")
+    prefetch.set_defaults(func=bench_prefetch)
+
+    watch = sub.add_parser('watch', help="drop-folder ingest of a burst of packages")
+    watch.add_argument('--packages', type=int, default=200)
+    watch.add_argument('--files', type=int, default=20, help="files per package")
+    watch.add_argument('--settle', type=float, default=0.5, help="seconds a file must be unchanged")
+    watch.set_defaults(func=bench_watch)
+
+    triggers = sub.add_parser('triggers', help="back-to-back installs with dpkg triggers per job and deferred")
+    triggers.add_argument('--jobs', type=int, default=10)
+    triggers.add_argument('--delay', type=float, default=0.01, help="stand-in seconds per unpack/setup step")
+    triggers.add_argument('--trigger-delay', type=float, default=0.1, help="stand-in seconds per trigger")
+    triggers.set_defaults(func=bench_triggers)
+
+    suite = sub.add_parser('suite', help="regression suite: analysis, installed checks, install loop, UI log")
+    suite.add_argument('--quick', action='store_true', help="smaller packages, for a fast smoke run")
+    suite.add_argument('--repeat', type=int, default=3, help="median of N runs per metric")
+    suite.add_argument('--speed', type=float, default=0.0, help="fake apt replay speed, 0 = as fast as possible")
+    suite.add_argument('--save', metavar='JSON', help="write the results as a baseline file")
+    suite.add_argument('--compare', metavar='JSON', help="compare against a saved baseline")
+    suite.add_argument('--threshold', type=float, default=0.10, help="relative change counted as regression")
+    suite.set_defaults(func=bench_suite)
+
+    args = parser.parse_args(argv)
+    return args.func(args) or 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
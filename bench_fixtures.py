@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+# Reproducible inputs for bench.py: synthetic .deb files and dpkg databases, plus fake
+# sudo/apt/dpkg-deb commands that replay recorded output from a directory put first on PATH.
+
+import io
+import os
+import sys
+import random
+import shutil
+import tarfile
+import hashlib
+import subprocess
+
+# --- Synthetic packages ---
+def _ar_member(name, data):
+    header = f"{name:<16}{0:<12}{0:<6}{0:<6}{'100644':<8}{len(data):<10}`\n".encode()
+    return header + data + (b"\n" if len(data) % 2 else b"")
+
+
+class _ZstdFrames(io.RawIOBase):
+    # Compresses every piece_size bytes written as its own frame, the way pzstd lays files out
+    def __init__(self, out, piece_size):
+        super().__init__()
+        self._out = out
+        self._piece_size = piece_size
+        self._pending = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._pending += data
+        while len(self._pending) >= self._piece_size:
+            self._flush_piece(bytes(self._pending[:self._piece_size]))
+            del self._pending[:self._piece_size]
+        return len(data)
+
+    def _flush_piece(self, piece):
+        self._out.write(subprocess.run(['zstd', '-q', '-1', '-c'], input=piece, stdout=subprocess.PIPE,
+                                       check=True).stdout)
+
+    def close(self):
+        if not self.closed and self._pending:
+            self._flush_piece(bytes(self._pending))
+        super().close()
+
+
+def _open_compressor(raw, compression, piece_mb):
+    # -> (writable sink, process or None). xz gets one block and zstd one frame per piece_mb
+    if compression == 'xz':
+        process = subprocess.Popen(['xz', '-T1', '-0', f'--block-size={piece_mb}MiB', '-c'],
+                                   stdin=subprocess.PIPE, stdout=raw)
+        return process.stdin, process
+    if compression == 'gz':
+        process = subprocess.Popen(['gzip', '-1', '-c'], stdin=subprocess.PIPE, stdout=raw)
+        return process.stdin, process
+    if compression == 'zst':
+        return _ZstdFrames(raw, piece_mb << 20), None
+    if compression == 'none':
+        return raw, None
+    raise ValueError(f"unknown compression {compression!r}")
+
+
+def make_synthetic_deb(path, files=64, file_size=64 << 10, compression='xz', control_size=0,
+                       name='synthetic', version='1.0', depends='', seed=0, piece_mb=16, triggers=''):
+    # files regular files of file_size bytes, or of random sizes when file_size is a (min, max)
+    # pair, spread over a few directories. Contents are hex text, so they compress about 2:1.
+    # control_size pads the Description to roughly that many bytes. md5sums is always included,
+    # triggers (the control.tar "triggers" file) when given.
+    rng = random.Random(seed)
+    base = rng.randbytes(1 << 19).hex().encode()
+    data_path = path + '.data'
+    sums = []
+    total = 0
+    with open(data_path, 'wb') as raw:
+        sink, process = _open_compressor(raw, compression, piece_mb)
+        with tarfile.open(fileobj=sink, mode='w|', format=tarfile.GNU_FORMAT) as tar:
+            subdirs = [f'usr/share/{name}/d{i:02d}' for i in range(min(16, max(1, files // 256)))]
+            for directory in ['.', './usr', './usr/share', f'./usr/share/{name}'] + ['./' + d for d in subdirs]:
+                info = tarfile.TarInfo(directory)
+                info.type, info.mode = tarfile.DIRTYPE, 0o755
+                tar.addfile(info)
+            for index in range(files):
+                size = rng.randint(*file_size) if isinstance(file_size, tuple) else file_size
+                offset = rng.randrange(len(base))
+                if offset + size <= len(base):
+                    content = base[offset:offset + size]
+                else:
+                    content = (base * (size // len(base) + 2))[offset:offset + size]
+                member = f'{subdirs[index % len(subdirs)]}/file{index:06d}'
+                info = tarfile.TarInfo('./' + member)
+                info.size, info.mode = len(content), 0o644
+                tar.addfile(info, io.BytesIO(content))
+                sums.append(f"{hashlib.md5(content).hexdigest()}  {member}\n")
+                total += len(content)
+        sink.close()
+        if process is not None:
+            process.wait()
+
+    description = f"synthetic benchmark package\n {files} files, {total} bytes"
+    while len(description) < control_size:
+        description += "\n Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor."
+    control = (f"Package: {name}\nVersion: {version}\nArchitecture: all\nMaintainer: bench <bench@localhost>\n"
+               f"Installed-Size: {total // 1024 + 1}\n" + (f"Depends: {depends}\n" if depends else "") +
+               f"Description: {description}\n").encode()
+    control_tar = io.BytesIO()
+    with tarfile.open(fileobj=control_tar, mode='w:gz') as tar:
+        members = [('./control', control), ('./md5sums', ''.join(sums).encode())]
+        if triggers:
+            members.append(('./triggers', triggers.encode()))
+        for member, data in members:
+            info = tarfile.TarInfo(member)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+
+    member = 'data.tar' + ('' if compression == 'none' else '.' + compression)
+    with open(path, 'wb') as deb, open(data_path, 'rb') as data:
+        deb.write(b'!<arch>\n' + _ar_member('debian-binary', b'2.0\n') +
+                  _ar_member('control.tar.gz', control_tar.getvalue()))
+        size = os.fstat(data.fileno()).st_size
+        deb.write(f"{member:<16}{0:<12}{0:<6}{0:<6}{'100644':<8}{size:<10}`\n".encode())
+        shutil.copyfileobj(data, deb, 1 << 20)
+        if size % 2:
+            deb.write(b'\n')
+    os.unlink(data_path)
+    return path
+
+
+def make_status_file(path, packages=3000, seed=0):
+    # A dpkg status database with `packages` installed entries named pkg0..pkgN-1
+    rng = random.Random(seed)
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(packages):
+            f.write(f"Package: pkg{i}\nStatus: install ok installed\nPriority: optional\nSection: misc\n"
+                    f"Installed-Size: {rng.randint(10, 50000)}\nMaintainer: bench <bench@localhost>\n"
+                    f"Architecture: amd64\nVersion: {rng.randint(0, 9)}.{rng.randint(0, 99)}-{rng.randint(1, 5)}\n"
+                    f"Depends: libc6 (>= 2.34)\nDescription: synthetic package {i}\n"
+                    f" Long description line for package {i}.\n\n")
+    return path
+
+
+def write_apt_transcript(path, packages=20, lines_per_package=40):
+    # "<seconds>\t<fd>\t<text>" per line; fd 1/2 are apt's stdout/stderr, 3 its Status-Fd
+    clock = 0.0
+    with open(path, 'w', encoding='utf-8') as f:
+        def emit(fd, text, step=0.001):
+            nonlocal clock
+            clock += step
+            f.write(f"{clock:.4f}\t{fd}\t{text}\n")
+        emit(1, "Reading package lists...")
+        emit(1, "The following NEW packages will be installed:")
+        emit(1, "  " + " ".join(f"pkg{i}" for i in range(packages)))
+        for i in range(packages):
+            emit(3, f"dlstatus:{i + 1}:{(i + 1) * 50 / packages:.4f}:Retrieving file {i + 1} of {packages}", 0.01)
+        for verb, status, start in (("Unpacking", "Unpacking", 50), ("Setting up", "Configuring", 75)):
+            for i in range(packages):
+                emit(3, f"pmstatus:pkg{i}:{start + (i + 1) * 25 / packages:.4f}:{status} pkg{i}")
+                emit(1, f"{verb} pkg{i} (1.0-{i}) ...", 0.005)
+                for j in range(lines_per_package):
+                    if j % 4:
+                        emit(1, f"{verb} pkg{i}: maintainer script output line {j}")
+                    else:
+                        emit(2, f"W: pkg{i}: maintainer script warning {j}")
+    return path
+
+
+def make_file_repository(directory, count=10, files=16, file_size=64 << 10, seed=0):
+    # A flat file:// apt repository holding benchdep0..benchdep<count-1> and its Packages index
+    from debcore import DebFile
+    os.makedirs(directory, exist_ok=True)
+    paragraphs = []
+    for i in range(count):
+        name = f'benchdep{i}'
+        path = make_synthetic_deb(os.path.join(directory, f'{name}_1.0_all.deb'), files=files, file_size=file_size,
+                                  compression='gz', name=name, seed=seed + i)
+        with open(path, 'rb') as f:
+            data = f.read()
+        control = DebFile(path).control()
+        fields = [f"{key}: {value}" for key, value in control.items() if key != 'Description']
+        fields += [f"Filename: ./{os.path.basename(path)}", f"Size: {len(data)}",
+                   f"MD5sum: {hashlib.md5(data).hexdigest()}", f"SHA256: {hashlib.sha256(data).hexdigest()}",
+                   f"Description: {control.get('Description', '').splitlines()[0]}"]
+        paragraphs.append("\n".join(fields) + "\n")
+    with open(os.path.join(directory, 'Packages'), 'w', encoding='utf-8') as f:
+        f.write("\n".join(paragraphs))
+    return [f'benchdep{i}' for i in range(count)]
+
+
+def file_repository_options(repository, state_dir):
+    # apt options that make apt-get see only the local repository, with lists kept in state_dir. The
+    # copy: method is file:// that also copies archives into the cache, as a download would
+    lists = os.path.join(state_dir, 'lists')
+    os.makedirs(os.path.join(lists, 'partial'), exist_ok=True)
+    os.makedirs(os.path.join(state_dir, 'sources.list.d'), exist_ok=True)
+    sources = os.path.join(state_dir, 'sources.list')
+    with open(sources, 'w', encoding='utf-8') as f:
+        f.write(f"deb [trusted=yes] copy:{os.path.abspath(repository)} ./\n")
+    options = {'Dir::Etc::sourcelist': sources, 'Dir::Etc::sourceparts': os.path.join(state_dir, 'sources.list.d'),
+               'Dir::State::lists': lists + '/', 'Dir::Cache::pkgcache': '', 'Dir::Cache::srcpkgcache': '',
+               'Acquire::GzipIndexes': 'false', 'Debug::NoLocking': 'true'}
+    if os.geteuid() == 0:
+        options['APT::Sandbox::User'] = 'root'
+    return [arg for key, value in options.items() for arg in ('-o', f'{key}={value}')]
+
+
+def update_file_repository(options):
+    subprocess.run(['apt-get', 'update', '-q'] + options, check=True, stdout=subprocess.DEVNULL)
+
+
+# --- Fake sudo / apt / dpkg-deb ---
+FAKE_SUDO = r'''
+import os, sys
+# Drops sudo's options, checks the password line against $SETDEB_FAKE_PASSWORD (if set), execs the rest
+args = sys.argv[1:]
+while args and args[0].startswith("-"):
+    option = args.pop(0)
+    if option in ("-p", "-u", "-g"):
+        args.pop(0)
+    elif option == "--":
+        break
+password = sys.stdin.readline().rstrip("\n")
+expected = os.environ.get("SETDEB_FAKE_PASSWORD")
+if expected is not None and password != expected:
+    sys.stderr.write("Sorry, try again.\nsudo: 1 incorrect password attempt\n")
+    sys.exit(1)
+os.execvp(args[0], args)
+'''
+
+FAKE_APT = r'''
+import os, sys, time
+# Replays $SETDEB_FAKE_APT_TRANSCRIPT ("<seconds>\t<fd>\t<text>", or "<seconds>\t<record>" as
+# recorded from Status-Fd) at $SETDEB_FAKE_SPEED times real time; 0 replays without waiting
+speed = float(os.environ.get("SETDEB_FAKE_SPEED", "0"))
+streams = {"1": sys.stdout, "2": sys.stderr}
+try:
+    streams["3"] = os.fdopen(3, "w")
+except OSError:
+    pass
+started = time.monotonic()
+with open(os.environ["SETDEB_FAKE_APT_TRANSCRIPT"], encoding="utf-8") as transcript:
+    for line in transcript:
+        parts = line.rstrip("\n").split("\t", 2)
+        stamp, fd, text = parts if len(parts) == 3 else (parts[0], "3", parts[-1])
+        if speed:
+            delay = float(stamp) / speed - (time.monotonic() - started)
+            if delay > 0:
+                for stream in streams.values():
+                    stream.flush()
+                time.sleep(delay)
+        stream = streams.get(fd)
+        if stream is not None:
+            stream.write(text + "\n")
+sys.exit(int(os.environ.get("SETDEB_FAKE_APT_STATUS", "0")))
+'''
+
+FAKE_DPKG_DEB = r'''
+import os, sys
+# Answers the dpkg-deb queries setdeb used to make (-f, -c, -I) from the native reader
+sys.path.insert(0, os.environ["SETDEB_SOURCE_DIR"])
+from debcore import DebFile
+option, path, *fields = sys.argv[1:]
+deb = DebFile(path)
+if option in ("-f", "--field"):
+    control = deb.control()
+    for name in fields or control:
+        if name in control:
+            print(f"{name}: {control[name]}" if not fields or len(fields) > 1 else control[name])
+elif option in ("-c", "--contents"):
+    for entry in deb.iter_entries():
+        print(f"{entry.kind} {entry.size:>10} .{entry.path}")
+elif option in ("-I", "--info"):
+    sys.stdout.write(deb.control_file("control").decode("utf-8", "replace"))
+else:
+    sys.exit(f"fake dpkg-deb: unsupported option {option}")
+'''
+
+
+def install_fake_tools(directory):
+    # Writes the fake commands into directory; prepend it to PATH to use them
+    os.makedirs(directory, exist_ok=True)
+    for name, source in (('sudo', FAKE_SUDO), ('apt', FAKE_APT), ('apt-get', FAKE_APT), ('dpkg-deb', FAKE_DPKG_DEB)):
+        script = os.path.join(directory, name)
+        with open(script, 'w', encoding='utf-8') as f:
+            f.write(f"#!{sys.executable}\n{source.lstrip()}")
+        os.chmod(script, 0o755)
+    return directory
+
+
+def fake_tools_env(directory, transcript, speed=0.0, password=None):
+    env = dict(os.environ)
+    env['PATH'] = directory + os.pathsep + env.get('PATH', '')
+    env['SETDEB_FAKE_APT_TRANSCRIPT'] = transcript
+    env['SETDEB_FAKE_SPEED'] = str(speed)
+    env['SETDEB_SOURCE_DIR'] = os.path.dirname(os.path.abspath(__file__))
+    if password is not None:
+        env['SETDEB_FAKE_PASSWORD'] = password
+    return env
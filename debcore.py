@@ -0,0 +1,3978 @@
+#!/usr/bin/env python3
+# Qt-free building blocks for setdeb.py. Nothing in this module may import PySide6.
+
+import os
+import io
+import re
+import sys
+import mmap
+import marshal
+import time
+import select
+import struct
+import shutil
+import stat
+import json
+import fcntl
+import bisect
+import heapq
+import tarfile
+import gzip
+import lzma
+import zlib
+import threading
+from array import array
+from operator import itemgetter
+from collections import namedtuple, deque
+
+# --- Native .deb reader ---
+AR_MAGIC = b"!<arch>\n"
+AR_HEADER_SIZE = 60
+TAR_BLOCK_SIZE = 512
+
+# One row of the data.tar listing, paths normalized the way dpkg stores them in *.list
+DebEntry = namedtuple("DebEntry", "path size mode kind linkname mtime")
+
+_TAR_KINDS = {
+    tarfile.REGTYPE: "f", tarfile.AREGTYPE: "f", tarfile.CONTTYPE: "f",
+    tarfile.DIRTYPE: "d", tarfile.SYMTYPE: "l", tarfile.LNKTYPE: "h",
+    tarfile.CHRTYPE: "c", tarfile.BLKTYPE: "b", tarfile.FIFOTYPE: "p",
+}
+
+
+class DebFormatError(Exception):
+    pass
+
+
+def parse_control(text):
+    # Same rules dpkg-deb -f output was parsed with: continuation lines are joined with spaces
+    data = {}
+    field, value = None, []
+    for line in text.splitlines():
+        if line.startswith((" ", "\t")) and field:
+            value.append(line.strip())
+        elif ":" in line and not line.startswith("#"):
+            if field:
+                data[field] = " ".join(value)
+            field, first = line.split(":", 1)
+            value = [first.strip()] if first.strip() else []
+    if field:
+        data[field] = " ".join(value)
+    return data
+
+
+def normalize_member_path(name):
+    name = name[2:] if name.startswith("./") else name.lstrip("/")
+    name = name.rstrip("/")
+    return "/" + name if name not in ("", ".") else "/"
+
+
+class _MemberSlice(io.RawIOBase):
+    # Read-only window over one ar member, using pread so slices never share a file position
+    def __init__(self, path, offset, size):
+        super().__init__()
+        self._fd = os.open(path, os.O_RDONLY)
+        self._offset = offset
+        self._size = size
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        remaining = self._size - self._pos
+        if remaining <= 0:
+            return 0
+        view = memoryview(buffer)[:remaining]
+        chunk = os.pread(self._fd, len(view), self._offset + self._pos)
+        view[:len(chunk)] = chunk
+        self._pos += len(chunk)
+        return len(chunk)
+
+    def close(self):
+        if not self.closed:
+            os.close(self._fd)
+        super().close()
+
+
+class _PipeDecompressor(io.RawIOBase):
+    # Fallback for codecs without a Python module (zstd): feed the member through the CLI tool
+    def __init__(self, command, source):
+        import subprocess
+        super().__init__()
+        self._source = source
+        self._process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                         stderr=subprocess.DEVNULL)
+        self._feeder = threading.Thread(target=self._feed, daemon=True)
+        self._feeder.start()
+
+    def _feed(self):
+        try:
+            while chunk := self._source.read(1 << 16):
+                self._process.stdin.write(chunk)
+        except (BrokenPipeError, ValueError, OSError):
+            pass
+        finally:
+            try:
+                self._process.stdin.close()
+            except OSError:
+                pass
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        return self._process.stdout.readinto(buffer)
+
+    def close(self):
+        if not self.closed:
+            self._process.stdout.close()
+            self._process.kill()
+            self._process.wait()
+            self._source.close()
+        super().close()
+
+
+def _open_zstd(source):
+    try:
+        import zstandard
+    except ImportError:
+        return _PipeDecompressor(["zstd", "-dcq"], source)
+    return zstandard.ZstdDecompressor().stream_reader(source, closefd=True)
+
+
+class _DecompressedMember(io.RawIOBase):
+    # gzip/lzma/bz2 readers leave their fileobj open; this closes the member slice with them
+    def __init__(self, reader, source):
+        super().__init__()
+        self._reader = reader
+        self._source = source
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        return self._reader.read(size)
+
+    def readinto(self, buffer):
+        data = self._reader.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self._reader.close()
+            self._source.close()
+        super().close()
+
+
+def open_decompressed(source, member_name):
+    # member_name is the ar member (e.g. data.tar.xz); the suffix decides the codec
+    if member_name.endswith(".gz"):
+        reader = gzip.GzipFile(fileobj=source, mode="rb")
+    elif member_name.endswith(".xz"):
+        reader = lzma.LZMAFile(source, format=lzma.FORMAT_XZ)
+    elif member_name.endswith(".lzma"):
+        reader = lzma.LZMAFile(source, format=lzma.FORMAT_ALONE)
+    elif member_name.endswith(".bz2"):
+        import bz2
+        reader = bz2.BZ2File(source)
+    elif member_name.endswith(".zst"):
+        return _open_zstd(source)
+    elif member_name.endswith(".tar"):
+        return io.BufferedReader(source, 1 << 16)
+    else:
+        source.close()
+        raise DebFormatError(f"Unsupported compression for member '{member_name}'")
+    return _DecompressedMember(reader, source)
+
+
+# --- Parallel decoding of multi-block xz / multi-frame zstd members ---
+# Both formats can hold independently decodable pieces: xz blocks (listed in the stream index) and
+# zstd frames. Each piece is decoded on a pool and handed out strictly in order, so consumers see
+# the same byte stream as the serial path. gz, bz2 and single-piece members stay serial.
+XZ_MAGIC = b"\xfd7zXZ\x00"
+XZ_FOOTER_MAGIC = b"YZ"
+ZSTD_MAGIC = 0xFD2FB528
+
+
+def default_workers():
+    return min(8, os.cpu_count() or 1)
+
+
+def _read_varint(buffer, pos):
+    value = shift = 0
+    while True:
+        byte = buffer[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+        if shift > 63:
+            raise DebFormatError("Corrupt xz index (varint too long)")
+
+
+def _varint(value):
+    out = bytearray()
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _crc32_le(data):
+    return zlib.crc32(data).to_bytes(4, "little")
+
+
+def xz_blocks(read_at, size):
+    # -> [(offset, stream_flags, unpadded_size, uncompressed_size)] in file order. Walks the
+    # streams back to front through their footers and indexes; every CRC there is checked.
+    blocks = []
+    end = size
+    while end > 0:
+        while end >= 4 and read_at(end - 4, 4) == b"\0\0\0\0":
+            end -= 4  # stream padding
+        footer = read_at(end - 12, 12)
+        if footer[10:12] != XZ_FOOTER_MAGIC or _crc32_le(footer[4:10]) != footer[:4]:
+            raise DebFormatError("Corrupt xz stream footer")
+        flags = footer[8:10]
+        index_size = (int.from_bytes(footer[4:8], "little") + 1) * 4
+        index_start = end - 12 - index_size
+        index = read_at(index_start, index_size)
+        if index_start < 12 or index[0] != 0 or _crc32_le(index[:-4]) != index[-4:]:
+            raise DebFormatError("Corrupt xz index")
+        count, pos = _read_varint(index, 1)
+        records = []
+        for _ in range(count):
+            unpadded, pos = _read_varint(index, pos)
+            uncompressed, pos = _read_varint(index, pos)
+            records.append((unpadded, uncompressed))
+        stream_start = index_start - sum((unpadded + 3) & ~3 for unpadded, _ in records) - 12
+        header = read_at(stream_start, 12) if stream_start >= 0 else b""
+        if header[:6] != XZ_MAGIC or header[6:8] != flags:
+            raise DebFormatError("xz stream header does not match its footer")
+        offset = stream_start + 12
+        stream_blocks = []
+        for unpadded, uncompressed in records:
+            stream_blocks.append((offset, flags, unpadded, uncompressed))
+            offset += (unpadded + 3) & ~3
+        blocks[:0] = stream_blocks
+        end = stream_start
+    return blocks
+
+
+def _xz_block_as_stream(flags, block, unpadded, uncompressed):
+    # Rewraps one block (with its padding) as a complete single-block xz stream
+    header = XZ_MAGIC + flags + _crc32_le(flags)
+    index = b"\0" + _varint(1) + _varint(unpadded) + _varint(uncompressed)
+    index += b"\0" * (-len(index) % 4)
+    index += _crc32_le(index)
+    footer = (len(index) // 4 - 1).to_bytes(4, "little") + flags
+    return header + block + index + _crc32_le(footer) + footer + XZ_FOOTER_MAGIC
+
+
+def zstd_frames(read_at, size):
+    # -> [(offset, length)] of the data frames; skippable frames are dropped. Only block headers
+    # are read, nothing is decompressed.
+    frames = []
+    pos = 0
+    while pos < size:
+        magic = int.from_bytes(read_at(pos, 4), "little")
+        if magic & 0xFFFFFFF0 == 0x184D2A50:
+            pos += 8 + int.from_bytes(read_at(pos + 4, 4), "little")
+            continue
+        if magic != ZSTD_MAGIC:
+            raise DebFormatError("Corrupt zstd frame header")
+        descriptor = read_at(pos + 4, 1)[0]
+        single_segment = descriptor >> 5 & 1
+        header_size = (1 + (not single_segment) + (0, 1, 2, 4)[descriptor & 3]
+                       + (single_segment, 2, 4, 8)[descriptor >> 6])
+        cursor = pos + 4 + header_size
+        while True:
+            block_header = int.from_bytes(read_at(cursor, 3), "little")
+            block_type = block_header >> 1 & 3
+            if block_type == 3:
+                raise DebFormatError("Corrupt zstd block header")
+            cursor += 3 + (1 if block_type == 1 else block_header >> 3)
+            if block_header & 1:
+                break
+        if descriptor >> 2 & 1:
+            cursor += 4  # content checksum
+        if cursor > size:
+            raise DebFormatError("Truncated zstd frame")
+        frames.append((pos, cursor - pos))
+        pos = cursor
+    return frames
+
+
+def _decode_zstd_frame(frame):
+    try:
+        import zstandard
+    except ImportError:
+        import subprocess
+        result = subprocess.run(["zstd", "-dcq"], input=frame, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if result.returncode != 0:
+            raise DebFormatError(f"zstd: {result.stderr.decode('utf-8', 'replace').strip()}")
+        return result.stdout
+    return zstandard.ZstdDecompressor().decompressobj().decompress(frame)
+
+
+class _ParallelDecoder(io.RawIOBase):
+    # Runs decode tasks on a pool with a bounded lookahead and returns their output in task order
+    def __init__(self, path, tasks, workers):
+        from concurrent.futures import ThreadPoolExecutor
+        super().__init__()
+        self._fd = os.open(path, os.O_RDONLY)
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._tasks = iter(tasks)
+        self._pending = deque()
+        self._lookahead = workers + 1
+        self._buffer = memoryview(b"")
+        self._fill()
+
+    def _read_at(self, offset, length):
+        return os.pread(self._fd, length, offset)
+
+    def _fill(self):
+        while len(self._pending) < self._lookahead:
+            task = next(self._tasks, None)
+            if task is None:
+                break
+            self._pending.append(self._pool.submit(task, self._read_at))
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not len(self._buffer):
+            if not self._pending:
+                return 0
+            self._buffer = memoryview(self._pending.popleft().result())
+            self._fill()
+        count = min(len(buffer), len(self._buffer))
+        buffer[:count] = self._buffer[:count]
+        self._buffer = self._buffer[count:]
+        return count
+
+    def close(self):
+        if not self.closed:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            os.close(self._fd)
+        super().close()
+
+
+def _xz_task(offset, flags, unpadded, uncompressed):
+    def decode(read_at):
+        block = read_at(offset, (unpadded + 3) & ~3)
+        data = lzma.decompress(_xz_block_as_stream(flags, block, unpadded, uncompressed), format=lzma.FORMAT_XZ)
+        if len(data) != uncompressed:
+            raise DebFormatError("xz block size does not match the index")
+        return data
+    return decode
+
+
+def _zstd_task(offset, length):
+    return lambda read_at: _decode_zstd_frame(read_at(offset, length))
+
+
+def open_parallel(path, offset, size, member_name, workers):
+    # Parallel reader for the member, or None when it has a single piece (or is not xz/zstd)
+    with open(path, "rb") as f:
+        def read_at(position, length):
+            return os.pread(f.fileno(), length, offset + position)
+        try:
+            if member_name.endswith(".xz"):
+                tasks = [_xz_task(offset + o, flags, unpadded, uncompressed)
+                         for o, flags, unpadded, uncompressed in xz_blocks(read_at, size)]
+            elif member_name.endswith(".zst"):
+                tasks = [_zstd_task(offset + o, length) for o, length in zstd_frames(read_at, size)]
+            else:
+                return None
+        except (DebFormatError, IndexError):
+            return None  # let the serial decoder report what is wrong
+    if len(tasks) < 2:
+        return None
+    return io.BufferedReader(_ParallelDecoder(path, tasks, workers), 1 << 16)
+
+
+class DebFile:
+    # Indexes the ar container once (headers only) and opens members on demand
+    def __init__(self, path):
+        self.path = path
+        self.members = {}
+        self._control_files = None
+        self._index_members()
+
+    def _index_members(self):
+        with open(self.path, "rb") as f:
+            if f.read(len(AR_MAGIC)) != AR_MAGIC:
+                raise DebFormatError(f"'{os.path.basename(self.path)}' is not a Debian archive")
+            offset = len(AR_MAGIC)
+            while True:
+                header = f.read(AR_HEADER_SIZE)
+                if not header:
+                    break
+                if len(header) < AR_HEADER_SIZE or header[58:60] != b"`\n":
+                    raise DebFormatError("Truncated or corrupt ar header")
+                name = header[:16].decode("ascii", "replace").strip().rstrip("/")
+                try:
+                    size = int(header[48:58])
+                except ValueError:
+                    raise DebFormatError(f"Invalid size for ar member '{name}'")
+                offset += AR_HEADER_SIZE
+                self.members[name] = (offset, size)
+                offset += size + (size & 1)
+                f.seek(offset)
+
+        binary = self.members.get("debian-binary")
+        if binary is None or not self.read_member("debian-binary").startswith(b"2."):
+            raise DebFormatError("Missing or unsupported debian-binary member")
+        if self.control_member is None or self.data_member is None:
+            raise DebFormatError("Package is missing control.tar or data.tar")
+        data_offset, data_size = self.members[self.data_member]
+        if data_offset + data_size > os.path.getsize(self.path):
+            raise DebFormatError("Package is truncated (data.tar extends past end of file)")
+
+    def _find_member(self, prefix):
+        for name in self.members:
+            if name == prefix or name.startswith(prefix + "."):
+                return name
+        return None
+
+    @property
+    def control_member(self):
+        return self._find_member("control.tar")
+
+    @property
+    def data_member(self):
+        return self._find_member("data.tar")
+
+    def read_member(self, name):
+        offset, size = self.members[name]
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            return f.read(size)
+
+    def open_member(self, name, workers=1):
+        offset, size = self.members[name]
+        if workers > 1:
+            stream = open_parallel(self.path, offset, size, name, workers)
+            if stream is not None:
+                return stream
+        return open_decompressed(_MemberSlice(self.path, offset, size), name)
+
+    def control_files(self):
+        # control.tar is tiny; read it fully once and keep every file by its bare name
+        if self._control_files is None:
+            files = {}
+            with self.open_member(self.control_member) as stream:
+                with tarfile.open(fileobj=stream, mode="r|") as tar:
+                    for member in tar:
+                        if member.isfile():
+                            name = normalize_member_path(member.name).lstrip("/")
+                            files[name] = tar.extractfile(member).read()
+            self._control_files = files
+        return self._control_files
+
+    def control_file(self, name):
+        return self.control_files().get(name)
+
+    def control(self):
+        raw = self.control_file("control")
+        if raw is None:
+            raise DebFormatError("control.tar has no 'control' file")
+        return parse_control(raw.decode("utf-8", "replace"))
+
+    def check_data(self):
+        # Decompress just the first tar header to prove the payload is readable
+        with self.open_member(self.data_member) as stream:
+            block = stream.read(TAR_BLOCK_SIZE)
+        try:
+            tarfile.TarInfo.frombuf(block, tarfile.ENCODING, "surrogateescape")
+        except tarfile.HeaderError as e:
+            raise DebFormatError(f"data.tar is not a valid tar archive: {e}")
+
+    def iter_entries(self, workers=1):
+        # Streams data.tar lazily; nothing is listed unless a caller iterates
+        with self.open_member(self.data_member, workers) as stream:
+            with tarfile.open(fileobj=stream, mode="r|") as tar:
+                for member in tar:
+                    yield DebEntry(normalize_member_path(member.name), member.size, member.mode,
+                                   _TAR_KINDS.get(member.type, "?"), member.linkname, member.mtime)
+
+    def file_list(self):
+        return list(self.iter_entries())
+
+
+# --- Payload integrity (control.tar md5sums) ---
+def parse_md5sums(text):
+    # "<md5>  <path relative to />" per line; paths are keyed like DebEntry.path
+    sums = {}
+    for line in text.splitlines():
+        digest, _, path = line.partition(" ")
+        path = path.lstrip(" *")
+        if len(digest) == 32 and path:
+            sums[normalize_member_path(path)] = digest.lower()
+    return sums
+
+
+class IntegrityReport:
+    def __init__(self):
+        self.has_md5sums = False
+        self.checked = 0
+        self.bytes = 0          # payload bytes hashed
+        self.seconds = 0.0
+        self.workers = 1
+        self.mismatched = []    # listed in md5sums, contents differ
+        self.missing = []       # listed in md5sums, absent from data.tar
+        self.unlisted = 0       # regular files md5sums does not mention (conffiles usually)
+        self.manifest = []      # (path, size, kind) for every entry, as the file list wants it
+
+    @property
+    def ok(self):
+        return not self.mismatched and not self.missing
+
+    @property
+    def mb_per_s(self):
+        return self.bytes / 1e6 / self.seconds if self.seconds else 0.0
+
+    def to_dict(self):
+        return {
+            "ok": self.ok,
+            "has_md5sums": self.has_md5sums,
+            "checked": self.checked,
+            "bytes": self.bytes,
+            "seconds": round(self.seconds, 4),
+            "mb_per_s": round(self.mb_per_s, 1),
+            "workers": self.workers,
+            "mismatched": list(self.mismatched),
+            "missing": list(self.missing),
+            "unlisted": self.unlisted,
+        }
+
+
+def _md5_chunks(chunks):
+    # Consumes a queue of chunks for one large file; None ends it
+    import hashlib
+    digest = hashlib.md5()
+    while (chunk := chunks.get()) is not None:
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def verify_payload(deb, workers=None, cancel=None, whole_file_limit=1 << 20, max_inflight=64 << 20,
+                   decode_workers=None):
+    # Streams data.tar once. Decompression stays on this thread (or the parallel decoder's pool for
+    # multi-block xz / multi-frame zstd) while md5s run on a pool (hashlib drops the GIL on large
+    # buffers): small files are hashed whole, larger ones through a chunk
+    # queue owned by one worker. At most max_inflight bytes of file data wait to be hashed.
+    # Raises DebFormatError/OSError/EOFError if the payload itself is unreadable.
+    import queue
+    import hashlib
+    from concurrent.futures import ThreadPoolExecutor
+    report = IntegrityReport()
+    raw = deb.control_file("md5sums")
+    expected = parse_md5sums(raw.decode("utf-8", "replace")) if raw is not None else {}
+    report.has_md5sums = raw is not None
+    report.workers = workers or default_workers()
+    pending = deque()  # (path, future, size), completed in submission order
+    inflight = 0
+
+    def settle(path, future):
+        report.checked += 1
+        if future.result() != expected[path]:
+            report.mismatched.append(path)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=report.workers) as pool:
+        with deb.open_member(deb.data_member, decode_workers or report.workers) as stream, \
+                tarfile.open(fileobj=stream, mode="r|") as tar:
+            for member in tar:
+                if cancel is not None and cancel.is_set():
+                    return None
+                path = normalize_member_path(member.name)
+                report.manifest.append((path, member.size, _TAR_KINDS.get(member.type, "?")))
+                if not member.isfile():
+                    continue
+                if path not in expected:
+                    report.unlisted += 1
+                    continue
+                source = tar.extractfile(member)
+                if member.size <= whole_file_limit:
+                    data = source.read()
+                    future = pool.submit(lambda data: hashlib.md5(data).hexdigest(), data)
+                else:
+                    chunks = queue.Queue(maxsize=8)
+                    future = pool.submit(_md5_chunks, chunks)
+                    while chunk := source.read(whole_file_limit):
+                        chunks.put(chunk)
+                    chunks.put(None)
+                if source.tell() != member.size:
+                    raise DebFormatError(f"data.tar is truncated inside {path}")
+                report.bytes += member.size
+                pending.append((path, future, member.size))
+                inflight += member.size
+                while inflight > max_inflight:
+                    path, future, size = pending.popleft()
+                    settle(path, future)
+                    inflight -= size
+            while pending:
+                path, future, _ = pending.popleft()
+                settle(path, future)
+    seen = {row[0] for row in report.manifest}
+    report.missing = sorted(path for path in expected if path not in seen)
+    report.seconds = time.perf_counter() - started
+    return report
+
+
+# --- Upgrade delta against the installed copy (dpkg info .list / .md5sums) ---
+class UpgradeDelta:
+    # What unpacking the new package does to the files of the installed one. Byte totals: added
+    # and changed count the new sizes, removed the installed files' sizes on disk.
+    MAX_EXAMPLES = 20
+
+    def __init__(self, installed_version=""):
+        self.installed_version = installed_version
+        self.counts = dict.fromkeys(("added", "removed", "changed", "unchanged"), 0)
+        self.bytes = dict.fromkeys(("added", "removed", "changed", "unchanged"), 0)
+        self.examples = {"added": [], "removed": [], "changed": []}
+        self.unverified = 0     # in both, same size, but no md5 on one side (conffiles, symlinks): unknown
+        self.comparable = False  # both sides ship md5sums
+        self.seconds = 0.0
+
+    def add(self, category, path, size):
+        self.counts[category] += 1
+        self.bytes[category] += size
+        examples = self.examples.get(category)
+        if examples is not None and len(examples) < self.MAX_EXAMPLES:
+            examples.append(path)
+
+    @property
+    def differs(self):
+        return self.comparable and bool(self.counts["added"] or self.counts["removed"] or self.counts["changed"])
+
+    @property
+    def identical(self):
+        # Only when every shared file was compared by checksum; a same-size conffile proves nothing
+        return self.comparable and not self.differs and not self.unverified
+
+    def to_dict(self):
+        return {
+            "installed_version": self.installed_version,
+            "identical": self.identical,
+            "differs": self.differs,
+            "comparable": self.comparable,
+            "counts": dict(self.counts),
+            "bytes": dict(self.bytes),
+            "examples": {category: list(paths) for category, paths in self.examples.items()},
+            "unverified": self.unverified,
+            "seconds": round(self.seconds, 4),
+        }
+
+
+def _describe_delta(delta):
+    # One line for logs: "3 files changed (1.2 MB), 1 added (0.0 MB), 2 removed (0.1 MB), 40 unchanged"
+    counts, sizes = delta["counts"], delta["bytes"]
+    parts = [f"{counts[c]} {'files ' if not i else ''}{c} ({sizes[c] / 1e6:.1f} MB)"
+             for i, c in enumerate(("changed", "added", "removed"))]
+    unverified = f", {delta['unverified']} not compared" if delta["unverified"] else ""
+    return ", ".join(parts) + f", {counts['unchanged']} unchanged" + unverified
+
+
+def _installed_size(root, path):
+    # None for directories (dpkg lists them, they are never "removed"); 0 for files already gone
+    try:
+        st = os.lstat(os.path.join(root, path.lstrip("/")))
+    except OSError:
+        return 0
+    return None if stat.S_ISDIR(st.st_mode) else st.st_size
+
+
+def read_info_file(info_dir, package, arch, suffix):
+    # dpkg names the files "<pkg>:<arch>.<suffix>" for Multi-Arch: same packages, "<pkg>.<suffix>" otherwise
+    for name in (f"{package}:{arch}.{suffix}", f"{package}.{suffix}"):
+        try:
+            with open(os.path.join(info_dir, name), "rb") as f:
+                return f.read().decode("utf-8", "surrogateescape")
+        except FileNotFoundError:
+            continue
+    return None
+
+
+def upgrade_delta(manifest, new_sums, installed_paths, installed_sums, installed_version="", root="/"):
+    # manifest: (path, size, kind) rows of the new package; installed_paths: the .list lines, which
+    # mix files and directories. Both sides are sorted and walked once. Only paths without an md5 on both sides, and removed
+    # ones, cost an lstat of the live file.
+    started = time.perf_counter()
+    delta = UpgradeDelta(installed_version)
+    delta.comparable = bool(new_sums) and bool(installed_sums)
+    new_rows = iter(sorted(manifest, key=itemgetter(0)))
+    old_paths = iter(sorted(path for path in installed_paths if path and path != "/."))
+    row, old = next(new_rows, None), next(old_paths, None)
+    while row is not None or old is not None:
+        if old is None or (row is not None and row[0] < old):
+            if row[2] != "d":
+                delta.add("added", row[0], row[1])
+            row = next(new_rows, None)
+            continue
+        if row is None or old < row[0]:
+            size = _installed_size(root, old)
+            if size is not None:
+                delta.add("removed", old, size)
+            old = next(old_paths, None)
+            continue
+        path, size, kind = row
+        new_sum, old_sum = new_sums.get(path), installed_sums.get(path)
+        if kind == "d":
+            pass  # directories are shared and never counted
+        elif new_sum and old_sum:
+            delta.add("unchanged" if new_sum == old_sum else "changed", path, size)
+        elif kind == "f" and _installed_size(root, path) != size:
+            delta.add("changed", path, size)
+        else:
+            delta.unverified += 1
+        row, old = next(new_rows, None), next(old_paths, None)
+    delta.seconds = time.perf_counter() - started
+    return delta
+
+
+# --- Persistent analysis cache ---
+def xdg_cache_dir():
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "setdeb")
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    import hashlib
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class AnalysisCache:
+    # One JSON file per analysed .deb, keyed by (device, inode, size, mtime). Files are written with
+    # an atomic rename so concurrent installers never see partial entries; mtime doubles as LRU stamp.
+    # The file listing goes to a sidecar (<key>.files.json): with 100k+ files it would dominate every
+    # get() and put() of the entry, and only the listing, disk space and conflict checks need it.
+    FORMAT_VERSION = 2
+    MANIFEST_SUFFIX = ".files.json"
+
+    def __init__(self, directory=None, max_bytes=64 << 20, max_entries=1024, hash_fallback=False):
+        self.directory = os.path.join(directory or xdg_cache_dir(), "analysis")
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        # Hashing costs a full read of the .deb, so it is only used when asked for (copied artifacts)
+        self.hash_fallback = hash_fallback
+        self._digests = {}  # stat key -> sha256, so get() and the put()s after it hash a file once
+
+    @staticmethod
+    def stat_key(path):
+        st = os.stat(path)
+        return f"{st.st_dev:x}-{st.st_ino:x}-{st.st_size:x}-{st.st_mtime_ns:x}"
+
+    def _digest(self, path, key):
+        digest = self._digests.get(key)
+        if digest is None:
+            digest = file_sha256(path)
+            if len(self._digests) >= self.max_entries:
+                self._digests.pop(next(iter(self._digests)), None)
+            self._digests[key] = digest
+        return digest
+
+    def _entry_path(self, key, suffix=".json"):
+        return os.path.join(self.directory, key + suffix)
+
+    def _load(self, key, suffix=".json"):
+        entry_path = self._entry_path(key, suffix)
+        try:
+            with open(entry_path, encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get("format") != self.FORMAT_VERSION:
+            return None
+        try:
+            os.utime(entry_path)
+        except OSError:
+            pass
+        return entry
+
+    def _store(self, key, entry, suffix=".json"):
+        import tempfile
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-", suffix=".json")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entry, f, separators=(",", ":"))
+            os.replace(tmp_path, self._entry_path(key, suffix))
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def _get(self, path, suffix):
+        try:
+            key = self.stat_key(path)
+        except OSError:
+            return None
+        entry = self._load(key, suffix)
+        if entry is None and self.hash_fallback:
+            try:
+                entry = self._load("sha256-" + self._digest(path, key), suffix)
+                if entry is not None:
+                    self._store(key, entry, suffix)
+            except OSError:
+                pass
+        return entry
+
+    def _put(self, path, suffix, fields, merge):
+        try:
+            key = self.stat_key(path)
+            entry = (merge and self._load(key, suffix)) or {"format": self.FORMAT_VERSION}
+            entry.update(fields)
+            self._store(key, entry, suffix)
+            if self.hash_fallback:
+                self._store("sha256-" + self._digest(path, key), entry, suffix)
+            self.evict()
+        except (OSError, TypeError, ValueError):
+            # A value json cannot encode only costs the cache entry, never the analysis
+            return False
+        return True
+
+    def get(self, path):
+        return self._get(path, ".json")
+
+    def put(self, path, **fields):
+        # Merges fields (control, depends, integrity, ...) into the entry for path
+        return self._put(path, ".json", fields, merge=True)
+
+    def get_manifest(self, path):
+        # (path, size, kind) rows of the package's data.tar, or None
+        entry = self._get(path, self.MANIFEST_SUFFIX)
+        return entry["files"] if entry is not None else None
+
+    def has_manifest(self, path):
+        try:
+            return os.path.exists(self._entry_path(self.stat_key(path), self.MANIFEST_SUFFIX))
+        except OSError:
+            return False
+
+    def put_manifest(self, path, manifest):
+        return self._put(path, self.MANIFEST_SUFFIX, {"files": manifest}, merge=False)
+
+    def evict(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, ".lock"), "a") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return  # another instance is already evicting
+            # An entry and its manifest sidecar are evicted together, as one unit
+            units = {}  # key -> [newest mtime, total size, paths]
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith(".json") and not entry.name.startswith("."):
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    key = entry.name[:-len(self.MANIFEST_SUFFIX if entry.name.endswith(self.MANIFEST_SUFFIX)
+                                           else ".json")]
+                    unit = units.setdefault(key, [0, 0, []])
+                    unit[0] = max(unit[0], st.st_mtime_ns)
+                    unit[1] += st.st_size
+                    unit[2].append(entry.path)
+            entries = sorted(units.values(), key=itemgetter(0))
+            total = sum(size for _, size, _ in entries)
+            while entries and (total > self.max_bytes or len(entries) > self.max_entries):
+                _, size, paths = entries.pop(0)
+                for entry_path in paths:
+                    try:
+                        os.unlink(entry_path)
+                    except OSError:
+                        pass
+                total -= size
+
+
+# --- Command line input ---
+def collect_deb_paths(args):
+    # Files are taken as given, directories contribute their *.deb files; raises ValueError on bad input
+    paths = []
+    for arg in args:
+        path = os.path.abspath(arg)
+        if os.path.isdir(path):
+            paths.extend(sorted(os.path.join(path, name) for name in os.listdir(path)
+                                if name.lower().endswith(".deb") and os.path.isfile(os.path.join(path, name))))
+        elif os.path.isfile(path) and path.lower().endswith(".deb"):
+            paths.append(path)
+        else:
+            raise ValueError(f"The file '{os.path.basename(path)}' is not a valid .deb file.")
+    if not paths:
+        raise ValueError("No .deb files were found.")
+    return list(dict.fromkeys(paths))
+
+
+# --- Debian version ordering (same algorithm as dpkg's verrevcmp) ---
+def _version_char_order(c):
+    if c == "~":
+        return -1
+    if c.isascii() and c.isalpha():
+        return ord(c)
+    return ord(c) + 256
+
+
+def _compare_version_part(a, b):
+    i = j = 0
+    while i < len(a) or j < len(b):
+        first_diff = 0
+        while (i < len(a) and not a[i].isdigit()) or (j < len(b) and not b[j].isdigit()):
+            ac = _version_char_order(a[i]) if i < len(a) and not a[i].isdigit() else 0
+            bc = _version_char_order(b[j]) if j < len(b) and not b[j].isdigit() else 0
+            if ac != bc:
+                return -1 if ac < bc else 1
+            i += 1
+            j += 1
+        while i < len(a) and a[i] == "0":
+            i += 1
+        while j < len(b) and b[j] == "0":
+            j += 1
+        while i < len(a) and a[i].isdigit() and j < len(b) and b[j].isdigit():
+            if not first_diff:
+                first_diff = ord(a[i]) - ord(b[j])
+            i += 1
+            j += 1
+        if i < len(a) and a[i].isdigit():
+            return 1
+        if j < len(b) and b[j].isdigit():
+            return -1
+        if first_diff:
+            return -1 if first_diff < 0 else 1
+    return 0
+
+
+def split_version(version):
+    # dpkg: the epoch ends at the first colon, the revision starts after the last hyphen
+    epoch, _, rest = version.strip().partition(":") if ":" in version else ("0", "", version.strip())
+    upstream, _, revision = rest.rpartition("-") if "-" in rest else (rest, "", "")
+    try:
+        epoch = int(epoch or 0)
+    except ValueError:
+        epoch = 0
+    return epoch, upstream, revision
+
+
+def compare_versions(a, b):
+    # Returns -1, 0 or 1 following Debian policy ordering (epoch, upstream, revision, '~' sorts first)
+    ea, ua, ra = split_version(a)
+    eb, ub, rb = split_version(b)
+    if ea != eb:
+        return -1 if ea < eb else 1
+    return _compare_version_part(ua, ub) or _compare_version_part(ra, rb)
+
+
+# --- Installed package index (/var/lib/dpkg/status) ---
+InstalledPackage = namedtuple("InstalledPackage", "name arch version state")
+PackageQuery = namedtuple("PackageQuery", "name state installed_version relation")
+# dpkg counts a package whose triggers are still due (e.g. after an install that deferred them) as
+# installed; a half-configured one still satisfies dependencies on what it provides
+INSTALLED_STATES = frozenset(("installed", "triggers-awaited", "triggers-pending"))
+PROVIDING_STATES = INSTALLED_STATES | {"half-configured"}
+
+_STATUS_FIELDS_RE = re.compile(rb"\n(Package|Status|Version|Architecture|Provides):[ \t]*([^\n]*)")
+
+
+def _iter_fields(buffer, pattern):
+    # Anchoring on a literal newline is ~3x faster than re.M '^'; the first line is checked by hand
+    first = re.match(pattern.pattern[2:], buffer[:buffer.find(b"\n") if b"\n" in buffer[:4096] else 4096])
+    if first:
+        yield first.group(1), first.group(2).strip(), 0
+    for match in pattern.finditer(buffer):
+        yield match.group(1), match.group(2).strip(), match.start() + 1
+
+
+def _index_status_file(path):
+    # One regex pass over the mmapped file; continuation lines start with a space, so only real
+    # field lines can match. Returns ({name: [InstalledPackage, ...]}, {virtual: [(provider, version)]}).
+    packages, provides = {}, {}
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return packages, provides
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            record = {}
+            for field, value, _ in _iter_fields(mm, _STATUS_FIELDS_RE):
+                if field == b"Package" and record:
+                    _add_status_record(packages, provides, record)
+                    record = {}
+                record[field] = value.decode("utf-8", "replace")
+            if record:
+                _add_status_record(packages, provides, record)
+    return packages, provides
+
+
+def _add_status_record(packages, provides, record):
+    name = record.get(b"Package")
+    if not name:
+        return
+    status = record.get(b"Status", "install ok installed").split()
+    entry = InstalledPackage(sys.intern(name), record.get(b"Architecture", "all"),
+                             record.get(b"Version", ""), status[-1] if status else "unknown")
+    packages.setdefault(entry.name, []).append(entry)
+    if entry.state in PROVIDING_STATES and record.get(b"Provides"):
+        for group in parse_relations(record[b"Provides"]):
+            for provided in group:
+                provides.setdefault(provided.name, []).append((entry.name, provided.version or entry.version))
+
+
+class DpkgStatusIndex:
+    # Re-indexes a database file only when its (inode, size, mtime) changes, so repeated queries
+    # cost one stat() per file instead of a dpkg process each.
+    def __init__(self, status_path="/var/lib/dpkg/status", available_path="/var/lib/dpkg/available"):
+        self.status_path = status_path
+        self.available_path = available_path
+        self._stamps = {}
+        self._installed = {}
+        self._provides = {}
+        self._available = {}
+
+    def _reload_if_changed(self, path):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            if path == self.status_path:
+                raise
+            return None
+        stamp = (st.st_ino, st.st_size, st.st_mtime_ns)
+        if self._stamps.get(path) == stamp:
+            return None
+        indexed = _index_status_file(path)
+        self._stamps[path] = stamp
+        return indexed
+
+    def refresh(self, include_available=False):
+        # The available file is only indexed once somebody asks about it
+        indexed = self._reload_if_changed(self.status_path)
+        if indexed is not None:
+            self._installed, self._provides = indexed
+        if include_available and self.available_path:
+            indexed = self._reload_if_changed(self.available_path)
+            if indexed is not None:
+                self._available = indexed[0]
+
+    def lookup(self, name, arch=None):
+        self.refresh()
+        candidates = [p for p in self._installed.get(name, ())
+                      if arch in (None, "all", p.arch) or p.arch == "all"]
+        for entry in candidates:
+            if entry.state in INSTALLED_STATES:
+                return entry
+        return candidates[0] if candidates else None
+
+    def is_installed(self, name, arch=None):
+        entry = self.lookup(name, arch)
+        return entry is not None and entry.state in INSTALLED_STATES
+
+    def installed_version(self, name, arch=None):
+        entry = self.lookup(name, arch)
+        return entry.version if entry is not None and entry.state in INSTALLED_STATES else None
+
+    def providers(self, virtual_name):
+        self.refresh()
+        return self._provides.get(virtual_name, [])
+
+    def available_version(self, name):
+        self.refresh(include_available=True)
+        versions = [p.version for p in self._available.get(name, ()) if p.version]
+        best = None
+        for version in versions:
+            if best is None or compare_versions(version, best) > 0:
+                best = version
+        return best
+
+    def query(self, packages):
+        # packages: iterable of (name, version[, arch]); relation is how the installed copy compares
+        results = []
+        for item in packages:
+            name, version = item[0], item[1]
+            entry = self.lookup(name, item[2] if len(item) > 2 else None)
+            if entry is None or entry.state not in INSTALLED_STATES:
+                results.append(PackageQuery(name, entry.state if entry else "not-installed", None, "not-installed"))
+                continue
+            order = compare_versions(entry.version, version) if version else 0
+            relation = "same" if order == 0 else ("older" if order < 0 else "newer")
+            results.append(PackageQuery(name, entry.state, entry.version, relation))
+        return results
+
+
+# --- File ownership index (/var/lib/dpkg/info/*.list) ---
+FileConflict = namedtuple("FileConflict", "path owners")
+
+
+class FileOwnerIndex:
+    # Every path dpkg knows about, sorted, with a parallel array of owner ids into self.packages.
+    # Paths shared by several packages (directories mostly) appear once per owner. The arrays are
+    # cached on disk with the (mtime, size) of each .list, so a refresh only re-reads lists that
+    # changed since the last run.
+    FORMAT_VERSION = 1
+    MAX_PATCHED = 16  # changed packages above which the index is rebuilt from scratch
+    MAX_INSERTED = 2000  # new paths inserted in place; more than that are merged with a sort
+
+    def __init__(self, info_dir="/var/lib/dpkg/info", diversions_path="/var/lib/dpkg/diversions",
+                 cache_dir=None):
+        self.info_dir = info_dir
+        self.diversions_path = diversions_path
+        self.cache_dir = os.path.join(cache_dir or xdg_cache_dir(), "owners")
+        self.packages = []      # owner id -> "name" or "name:arch", as the .list file is named
+        self.paths = []
+        self.owners = array("I")
+        self.diversions = {}    # diverted path -> diverting package
+        self._stamps = {}       # package -> [mtime_ns, size] of its .list
+        self._loaded = False
+
+    def _scan_lists(self):
+        stamps = {}
+        with os.scandir(self.info_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith(".list"):
+                    st = entry.stat()
+                    stamps[entry.name[:-5]] = [st.st_mtime_ns, st.st_size]
+        return stamps
+
+    def _read_list(self, package):
+        with open(os.path.join(self.info_dir, package + ".list"), "rb") as f:
+            paths = f.read().decode("utf-8", "surrogateescape").split("\n")
+        return [path for path in paths if path and path != "/."]
+
+    def _cache_path(self):
+        # marshal is the fastest loader for ~10^5 strings, but its format is per Python version
+        return os.path.join(self.cache_dir, f"index-{sys.version_info[0]}.{sys.version_info[1]}.marshal")
+
+    def _load_cache(self):
+        try:
+            with open(self._cache_path(), "rb") as f:
+                version, packages, stamps, paths, owner_bytes = marshal.loads(f.read())
+        except (OSError, ValueError, EOFError, TypeError):
+            return False
+        owners = array("I")
+        owners.frombytes(owner_bytes)
+        if version != self.FORMAT_VERSION or len(paths) != len(owners):
+            return False
+        self.packages, self._stamps, self.paths, self.owners = packages, stamps, paths, owners
+        return True
+
+    def _save_cache(self):
+        # One file, replaced atomically, so readers never pair new stamps with old arrays
+        import tempfile
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(marshal.dumps((self.FORMAT_VERSION, self.packages, self._stamps, self.paths,
+                                       self.owners.tobytes())))
+            os.replace(tmp_path, self._cache_path())
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def refresh(self):
+        # -> number of .list files that had to be read
+        stamps = self._scan_lists()
+        if not self._loaded:
+            self._load_cache()
+            self._loaded = True
+        changed = [name for name, stamp in stamps.items() if self._stamps.get(name) != stamp]
+        removed = [name for name in self._stamps if name not in stamps]
+        self._load_diversions()
+        if not changed and not removed:
+            return 0
+
+        ids = {name: owner for owner, name in enumerate(self.packages) if name is not None}
+        dropped = {ids[name] for name in changed + removed if name in ids}
+        if not ids or len(dropped) > self.MAX_PATCHED or (self.packages.count(None) + len(removed)) * 4 > len(stamps):
+            # No cache, or so much changed that reading every list beats patching the arrays
+            self.packages, self.paths, self.owners = [], [], array("I")
+            ids, dropped, changed = {}, set(), list(stamps)
+        paths, owners = self.paths, self.owners
+        doomed = []
+        for owner in dropped:
+            # One C-level scan per replaced package; the rows come out again below
+            position = -1
+            try:
+                while True:
+                    position = owners.index(owner, position + 1)
+                    doomed.append(position)
+            except ValueError:
+                pass
+        for position in sorted(doomed, reverse=True):
+            del paths[position]
+            del owners[position]
+        for name in removed:
+            if name in ids:
+                self.packages[ids[name]] = None  # ids stay stable; holes go away on the next full build
+
+        added_paths, added_owners = [], array("I")
+        for name in changed:
+            try:
+                new_paths = self._read_list(name)
+            except OSError:
+                stamps.pop(name, None)
+                continue
+            owner = ids.get(name)
+            if owner is None:
+                owner = len(self.packages)
+                self.packages.append(name)
+            added_paths += new_paths
+            added_owners.extend([owner] * len(new_paths))
+        if len(added_paths) <= self.MAX_INSERTED:
+            for path, owner in zip(added_paths, added_owners):
+                position = bisect.bisect_right(paths, path)
+                paths.insert(position, path)
+                owners.insert(position, owner)
+        else:
+            # The old rows are one sorted run already, so this sort is close to a linear merge
+            paths += added_paths
+            owners += added_owners
+            order = sorted(range(len(paths)), key=paths.__getitem__)
+            if len(order) > 1:
+                pick = itemgetter(*order)
+                paths, owners = list(pick(paths)), array("I", pick(owners))
+        self.paths, self.owners = paths, owners
+        self._stamps = stamps
+        try:
+            self._save_cache()
+        except OSError:
+            pass
+        return len(changed)
+
+    def _load_diversions(self):
+        # Triples of lines: diverted path, divert-to path, diverting package (":" for local)
+        try:
+            with open(self.diversions_path, encoding="utf-8", errors="surrogateescape") as f:
+                lines = f.read().split("\n")
+        except OSError:
+            lines = []
+        self.diversions = {lines[i]: lines[i + 2] for i in range(0, len(lines) - 2, 3)}
+
+    def owners_of(self, path):
+        position = bisect.bisect_left(self.paths, path)
+        found = []
+        while position < len(self.paths) and self.paths[position] == path:
+            found.append(self.packages[self.owners[position]])
+            position += 1
+        return found
+
+    def conflicts(self, manifest, package, replaces=()):
+        # manifest: (path, size, kind) rows of the new package. Files (not directories) owned by
+        # another package are conflicts, unless that package is listed in replaces or dpkg would
+        # divert the path anyway. Both sides are sorted, so this is one merge pass.
+        allowed = {package, *replaces}
+        new_paths = sorted(path for path, _, kind in manifest if kind != "d")
+        found = []
+        paths, owners, packages = self.paths, self.owners, self.packages
+        position, end = 0, len(paths)
+        for path in new_paths:
+            position = bisect.bisect_left(paths, path, position, end)
+            if position == end:
+                break
+            if paths[position] != path:
+                continue
+            others = []
+            cursor = position
+            while cursor < end and paths[cursor] == path:
+                name = packages[owners[cursor]].split(":", 1)[0]
+                if name not in allowed:
+                    others.append(name)
+                cursor += 1
+            diverter = self.diversions.get(path)
+            if others and (diverter is None or diverter == package):
+                found.append(FileConflict(path, others))
+        return found
+
+    def batch_conflicts(self, batch):
+        # batch: (package, manifest, replaces) of the packages installed in one transaction. dpkg
+        # refuses a file another package of the batch has just unpacked as it would an installed one,
+        # unless one of the two replaces the other. FileConflict.owners lists the packages involved.
+        shipped = {}
+        for package, manifest, _ in batch:
+            for path, _, kind in manifest:
+                if kind != "d":
+                    shipped.setdefault(path, set()).add(package)
+        replaces = {package: set(names) for package, _, names in batch}
+        found = []
+        for path in sorted(shipped):
+            packages = sorted(shipped[path])
+            if len(packages) < 2 or path in self.diversions:
+                continue  # a diverted path is only written by its diverter
+            clashing = {a for a in packages for b in packages
+                        if a != b and b not in replaces[a] and a not in replaces[b]}
+            if clashing:
+                found.append(FileConflict(path, sorted(clashing)))
+        return found
+
+
+# --- Dependency relations ---
+Relation = namedtuple("Relation", "name arch op version")
+
+_RELATION_RE = re.compile(
+    r"^\s*([A-Za-z0-9][A-Za-z0-9+.\-]*)(?::([A-Za-z0-9\-]+))?\s*"
+    r"(?:\(\s*(<<|<=|=|>=|>>|<|>)\s*([^)\s]+)\s*\))?\s*(?:\[[^\]]*\])?\s*(?:<[^>]*>\s*)*$")
+
+
+def parse_relations(text):
+    # "a (>= 1) | b:any, c" -> [[Relation(a, None, '>=', '1'), Relation(b, 'any', None, None)], [...]]
+    groups = []
+    for group_text in (text or "").split(","):
+        group = []
+        for alternative in group_text.split("|"):
+            match = _RELATION_RE.match(alternative)
+            if match:
+                name, arch, op, version = match.groups()
+                # '<' and '>' are the deprecated spellings of '<=' and '>='
+                op = {"<": "<=", ">": ">="}.get(op, op)
+                group.append(Relation(name, arch, op, version))
+        if group:
+            groups.append(group)
+    return groups
+
+
+def format_relation(relation):
+    text = relation.name + (f":{relation.arch}" if relation.arch else "")
+    return text + (f" ({relation.op} {relation.version})" if relation.op else "")
+
+
+def version_satisfies(version, op, required):
+    if op is None:
+        return True
+    if version is None:
+        return False
+    order = compare_versions(version, required)
+    return {"<<": order < 0, "<=": order <= 0, "=": order == 0, ">=": order >= 0, ">>": order > 0}[op]
+
+
+# --- Package lists index (/var/lib/apt/lists/*_Packages) ---
+AptCandidate = namedtuple("AptCandidate", "name version arch file_id offset")
+
+_LISTS_FIELDS_RE = re.compile(rb"\n(Package|Version|Architecture|Provides):[ \t]*([^\n]*)")
+
+
+class AptListsIndex:
+    # Only Package/Version/Architecture/Provides and the paragraph offset are kept in memory; the
+    # remaining fields (Depends, Size, ...) are parsed from the mmapped list when a candidate is used.
+    def __init__(self, lists_dir="/var/lib/apt/lists"):
+        self.lists_dir = lists_dir
+        self._stamp = None
+        self._buffers = []
+        self.packages = {}
+        self.provides = {}
+
+    def _list_files(self):
+        try:
+            names = sorted(os.listdir(self.lists_dir))
+        except OSError:
+            return []
+        return [os.path.join(self.lists_dir, name) for name in names
+                if name.endswith(("_Packages", "_Packages.gz", "_Packages.xz"))]
+
+    def refresh(self):
+        files = self._list_files()
+        stamp = []
+        for path in files:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            stamp.append((path, st.st_size, st.st_mtime_ns))
+        if stamp == self._stamp:
+            return
+        self._close()
+        for path, _, _ in stamp:
+            self._index_file(path)
+        self._stamp = stamp
+
+    def _close(self):
+        for buffer in self._buffers:
+            if isinstance(buffer, mmap.mmap):
+                buffer.close()
+        self._buffers, self.packages, self.provides = [], {}, {}
+
+    def _index_file(self, path):
+        try:
+            if path.endswith(".gz"):
+                with gzip.open(path, "rb") as f:
+                    buffer = f.read()
+            elif path.endswith(".xz"):
+                with lzma.open(path, "rb") as f:
+                    buffer = f.read()
+            else:
+                with open(path, "rb") as f:
+                    if os.fstat(f.fileno()).st_size == 0:
+                        return
+                    buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except OSError:
+            return
+        file_id = len(self._buffers)
+        self._buffers.append(buffer)
+
+        record, offset = {}, 0
+        for field, value, start in _iter_fields(buffer, _LISTS_FIELDS_RE):
+            if field == b"Package":
+                self._add(record, file_id, offset)
+                record, offset = {}, start
+            record[field] = value
+        self._add(record, file_id, offset)
+
+    def _add(self, record, file_id, offset):
+        name = record.get(b"Package")
+        if not name:
+            return
+        # Values stay bytes until here and are decoded once per package
+        candidate = AptCandidate(sys.intern(name.decode("utf-8", "replace")),
+                                 record.get(b"Version", b"").decode("utf-8", "replace"),
+                                 sys.intern(record.get(b"Architecture", b"all").decode("ascii", "replace")),
+                                 file_id, offset)
+        self.packages.setdefault(candidate.name, []).append(candidate)
+        if b"Provides" not in record:
+            return
+        for group in parse_relations(record[b"Provides"].decode("utf-8", "replace")):
+            for provided in group:
+                self.provides.setdefault(provided.name, []).append((candidate, provided.version))
+
+    def control(self, candidate):
+        buffer = self._buffers[candidate.file_id]
+        end = buffer.find(b"\n\n", candidate.offset)
+        raw = buffer[candidate.offset:end if end != -1 else len(buffer)]
+        return parse_control(raw.decode("utf-8", "replace"))
+
+    def candidates(self, name):
+        self.refresh()
+        return self.packages.get(name, [])
+
+
+# --- Offline dependency preflight ---
+PlanEntry = namedtuple("PlanEntry", "name version arch size installed_size sha256")
+
+
+class InstallPlan:
+    def __init__(self):
+        self.local = []        # packages from the .deb files being installed
+        self.install = []      # PlanEntry for every archive package apt will have to fetch
+        self.unmet = []        # human readable unsatisfiable relations
+        self.conflicts = []
+
+    @property
+    def download_size(self):
+        return sum(entry.size for entry in self.install)
+
+    @property
+    def installed_size(self):
+        # KiB, as in the Installed-Size field
+        return sum(entry.installed_size for entry in self.install)
+
+    def to_dict(self):
+        return {
+            "local": list(self.local),
+            "install": [entry._asdict() for entry in self.install],
+            "download_size": self.download_size,
+            "installed_size": self.installed_size,
+            "unmet": list(self.unmet),
+            "conflicts": list(self.conflicts),
+        }
+
+
+def native_architecture(status_index):
+    entry = status_index.lookup("dpkg")
+    if entry is not None and entry.arch not in ("all", ""):
+        return entry.arch
+    import subprocess
+    try:
+        return subprocess.check_output(["dpkg", "--print-architecture"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "amd64"
+
+
+def _int_field(fields, name):
+    try:
+        return int(fields.get(name, "0") or 0)
+    except ValueError:
+        return 0
+
+
+class DependencyResolver:
+    # Greedy first-alternative resolver in the spirit of apt's: good enough to predict the plan and
+    # to catch unsatisfiable or conflicting relations before anything runs as root.
+    def __init__(self, status_index, lists_index, arch=None):
+        self.status_index = status_index
+        self.lists_index = lists_index
+        self.arch = arch or native_architecture(status_index)
+
+    def _arch_ok(self, candidate_arch, wanted):
+        if wanted in ("any", "native") or wanted is None:
+            return candidate_arch in (self.arch, "all") or wanted == "any"
+        return candidate_arch in (wanted, "all")
+
+    def _selected_satisfies(self, selected, relation):
+        entry = selected.get(relation.name)
+        if entry is not None and version_satisfies(entry[0], relation.op, relation.version):
+            return True
+        for provider_version in self._selected_provides.get(relation.name, ()):
+            if relation.op is None or version_satisfies(provider_version, relation.op, relation.version):
+                return True
+        return False
+
+    def _installed_satisfies(self, selected, relation):
+        if relation.name in selected:
+            return False  # being replaced; only the new version counts
+        version = self.status_index.installed_version(relation.name)
+        if version is not None and version_satisfies(version, relation.op, relation.version):
+            return True
+        for provider, provided_version in self.status_index.providers(relation.name):
+            if provider not in selected and (relation.op is None or
+                                             version_satisfies(provided_version, relation.op, relation.version)):
+                return True
+        return False
+
+    def _best_candidate(self, relation):
+        best = None
+        for candidate in self.lists_index.candidates(relation.name):
+            if self._arch_ok(candidate.arch, relation.arch) and \
+                    version_satisfies(candidate.version, relation.op, relation.version):
+                if best is None or compare_versions(candidate.version, best.version) > 0:
+                    best = candidate
+        if best is None:
+            for candidate, provided_version in self.lists_index.provides.get(relation.name, ()):
+                if self._arch_ok(candidate.arch, relation.arch) and \
+                        (relation.op is None or version_satisfies(provided_version, relation.op, relation.version)):
+                    return candidate
+        return best
+
+    def _select(self, selected, name, version, fields):
+        selected[name] = (version, fields)
+        for group in parse_relations(fields.get("Provides", "")):
+            for provided in group:
+                self._selected_provides.setdefault(provided.name, []).append(provided.version or version)
+
+    def resolve(self, controls):
+        # controls: parsed control paragraphs of the local .deb files
+        self.lists_index.refresh()
+        plan = InstallPlan()
+        selected = {}
+        self._selected_provides = {}
+        queue = []
+        for fields in controls:
+            name = fields.get("Package", "")
+            plan.local.append(name)
+            self._select(selected, name, fields.get("Version", ""), fields)
+        for fields in controls:
+            queue.append(fields)
+
+        while queue:
+            fields = queue.pop(0)
+            owner = fields.get("Package", "?")
+            for group in parse_relations(fields.get("Pre-Depends", "")) + parse_relations(fields.get("Depends", "")):
+                if any(self._selected_satisfies(selected, rel) or self._installed_satisfies(selected, rel)
+                       for rel in group):
+                    continue
+                for relation in group:
+                    candidate = self._best_candidate(relation)
+                    if candidate is None or candidate.name in selected:
+                        continue
+                    candidate_fields = self.lists_index.control(candidate)
+                    self._select(selected, candidate.name, candidate.version, candidate_fields)
+                    plan.install.append(PlanEntry(candidate.name, candidate.version, candidate.arch,
+                                                  _int_field(candidate_fields, "Size"),
+                                                  _int_field(candidate_fields, "Installed-Size"),
+                                                  candidate_fields.get("SHA256", "")))
+                    queue.append(candidate_fields)
+                    break
+                else:
+                    plan.unmet.append(f"{owner} depends on {' | '.join(format_relation(r) for r in group)}")
+
+        for name, (version, fields) in selected.items():
+            for field in ("Conflicts", "Breaks"):
+                for group in parse_relations(fields.get(field, "")):
+                    for relation in group:
+                        if relation.name == name:
+                            continue
+                        if relation.name in selected:
+                            other_version = selected[relation.name][0]
+                        else:
+                            other_version = self.status_index.installed_version(relation.name)
+                        if other_version is not None and version_satisfies(other_version, relation.op, relation.version):
+                            plan.conflicts.append(f"{name} {field.lower()} {format_relation(relation)} "
+                                                  f"({relation.name} {other_version} would be present)")
+        return plan
+
+
+# --- apt Status-Fd progress ---
+class AptProgressEngine:
+    # Turns APT::Status-Fd records (dlstatus/pmstatus) into one monotonic percentage. The download
+    # and dpkg phases are weighted by real byte counts plus a fixed cost per package for the
+    # maintainer scripts, so a transaction dominated by a big download is not reported as
+    # mostly "installing".
+    INSTALL_BYTE_COST = 0.5          # unpacking a byte is cheaper than fetching it
+    PACKAGE_COST = 512 * 1024        # per-package maintainer script overhead, in byte equivalents
+    TRIGGER_SECOND_COST = 8 << 20    # a second of trigger processing; dpkg unpacks ~16 MB in that time
+
+    def __init__(self, download_bytes=0, install_bytes=0, package_count=1, start=10, end=98,
+                 trigger_seconds=0.0, trigger_count=0):
+        self.start = start
+        self.end = end
+        self.package_count = max(1, package_count)
+        self.download_weight = max(0, download_bytes)
+        self.install_weight = max(0, install_bytes) * self.INSTALL_BYTE_COST + self.package_count * self.PACKAGE_COST
+        # Deferred triggers run as one pass after every package is set up: a step of its own
+        self.trigger_weight = max(0.0, trigger_seconds) * self.TRIGGER_SECOND_COST
+        self.trigger_count = trigger_count
+        self.download_fraction = 0.0
+        self.install_fraction = 0.0
+        self.trigger_fraction = 0.0
+        self.configured = set()
+        self.triggered = []
+        self.percent = start
+        self.text = ""
+        self.errors = []
+
+    def _overall(self):
+        total = self.download_weight + self.install_weight + self.trigger_weight
+        done = self.download_weight * self.download_fraction + self.install_weight * self.install_fraction + \
+            self.trigger_weight * self.trigger_fraction
+        return self.start + (self.end - self.start) * (done / total if total else 0)
+
+    def feed(self, record):
+        # Returns (percent, text) when the visible state changed, else None
+        kind, _, rest = record.strip().partition(":")
+        if kind == "processing":
+            # dpkg's own --status-fd, from the pass that runs deferred triggers
+            stage, _, package = rest.partition(":")
+            if stage.strip() != "trigproc":
+                return None
+            self.download_fraction = self.install_fraction = 1.0
+            return self._update(self._trigger_text(package.strip()))
+        package, _, rest = rest.partition(":")
+        value, _, description = rest.partition(":")
+        try:
+            fraction = min(max(float(value) / 100.0, 0.0), 1.0)
+        except ValueError:
+            fraction = None
+
+        if kind == "dlstatus" and fraction is not None:
+            self.download_fraction = max(self.download_fraction, fraction)
+            text = "Downloading..."
+        elif kind == "pmstatus" and fraction is not None:
+            # dpkg has started, so whatever apt still had to fetch is done
+            self.download_fraction = 1.0
+            self.install_fraction = max(self.install_fraction, fraction)
+            text = self._install_text(package, description)
+        elif kind == "pmerror":
+            self.errors.append(f"{package}: {description or value}")
+            return None
+        else:
+            return None
+        return self._update(text)
+
+    def _update(self, text):
+        percent = max(self.percent, int(self._overall()))
+        if percent == self.percent and text == self.text:
+            return None
+        self.percent, self.text = percent, text
+        return percent, text
+
+    def _install_text(self, package, description):
+        if description.startswith(("Installed ", "Configuring ", "Preparing to configure ")):
+            if description.startswith("Installed "):
+                self.configured.add(package)
+            return f"Setting up ({len(self.configured)}/{max(self.package_count, len(self.configured))})"
+        if "trigger" in description:
+            return self._trigger_text(package)
+        if description.startswith(("Unpacking", "Preparing")):
+            return "Unpacking..."
+        return self.text or "Installing..."
+
+    def _trigger_text(self, package):
+        # A record arrives when a package's triggers start, so the ones before it are done
+        if package not in self.triggered:
+            self.triggered.append(package)
+        total = max(self.trigger_count, len(self.triggered))
+        self.trigger_fraction = max(self.trigger_fraction, (len(self.triggered) - 1) / total)
+        return f"Processing triggers ({len(self.triggered)}/{total})..."
+
+
+def read_transcript(path):
+    # Recorded transcripts hold one "<seconds since start>\t<status record>" per line
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            stamp, _, record = line.rstrip("\n").partition("\t")
+            if record:
+                yield float(stamp), record
+
+
+def replay_transcript(records, engine, speed=0.0, sleep=time.sleep):
+    # Drives engine from recorded (timestamp, record) pairs; speed=0 replays without waiting
+    previous = None
+    for stamp, record in records:
+        if speed and previous is not None and stamp > previous:
+            sleep((stamp - previous) / speed)
+        previous = stamp
+        update = engine.feed(record)
+        if update is not None:
+            yield update
+
+
+class StatusFdReader:
+    # Reads status records from a FIFO the privileged command writes to via fd 3. The FIFO is
+    # opened read-write so neither side blocks if the other never shows up (e.g. wrong password).
+    def __init__(self, on_record, transcript_path=None):
+        import tempfile
+        self._dir = tempfile.mkdtemp(prefix="setdeb-status-")
+        self.path = os.path.join(self._dir, "status")
+        os.mkfifo(self.path, 0o600)
+        self._fd = os.open(self.path, os.O_RDWR | os.O_NONBLOCK)
+        self._on_record = on_record
+        self._stop = threading.Event()
+        self._transcript = open(transcript_path, "w", encoding="utf-8") if transcript_path else None
+        self._started = time.monotonic()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        pending = b""
+        while True:
+            readable, _, _ = select.select([self._fd], [], [], 0.1)
+            if readable:
+                try:
+                    chunk = os.read(self._fd, 1 << 16)
+                except BlockingIOError:
+                    chunk = b""
+                pending += chunk
+                *lines, pending = pending.split(b"\n")
+                for line in lines:
+                    record = line.decode("utf-8", "replace").strip()
+                    if record:
+                        if self._transcript:
+                            self._transcript.write(f"{time.monotonic() - self._started:.3f}\t{record}\n")
+                        self._on_record(record)
+            elif self._stop.is_set():
+                break
+
+    def close(self):
+        # Stops after the FIFO has been drained
+        self._stop.set()
+        self._thread.join()
+        os.close(self._fd)
+        if self._transcript:
+            self._transcript.close()
+        shutil.rmtree(self._dir, ignore_errors=True)
+
+
+def apt_record_phase(record):
+    # Which part of the transaction a Status-Fd record belongs to, or None if it does not say
+    kind, _, rest = record.partition(":")
+    if kind == "dlstatus":
+        return "download"
+    if kind == "processing":
+        return "triggers" if rest.strip().startswith("trigproc") else "configure"
+    if kind != "pmstatus":
+        return None
+    description = rest.split(":", 2)[-1]
+    if "trigger" in description:
+        return "triggers"
+    if description.startswith(("Configuring", "Installed", "Setting up", "Preparing to configure")):
+        return "configure"
+    if description.startswith(("Unpacking", "Preparing")):
+        return "unpack"
+    return None
+
+
+# --- Phase timing (Chrome trace) ---
+class _Span:
+    __slots__ = ("tracer", "name", "category", "args", "start")
+
+    def __init__(self, tracer, name, category, args):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.tracer.add(self.name, self.start, time.perf_counter(), self.category, self.args)
+        return False
+
+    def set(self, **args):
+        self.args.update(args)
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class PhaseTracer:
+    # Timed spans for the worker's phases and subprocesses. to_chrome_trace() produces the Trace
+    # Event format chrome://tracing and Perfetto open. While disabled, span() hands out one shared
+    # no-op object and add()/mark() return at once, so instrumented code pays a method call.
+    def __init__(self, enabled=False, on_span=None):
+        self.enabled = enabled
+        self.on_span = on_span
+        self.spans = []
+        self.origin = time.perf_counter()
+        self._open = {}  # track -> (name, category, start, args), see mark()
+        self._lock = threading.Lock()
+
+    def span(self, name, category="phase", **args):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, category, args)
+
+    def add(self, name, start, end, category="phase", args=None):
+        # start/end are time.perf_counter() values
+        if not self.enabled:
+            return
+        span = {"name": name, "category": category, "start": start - self.origin, "duration": end - start,
+                "thread": threading.current_thread().name, "args": args or {}}
+        self.spans.append(span)
+        if self.on_span is not None:
+            self.on_span(span)
+
+    def mark(self, track, name, category="phase", **args):
+        # For phases only seen as a stream of events: ends the span open on track and starts name
+        # there. Marking the phase that is already open is a no-op; name=None just ends it.
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        with self._lock:
+            current = self._open.get(track)
+            if current is not None and current[0] == name:
+                return
+            if current is not None:
+                del self._open[track]
+            if name is not None:
+                self._open[track] = (name, category, now, args)
+        if current is not None:
+            self.add(current[0], current[2], now, current[1], current[3])
+
+    def to_chrome_trace(self):
+        pid = os.getpid()
+        thread_ids = {}
+        events = []
+        for span in list(self.spans):
+            tid = thread_ids.setdefault(span["thread"], len(thread_ids) + 1)
+            events.append({"name": span["name"], "cat": span["category"], "ph": "X", "pid": pid, "tid": tid,
+                           "ts": round(span["start"] * 1e6, 1), "dur": round(span["duration"] * 1e6, 1),
+                           "args": span["args"]})
+        for thread, tid in thread_ids.items():
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": thread}})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write(self, path):
+        import tempfile
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=".trace-")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self.to_chrome_trace(), f)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+
+# --- Non-blocking process runner ---
+# apt/debconf chatter that is never worth showing
+NOISE_PATTERNS = (
+    "apt does not have a stable CLI interface",
+    "debconf: unable to initialize frontend: Dialog",
+    "debconf: (Dialog frontend requires a screen at least",
+    "debconf: falling back to frontend: Readline",
+)
+
+
+def classify_apt_line(stream, line):
+    # -> 'noise', 'auth-failed', 'warning', 'error' or 'info'
+    if not line.strip() or any(pattern in line for pattern in NOISE_PATTERNS):
+        return "noise"
+    if stream == "stdout":
+        return "info"
+    if "incorrect password attempt" in line:
+        return "auth-failed"
+    stripped = line.lstrip()
+    if stripped.startswith(("W:", "WARNING:", "N:")) or "warning" in stripped.lower():
+        return "warning"
+    return "error"
+
+
+class ProcessRunner:
+    # Drains stdout and stderr concurrently on an asyncio loop in the calling thread, in CHUNK_SIZE
+    # reads, so a chatty stderr can never fill its pipe and stall the child. on_line(stream, text)
+    # is called for every complete line as it arrives. With an enabled tracer the run is recorded
+    # as a "process" span carrying spawn latency, time to first line and line rate.
+    CHUNK_SIZE = 1 << 16
+    KILL_GRACE = 5.0
+
+    def __init__(self, command, on_line, stdin_data=None, timeout=None, cancel_event=None, env=None,
+                 tracer=None, name=None):
+        self.command = list(command)
+        self.on_line = on_line
+        self.stdin_data = stdin_data
+        self.timeout = timeout
+        self.cancel_event = cancel_event
+        self.env = env
+        self.tracer = tracer
+        self.name = name or os.path.basename(self.command[0])
+        self.timed_out = False
+        self.cancelled = False
+        self.line_counts = {"stdout": 0, "stderr": 0}
+        self.byte_count = 0
+        self.spawn_seconds = None
+        self.first_line_at = None
+
+    def run(self):
+        import asyncio
+        started = time.perf_counter()
+        return_code = None
+        try:
+            return_code = asyncio.run(self._run())
+        finally:
+            if self.tracer is not None and self.tracer.enabled:
+                self._trace(started, time.perf_counter(), return_code)
+        return return_code
+
+    def _trace(self, started, ended, return_code):
+        lines = self.line_counts["stdout"] + self.line_counts["stderr"]
+        args = {"command": self.name, "returncode": return_code, "stdout_lines": self.line_counts["stdout"],
+                "stderr_lines": self.line_counts["stderr"], "bytes": self.byte_count,
+                "lines_per_s": round(lines / (ended - started), 1) if ended > started else 0.0,
+                "cancelled": self.cancelled, "timed_out": self.timed_out}
+        if self.spawn_seconds is not None:
+            args["spawn_ms"] = round(self.spawn_seconds * 1000, 3)
+        if self.first_line_at is not None:
+            args["first_line_ms"] = round((self.first_line_at - started) * 1000, 3)
+        self.tracer.add(self.name, started, ended, "process", args)
+
+    async def _pump(self, stream, name):
+        pending = b""
+        while chunk := await stream.read(self.CHUNK_SIZE):
+            self.byte_count += len(chunk)
+            pending += chunk
+            if b"\n" not in chunk:
+                continue
+            *lines, pending = pending.split(b"\n")
+            for line in lines:
+                self._deliver(name, line)
+        if pending:
+            self._deliver(name, pending)
+
+    def _deliver(self, name, raw):
+        if self.first_line_at is None:
+            self.first_line_at = time.perf_counter()
+        self.line_counts[name] += 1
+        self.on_line(name, raw.decode("utf-8", "replace").rstrip("\r"))
+
+    async def _watch(self, process):
+        import asyncio
+        deadline = time.monotonic() + self.timeout if self.timeout else None
+        while process.returncode is None:
+            if self.cancel_event is not None and self.cancel_event.is_set():
+                self.cancelled = True
+                break
+            if deadline is not None and time.monotonic() >= deadline:
+                self.timed_out = True
+                break
+            await asyncio.sleep(0.1)
+        else:
+            return
+        process.terminate()
+        try:
+            await asyncio.wait_for(process.wait(), self.KILL_GRACE)
+        except asyncio.TimeoutError:
+            process.kill()
+
+    async def _run(self):
+        import asyncio
+        spawn_started = time.perf_counter()
+        process = await asyncio.create_subprocess_exec(
+            *self.command, env=self.env,
+            stdin=asyncio.subprocess.PIPE if self.stdin_data is not None else asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+        self.spawn_seconds = time.perf_counter() - spawn_started
+        if self.stdin_data is not None:
+            try:
+                process.stdin.write(self.stdin_data)
+                await process.stdin.drain()
+                process.stdin.close()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+        watcher = asyncio.ensure_future(self._watch(process))
+        await asyncio.gather(self._pump(process.stdout, "stdout"), self._pump(process.stderr, "stderr"))
+        return_code = await process.wait()
+        await watcher
+        return return_code
+
+
+# --- Install log buffering ---
+class LogRing:
+    # Bounded, thread-safe buffer between the worker and the UI. The worker appends every line;
+    # the UI drains it on a timer, so a flood of apt output costs one repaint per tick. Lines that
+    # fall out of the ring before being drained are still written to the on-disk log.
+    def __init__(self, capacity=5000):
+        self._lines = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._dropped = 0
+        self._file = None
+        self.log_path = None
+
+    def append(self, line):
+        with self._lock:
+            if len(self._lines) == self._lines.maxlen:
+                self._dropped += 1
+            self._lines.append(line)
+            if self._file is not None:
+                self._file.write(line + "\n")
+
+    def drain(self):
+        # -> (lines, number of lines dropped since the last drain)
+        with self._lock:
+            lines, dropped = list(self._lines), self._dropped
+            self._lines.clear()
+            self._dropped = 0
+        return lines, dropped
+
+    def open_file(self, directory=None, keep=20):
+        directory = directory or os.path.join(xdg_cache_dir(), "logs")
+        os.makedirs(directory, exist_ok=True)
+        logs = sorted(name for name in os.listdir(directory) if name.startswith("install-"))
+        for name in logs[:max(0, len(logs) - keep + 1)]:
+            try:
+                os.unlink(os.path.join(directory, name))
+            except OSError:
+                pass
+        path = os.path.join(directory, time.strftime("install-%Y%m%d-%H%M%S.log"))
+        with self._lock:
+            self._file = open(path, "a", encoding="utf-8", buffering=1 << 16)
+            self.log_path = path
+        return path
+
+    def close_file(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+# --- Privileged helper client (server side in setdeb_helper.py) ---
+# One JSON object per line in both directions over a Unix stream socket. Requests carry an "op",
+# replies an "event"; everything belonging to a job carries its "job" id.
+HELPER_PROTOCOL = 1
+HELPER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "setdeb_helper.py")
+
+
+class HelperError(Exception):
+    pass
+
+
+def helper_socket_path():
+    # Per user: any wizard or CLI instance of the same user finds the same helper
+    if os.environ.get("SETDEB_HELPER_SOCKET"):
+        return os.environ["SETDEB_HELPER_SOCKET"]
+    runtime = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime and os.path.isdir(runtime):
+        return os.path.join(runtime, "setdeb-helper.sock")
+    import tempfile
+    return os.path.join(_private_dir(os.path.join(tempfile.gettempdir(), f"setdeb-{os.getuid()}")), "helper.sock")
+
+
+def _private_dir(path):
+    # The temp dir is shared with every other user, who could have created this directory first and
+    # planted a socket impersonating the helper: it must be a real directory, ours, closed to others
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise HelperError(f"{path} is not a private directory of this user; refusing to use it.")
+    return path
+
+
+def peer_uid(sock):
+    # uid of the process on the other end of a connected Unix socket, as the kernel reports it
+    import socket
+    creds = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+    return struct.unpack("3i", creds)[1]
+
+
+def apt_status_command(fifo_path, command):
+    # Points fd 3 at the Status-Fd FIFO before exec'ing apt; works behind sudo and in the helper
+    return ['sh', '-c', 'exec 3>"$0"; exec "$@"', fifo_path] + list(command) + ['-o', 'APT::Status-Fd=3']
+
+
+# apt normally lets dpkg run triggers (ldconfig, man-db, icon caches, ...) after every dpkg call it
+# makes. With NoTriggers they wait for apt's final "dpkg --configure --pending" and run once.
+APT_DEFER_TRIGGERS = ['-o', 'DPkg::NoTriggers=true']
+# Leaves out that final pass too; the helper runs it itself once no more installs are queued
+APT_SKIP_CONFIGURE_PENDING = ['-o', 'DPkg::ConfigurePending=false']
+
+
+def dpkg_pending_command(fifo_path):
+    # Configures whatever an install left unconfigured and processes the deferred triggers,
+    # reporting on fd 3 in dpkg's own --status-fd format ("processing: trigproc: <package>")
+    return ['sh', '-c', 'exec 3>"$0"; exec "$@"', fifo_path, 'dpkg', '--configure', '--pending', '--status-fd', '3']
+
+
+class HelperClient:
+    # One connection per job keeps the event stream trivially ordered. Package paths go to whoever
+    # listens on the socket, so it must be root; stand_in also accepts a helper run by this user.
+    def __init__(self, path=None, timeout=5.0, stand_in=False):
+        import socket
+        self.path = path or helper_socket_path()
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._buffer = b""
+        try:
+            self._sock.settimeout(timeout)
+            self._sock.connect(self.path)
+            uid = peer_uid(self._sock)
+            if uid != 0 and not (stand_in and uid == os.getuid()):
+                raise HelperError(f"Install helper at {self.path} is run by uid {uid}, not root; refusing it.")
+            self.send("hello")
+            self.info = self.read_event(timeout)
+        except (OSError, ValueError, HelperError):
+            self._sock.close()
+            raise
+        if self.info is None or self.info.get("protocol") != HELPER_PROTOCOL:
+            self._sock.close()
+            raise HelperError(f"Install helper at {self.path} speaks an unknown protocol.")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._sock.close()
+
+    def send(self, op, **fields):
+        self._sock.sendall((json.dumps({"op": op, **fields}) + "\n").encode())
+
+    def read_event(self, timeout=None):
+        # -> event dict, or None on timeout; ConnectionError once the helper goes away
+        import socket
+        while b"\n" not in self._buffer:
+            self._sock.settimeout(timeout)
+            try:
+                chunk = self._sock.recv(1 << 16)
+            except socket.timeout:
+                return None
+            if not chunk:
+                raise ConnectionError("the install helper closed the connection")
+            self._buffer += chunk
+        line, self._buffer = self._buffer.split(b"\n", 1)
+        return json.loads(line)
+
+    def run_job(self, op, on_event, cancel_event=None, **fields):
+        # Submits a job and feeds its events to on_event until "finished", which is returned
+        self.send(op, **fields)
+        job, cancel_sent = None, False
+        while True:
+            if cancel_event is not None and cancel_event.is_set() and job is not None and not cancel_sent:
+                self.send("cancel", job=job)
+                cancel_sent = True
+            event = self.read_event(0.2)
+            if event is None:
+                continue
+            if event.get("event") == "error":
+                raise HelperError(event.get("message", "request rejected"))
+            job = event.get("job", job)
+            on_event(event)
+            if event.get("event") == "finished":
+                return event
+
+
+def helper_alive(path=None, stand_in=False):
+    try:
+        HelperClient(path, timeout=1.0, stand_in=stand_in).close()
+    except (OSError, ValueError, HelperError):
+        return False
+    return True
+
+
+def start_helper(password=None, path=None, stand_in=False):
+    # Authenticates once through sudo; the helper then serves this user until it idles out.
+    # stand_in runs it unprivileged with a fake executor, for testing. Raises HelperError with
+    # sudo's stderr if the helper never reports ready.
+    import subprocess
+    path = path or helper_socket_path()
+    os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+    command = [sys.executable, HELPER_SCRIPT, "--socket", path, "--owner-uid", str(os.getuid())]
+    if stand_in:
+        command.append("--stand-in")
+    else:
+        command = ['sudo', '-S', '-p', ''] + command
+    process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE, start_new_session=True)
+    try:
+        process.stdin.write(((password or "") + "\n").encode())
+        process.stdin.close()
+    except BrokenPipeError:
+        pass
+    ready = process.stdout.readline()
+    if ready.strip() != b"ready":
+        error = process.stderr.read().decode("utf-8", "replace").strip()
+        process.wait()
+        raise HelperError(error or f"install helper exited with status {process.returncode}")
+    # The helper points its stdout/stderr at /dev/null once ready; reap sudo when it eventually exits
+    process.stdout.close()
+    process.stderr.close()
+    threading.Thread(target=process.wait, daemon=True).start()
+
+
+# --- Speculative dependency prefetch ---
+APT_ARCHIVES_DIR = "/var/cache/apt/archives"
+
+
+def archive_file_name(name, version, arch):
+    # The file name apt stores a downloaded archive under (epochs are escaped)
+    return f"{name}_{version.replace(':', '%3a')}_{arch}.deb"
+
+
+def seed_archives_command(archives, command, target=APT_ARCHIVES_DIR):
+    # Copies (reflinks where possible) already downloaded archives into apt's cache, then execs command.
+    # Must run as root. Never hard links: the caller owns the source files and could swap their contents
+    # after verification, so each archive becomes a root-owned copy under a temporary name that is then
+    # renamed into place. Symlinks and non-regular files are skipped; apt simply downloads those.
+    if not archives:
+        return list(command)
+    script = ('while [ "$1" != -- ]; do if [ -f "$1" ] && [ ! -h "$1" ]; then tmp="$0/.setdeb-$$.partial"; '
+              'cp -f --reflink=auto -- "$1" "$tmp" 2>/dev/null && mv -f -- "$tmp" "$0/${1##*/}" '
+              '|| rm -f -- "$tmp"; fi; shift; done; shift; exec "$@"')
+    return ['sh', '-c', script, target] + list(archives) + ['--'] + list(command)
+
+
+class DependencyPrefetcher:
+    # Downloads the archives an install will need while the user is still on the password page.
+    # apt-get runs unprivileged in download-only mode with its archive cache redirected to a
+    # user-owned directory and locking off (the dpkg lock is root's). Archives already there are
+    # reused by apt-get, so a second run for the same plan downloads nothing.
+    def __init__(self, directory=None, extra_options=(), tracer=None):
+        self.directory = directory or os.path.join(xdg_cache_dir(), "archives")
+        self.extra_options = list(extra_options)
+        self.tracer = tracer
+        self.returncode = None
+        self.cancelled = False
+        self.output = deque(maxlen=20)
+        self._cancel = threading.Event()
+        self._thread = None
+
+    def command(self, deb_paths):
+        return ['apt-get', 'install', '--download-only', '--yes', '-q',
+                '-o', f'Dir::Cache::archives={self.directory}/',
+                '-o', 'Dir::Cache::pkgcache=', '-o', 'Dir::Cache::srcpkgcache=',
+                '-o', 'Debug::NoLocking=true'] + self.extra_options + [os.path.abspath(p) for p in deb_paths]
+
+    def start(self, deb_paths, on_done=None):
+        # on_done(prefetcher) is called on the download thread once apt-get has exited
+        os.makedirs(os.path.join(self.directory, "partial"), mode=0o700, exist_ok=True)
+        command = self.command(deb_paths)
+        env = dict(os.environ, LC_ALL="C")
+        self._thread = threading.Thread(target=self._run, args=(command, env, on_done), daemon=True)
+        self._thread.start()
+
+    def _run(self, command, env, on_done):
+        runner = ProcessRunner(command, lambda stream, text: self.output.append(text), cancel_event=self._cancel,
+                               env=env, tracer=self.tracer, name="prefetch")
+        try:
+            self.returncode = runner.run()
+        except OSError as e:
+            self.output.append(str(e))
+            self.returncode = -1
+        self.cancelled = runner.cancelled
+        if on_done is not None:
+            on_done(self)
+
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def wait(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return not self.running()
+
+    def archives_for(self, entries):
+        # Complete archives for the "install" entries of InstallPlan.to_dict(); a size mismatch means a
+        # partial or stale file
+        found = []
+        for entry in entries:
+            path = os.path.join(self.directory, archive_file_name(entry["name"], entry["version"], entry["arch"]))
+            try:
+                if os.path.getsize(path) == entry["size"] or not entry["size"]:
+                    found.append(path)
+            except OSError:
+                pass
+        return found
+
+
+# --- Local .deb artifact store ---
+FICLONE = 0x40049409  # linux/fs.h
+
+
+def link_or_clone(source, destination):
+    # Hard link, else reflink (btrfs, xfs), else a plain copy; returns which one it was
+    try:
+        os.link(source, destination)
+        return "link"
+    except OSError:
+        pass
+    return clone(source, destination)
+
+
+def clone(source, destination):
+    # Reflink, else a plain copy: never shares an inode, so later writes to source do not reach it
+    with open(source, "rb") as src, open(destination, "wb") as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            return "reflink"
+        except OSError:
+            shutil.copyfileobj(src, dst, 1 << 20)
+            return "copy"
+
+
+class ArtifactStore:
+    # Every .deb setdeb installed or downloaded, stored once as objects/<sha256>.deb with
+    # by-name/<Package>_<Version>_<Arch>.deb symlinks onto it. Downloads are hard linked in, objects
+    # hard linked out where the filesystem allows, so reusing a package copies nothing. As in AnalysisCache,
+    # an object's mtime is its LRU stamp and eviction keeps the total under max_bytes.
+    def __init__(self, directory=None, max_bytes=4 << 30):
+        self.directory = os.path.join(directory or xdg_cache_dir(), "store")
+        self.max_bytes = max_bytes
+
+    def _object_path(self, digest):
+        return os.path.join(self.directory, "objects", digest + ".deb")
+
+    def _name_path(self, name, version, arch):
+        return os.path.join(self.directory, "by-name", archive_file_name(name, version, arch))
+
+    def lookup(self, name, version, arch, sha256=None):
+        # Path of the stored object, or None; sha256 (from the Packages index) must match when given
+        try:
+            digest = os.path.basename(os.readlink(self._name_path(name, version, arch)))[:-len(".deb")]
+            if sha256 and digest != sha256:
+                return None
+            path = self._object_path(digest)
+            os.utime(path)
+            return path
+        except OSError:
+            return None
+
+    def add(self, path, name, version, arch, sha256=None, owned=False):
+        # Records path under its content hash; returns the object path, or None if sha256 is given
+        # and the file does not match it. Only files setdeb owns (owned=True: its own downloads) are
+        # hard linked; anything else could be rewritten in place later, under a name claiming the old
+        # hash, so it is cloned and the clone is what gets hashed.
+        stored = self.lookup(name, version, arch, sha256)
+        if stored is not None and os.path.samefile(stored, path):
+            return stored
+        objects = os.path.join(self.directory, "objects")
+        os.makedirs(objects, exist_ok=True)
+        tmp_path = os.path.join(objects, f".tmp-{os.getpid()}-{threading.get_ident()}")
+        try:
+            (link_or_clone if owned else clone)(path, tmp_path)
+            digest = file_sha256(tmp_path)
+            if sha256 and digest != sha256:
+                os.unlink(tmp_path)
+                return None
+            stored = self._object_path(digest)
+            if os.path.exists(stored):
+                os.unlink(tmp_path)
+                os.utime(stored)
+            else:
+                os.replace(tmp_path, stored)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+        name_path = self._name_path(name, version, arch)
+        os.makedirs(os.path.dirname(name_path), exist_ok=True)
+        tmp_link = f"{name_path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        os.symlink(os.path.join("..", "objects", digest + ".deb"), tmp_link)
+        os.replace(tmp_link, name_path)
+        self.evict()
+        return stored
+
+    def materialize(self, entries, directory):
+        # Links the stored archives for install plan entries into directory under apt's file names
+        placed = []
+        for entry in entries:
+            stored = self.lookup(entry["name"], entry["version"], entry["arch"], entry.get("sha256"))
+            if stored is None:
+                continue
+            destination = os.path.join(directory, archive_file_name(entry["name"], entry["version"], entry["arch"]))
+            try:
+                if not (os.path.exists(destination) and os.path.samefile(stored, destination)):
+                    tmp_path = destination + ".tmp"
+                    link_or_clone(stored, tmp_path)
+                    os.replace(tmp_path, destination)
+            except OSError:
+                continue
+            placed.append(destination)
+        return placed
+
+    def evict(self):
+        objects = os.path.join(self.directory, "objects")
+        with open(os.path.join(self.directory, ".lock"), "a") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return  # another instance is already evicting
+            entries = []
+            for entry in os.scandir(objects):
+                if entry.name.endswith(".deb"):
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((st.st_mtime_ns, st.st_size, entry.path))
+            entries.sort()
+            total = sum(size for _, size, _ in entries)
+            removed = False
+            while entries and total > self.max_bytes:
+                _, size, path = entries.pop(0)
+                try:
+                    os.unlink(path)
+                    removed = True
+                except OSError:
+                    pass
+                total -= size
+            if removed:
+                by_name = os.path.join(self.directory, "by-name")
+                for entry in os.scandir(by_name):
+                    if entry.is_symlink() and not os.path.exists(entry.path):
+                        try:
+                            os.unlink(entry.path)
+                        except OSError:
+                            pass
+
+
+# --- Disk space preflight ---
+def mount_point(path):
+    # Mount point a path lands on; paths that do not exist yet resolve through their nearest
+    # existing parent, symlinks included (/lib -> usr/lib on merged-/usr systems)
+    while not os.path.lexists(path):
+        path = os.path.dirname(path)
+    path = os.path.realpath(path)
+    while not os.path.ismount(path):
+        path = os.path.dirname(path)
+    return path
+
+
+class DiskSpaceReport:
+    # Bytes an install will need per mount point, against statvfs. f_bavail is what is left without
+    # the root reserve; apt runs as root and could dip into it, but a system filled up to the
+    # reserve is not one the installer should produce.
+    def __init__(self):
+        self.mounts = {}  # mount point -> dict, see _entry
+        self.seconds = 0.0
+
+    def entry(self, mount):
+        found = self.mounts.get(mount)
+        if found is None:
+            st = os.statvfs(mount)
+            found = self.mounts[mount] = {"mount": mount, "available": st.f_bavail * st.f_frsize,
+                                          "block_size": st.f_frsize or 4096, "files": 0, "packages": 0,
+                                          "dependencies": 0, "downloads": 0}
+        return found
+
+    @staticmethod
+    def needed(entry):
+        return entry["packages"] + entry["dependencies"] + entry["downloads"]
+
+    @property
+    def short(self):
+        return [entry for entry in self.mounts.values() if self.needed(entry) > entry["available"]]
+
+    @property
+    def ok(self):
+        return not self.short
+
+    def to_dict(self):
+        return {
+            "ok": self.ok,
+            "mounts": [dict(entry, needed=self.needed(entry), ok=self.needed(entry) <= entry["available"])
+                       for _, entry in sorted(self.mounts.items())],
+            "seconds": round(self.seconds, 4),
+        }
+
+
+def disk_space_preflight(manifests, plan=None, archives_dir=APT_ARCHIVES_DIR, dependency_root="/usr"):
+    # manifests: (path, size, kind) rows of each local package, i.e. data.tar headers. File sizes
+    # are rounded up to the target filesystem's block size. dpkg unpacks next to the old files and
+    # renames afterwards, so nothing an upgrade replaces is subtracted. plan (InstallPlan.to_dict)
+    # adds the dependency downloads to apt's archive directory and their Installed-Size to /usr.
+    started = time.perf_counter()
+    report = DiskSpaceReport()
+    mounts = {}  # directory -> mount point
+    for manifest in manifests:
+        for path, size, kind in manifest:
+            if kind == "d":
+                continue
+            directory = path.rpartition("/")[0] or "/"
+            mount = mounts.get(directory)
+            if mount is None:
+                mount = mounts[directory] = mount_point(directory)
+            entry = report.entry(mount)
+            block = entry["block_size"]
+            entry["packages"] += -(-size // block) * block
+            entry["files"] += 1
+    if plan and plan["install"]:
+        report.entry(mount_point(archives_dir))["downloads"] += plan["download_size"]
+        report.entry(mount_point(dependency_root))["dependencies"] += plan["installed_size"] * 1024
+    report.seconds = time.perf_counter() - started
+    return report
+
+
+# --- dpkg triggers ---
+DPKG_TRIGGERS_DIR = "/var/lib/dpkg/triggers"
+MAINTAINER_SCRIPTS = ("preinst", "postinst", "prerm", "postrm")
+
+# What a trigger (by name or the directory a file trigger watches) or a command run straight from a
+# maintainer script rebuilds, and roughly how many seconds that takes on an ordinary desktop. Only
+# used to rank triggers and to weight the trigger step of the progress bar.
+TRIGGER_COSTS = {
+    "ldconfig": ("shared library cache", 0.5),
+    "update-initramfs": ("initramfs", 20.0),
+    "depmod": ("kernel module index", 3.0),
+    "/usr/share/man": ("manual page index", 4.0),
+    "mandb": ("manual page index", 4.0),
+    "/usr/share/fonts": ("font cache", 3.0),
+    "fc-cache": ("font cache", 3.0),
+    "/usr/share/mime/packages": ("MIME database", 2.0),
+    "update-mime-database": ("MIME database", 2.0),
+    "/usr/share/icons": ("icon cache", 1.5),
+    "gtk-update-icon-cache": ("icon cache", 1.5),
+    "/usr/share/glib-2.0/schemas": ("GSettings schemas", 1.0),
+    "glib-compile-schemas": ("GSettings schemas", 1.0),
+    "/usr/share/applications": ("desktop file database", 0.5),
+    "update-desktop-database": ("desktop file database", 0.5),
+    "/usr/share/info": ("info directory", 0.5),
+}
+DEFAULT_TRIGGER_SECONDS = 0.2
+EXPENSIVE_TRIGGER_SECONDS = 1.0
+
+_DPKG_TRIGGER_CALL = re.compile(r"(?<![\w-])dpkg-trigger(?:\s+-[-\w]+(?:=\S+)?)*\s+([^\s;&|)$\"']+)")
+_SLOW_COMMAND = re.compile(r"(?<![\w.-])(" + "|".join(
+    re.escape(name) for name in TRIGGER_COSTS if not name.startswith("/")) + r")(?![\w.-])")
+
+
+def trigger_cost(trigger):
+    # (label, seconds); a watched directory also matches the entries for its parents
+    found = TRIGGER_COSTS.get(trigger)
+    while found is None and trigger.startswith("/") and trigger != "/":
+        trigger = trigger.rpartition("/")[0] or "/"
+        found = TRIGGER_COSTS.get(trigger)
+    return found or (None, DEFAULT_TRIGGER_SECONDS)
+
+
+def parse_triggers(text):
+    # control.tar "triggers": one "<directive> <trigger>" per line, # starts a comment
+    directives = []
+    for line in text.splitlines():
+        fields = line.split("#", 1)[0].split()
+        if len(fields) == 2 and fields[0].startswith(("interest", "activate")):
+            directives.append((fields[0], fields[1]))
+    return directives
+
+
+def package_triggers(deb):
+    # What a package's control.tar says about triggers: the triggers it activates or is interested
+    # in, and the slow commands its maintainer scripts run themselves (those cannot be deferred).
+    # Plain lists, so the result can go into the analysis cache.
+    found = {"activate": [], "interest": [], "scripts": []}
+    files = deb.control_files()
+    for directive, trigger in parse_triggers((files.get("triggers") or b"").decode("utf-8", "replace")):
+        kind = "interest" if directive.startswith("interest") else "activate"
+        if trigger not in found[kind]:
+            found[kind].append(trigger)
+    for script in MAINTAINER_SCRIPTS:
+        text = (files.get(script) or b"").decode("utf-8", "replace")
+        for line in text.splitlines():
+            if line.lstrip().startswith("#"):
+                continue
+            for match in _DPKG_TRIGGER_CALL.finditer(line):
+                if match.group(1) not in found["activate"]:
+                    found["activate"].append(match.group(1))
+            # "dpkg-trigger update-initramfs" defers the command rather than running it
+            for match in _SLOW_COMMAND.finditer(_DPKG_TRIGGER_CALL.sub(" ", line)):
+                if [script, match.group(1)] not in found["scripts"]:
+                    found["scripts"].append([script, match.group(1)])
+    return found
+
+
+class TriggerRegistry:
+    # Trigger interests of the installed system, from dpkg's triggers directory: "File" has one
+    # "<directory> <package>[/noawait]" per file trigger, every other file is named after an
+    # explicit trigger and lists the packages interested in it
+    def __init__(self, directory=DPKG_TRIGGERS_DIR):
+        self.directory = directory
+        self.files = {}  # watched path -> set of interested packages
+        self.explicit = {}  # trigger name -> set of interested packages
+
+    def refresh(self):
+        files, explicit = {}, {}
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            names = []
+        for name in names:
+            if name in ("Lock", "Unincorp"):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), encoding="utf-8", errors="replace") as f:
+                    lines = f.read().splitlines()
+            except OSError:
+                continue
+            for line in lines:
+                if name == "File":
+                    path, _, package = line.strip().partition(" ")
+                    if path and package:
+                        files.setdefault(path.rstrip("/") or "/", set()).add(_trigger_owner(package))
+                elif line.strip():
+                    explicit.setdefault(name, set()).add(_trigger_owner(line.strip()))
+        self.files, self.explicit = files, explicit
+        return self
+
+
+def _trigger_owner(text):
+    # "libc-bin:amd64/noawait" -> "libc-bin", the bare name DpkgStatusIndex keys packages by
+    return text.split("/", 1)[0].split(":", 1)[0]
+
+
+class TriggerReport:
+    # Triggers an install activates, merged over all its packages. dpkg runs each interested
+    # package's trigger handling once per pass however many packages activated it, so this is
+    # also what one deferred pass at the end costs.
+    def __init__(self):
+        self.triggers = {}  # trigger name or watched directory -> dict
+        self.scripts = []  # slow commands maintainer scripts run directly
+        self.seconds = 0.0
+
+    def activate(self, trigger, package, handlers):
+        entry = self.triggers.get(trigger)
+        if entry is None:
+            label, seconds = trigger_cost(trigger)
+            entry = self.triggers[trigger] = {"trigger": trigger, "label": label or trigger, "seconds": seconds,
+                                              "expensive": seconds >= EXPENSIVE_TRIGGER_SECONDS,
+                                              "handlers": sorted(handlers), "packages": []}
+        if package not in entry["packages"]:
+            entry["packages"].append(package)
+
+    @property
+    def handlers(self):
+        # Interested package -> estimated seconds; its postinst runs once for all of its triggers
+        costs = {}
+        for entry in self.triggers.values():
+            for handler in entry["handlers"]:
+                costs[handler] = max(costs.get(handler, 0.0), entry["seconds"])
+        return costs
+
+    @property
+    def expensive(self):
+        return [entry for entry in self.triggers.values() if entry["expensive"]]
+
+    def to_dict(self):
+        handlers = self.handlers
+        return {
+            "triggers": sorted(self.triggers.values(), key=lambda entry: (-entry["seconds"], entry["trigger"])),
+            "scripts": self.scripts,
+            "handlers": sorted(handlers),
+            "estimated_seconds": round(sum(handlers.values()), 1),
+            "seconds": round(self.seconds, 4),
+        }
+
+
+def trigger_preflight(packages, registry):
+    # packages: (name, package_triggers() result, manifest) per local package. Interests declared
+    # by the packages themselves count as well, e.g. man-db installed together with manual pages.
+    started = time.perf_counter()
+    files = {path: set(handlers) for path, handlers in registry.files.items()}
+    explicit = {name: set(handlers) for name, handlers in registry.explicit.items()}
+    for name, found, _ in packages:
+        for trigger in found["interest"]:
+            (files if trigger.startswith("/") else explicit).setdefault(trigger.rstrip("/") or "/", set()).add(name)
+
+    report = TriggerReport()
+    for name, found, manifest in packages:
+        for trigger in found["activate"]:
+            if explicit.get(trigger):
+                report.activate(trigger, name, explicit[trigger])
+        # dpkg matches whole path components; once a directory is seen so are all its parents
+        seen = set()
+        for path, _, _ in manifest:
+            while path not in seen:
+                seen.add(path)
+                if path in files:
+                    report.activate(path, name, files[path])
+                if path == "/":
+                    break
+                path = path.rpartition("/")[0] or "/"
+        for script, command in found["scripts"]:
+            label, seconds = trigger_cost(command)
+            report.scripts.append({"package": name, "script": script, "command": command, "label": label,
+                                   "seconds": seconds, "expensive": seconds >= EXPENSIVE_TRIGGER_SECONDS})
+    report.seconds = time.perf_counter() - started
+    return report
+
+
+# --- Drop-folder watching ---
+IN_MODIFY, IN_CLOSE_WRITE, IN_MOVED_FROM, IN_MOVED_TO = 0x2, 0x8, 0x40, 0x80
+IN_CREATE, IN_DELETE, IN_DELETE_SELF, IN_MOVE_SELF = 0x100, 0x200, 0x400, 0x800
+IN_Q_OVERFLOW, IN_IGNORED = 0x4000, 0x8000
+_INOTIFY_EVENT = struct.Struct("iIII")
+
+
+def _inotify_watch(directory, mask):
+    # Returns an inotify fd watching directory, or None where inotify is not available
+    try:
+        import ctypes
+        libc = ctypes.CDLL(None, use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if fd < 0:
+        return None
+    if libc.inotify_add_watch(fd, os.fsencode(directory), mask) < 0:
+        os.close(fd)
+        return None
+    return fd
+
+
+class DropFolderWatcher:
+    # Reports *.deb files in one directory once they have stopped changing. Events only push a
+    # deadline back; a file is handed out when its mtime is SETTLE seconds old, so a burst of
+    # hundreds of uploads costs one stat per file, not one per write. Each new (path, stat) is
+    # reported once. One thread, inotify where available and a directory poll otherwise.
+    SETTLE = 2.0
+    POLL_INTERVAL = 2.0
+    WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_MODIFY | IN_CREATE | IN_DELETE | IN_MOVED_FROM
+
+    def __init__(self, directory, on_ready, on_removed=None, settle=None):
+        self.directory = os.path.abspath(directory)
+        self.on_ready = on_ready  # called with a sorted list of paths after each quiet period
+        self.on_removed = on_removed  # called with a path that was deleted or moved away
+        self.settle = self.SETTLE if settle is None else settle
+        self.mode = None
+        self.error = None
+        self._pending = {}  # path -> deadline
+        self._reported = {}  # path -> stat key last handed to on_ready
+        self._fd = None
+        self._wake_r, self._wake_w = os.pipe()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def wanted(name):
+        # Skips dot files, which is what rsync and most uploaders write to before the final rename
+        return name.lower().endswith(".deb") and not name.startswith(".")
+
+    def start(self):
+        # The watch is set up before the first scan so nothing written in between is missed
+        self._fd = _inotify_watch(self.directory, self.WATCH_MASK | IN_DELETE_SELF | IN_MOVE_SELF)
+        self.mode = "inotify" if self._fd is not None else "poll"
+        self._scan()
+        self._thread = threading.Thread(target=self._run, name="setdeb-watch", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        os.write(self._wake_w, b"x")
+        if self._thread is not None:
+            self._thread.join()
+        for fd in (self._fd, self._wake_r, self._wake_w):
+            if fd is not None:
+                os.close(fd)
+        self._fd = self._wake_r = self._wake_w = None
+
+    def _touch(self, path, delay=None):
+        self._pending[path] = time.monotonic() + (self.settle if delay is None else delay)
+
+    def _forget(self, path):
+        self._pending.pop(path, None)
+        if self._reported.pop(path, None) is not None and self.on_removed is not None:
+            self.on_removed(path)
+
+    def _scan(self):
+        # Initial contents, a poll tick, or recovery after the inotify queue overflowed
+        present = set()
+        for entry in os.scandir(self.directory):
+            if not self.wanted(entry.name):
+                continue
+            present.add(entry.path)
+            if entry.path in self._pending:
+                continue
+            try:
+                key = AnalysisCache.stat_key(entry.path)
+            except OSError:
+                continue
+            if self._reported.get(entry.path) != key:
+                self._touch(entry.path, 0)
+        for path in list(self._reported):
+            if path not in present:
+                self._forget(path)
+
+    def _read_events(self):
+        try:
+            buffer = os.read(self._fd, 64 << 10)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset < len(buffer):
+            _, mask, _, length = _INOTIFY_EVENT.unpack_from(buffer, offset)
+            start = offset + _INOTIFY_EVENT.size
+            name = os.fsdecode(buffer[start:start + length].rstrip(b"\0"))
+            offset = start + length
+            if mask & IN_Q_OVERFLOW:
+                self._scan()
+            elif mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                self.error = f"{self.directory} was removed"
+                self._stop.set()
+            elif name and self.wanted(name):
+                path = os.path.join(self.directory, name)
+                if mask & (IN_DELETE | IN_MOVED_FROM):
+                    self._forget(path)
+                else:
+                    self._touch(path)
+
+    def _flush(self):
+        now = time.monotonic()
+        ready = []
+        for path, deadline in list(self._pending.items()):
+            if deadline > now:
+                continue
+            del self._pending[path]
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            quiet = time.time() - st.st_mtime
+            if quiet < self.settle:
+                self._touch(path, self.settle - quiet)
+                continue
+            key = AnalysisCache.stat_key(path)
+            if self._reported.get(path) != key:
+                self._reported[path] = key
+                ready.append(path)
+        if ready:
+            self.on_ready(sorted(ready))
+
+    def _run(self):
+        next_poll = time.monotonic() + self.POLL_INTERVAL
+        while not self._stop.is_set():
+            now = time.monotonic()
+            wake = min(self._pending.values(), default=now + self.POLL_INTERVAL)
+            if self._fd is None:
+                wake = min(wake, next_poll)
+            readable, _, _ = select.select([fd for fd in (self._fd, self._wake_r) if fd is not None], [], [],
+                                           max(0.0, wake - now))
+            if self._stop.is_set():
+                break
+            try:
+                if self._fd in readable:
+                    self._read_events()
+                if self._fd is None and time.monotonic() >= next_poll:
+                    self._scan()
+                    next_poll = time.monotonic() + self.POLL_INTERVAL
+                self._flush()
+            except OSError as e:
+                self.error = str(e)
+                break
+
+
+# --- Task scheduling ---
+class CancelToken(threading.Event):
+    # Anything that takes a cancel_event (ProcessRunner, verify_payload, HelperClient.run_job) accepts one
+    def cancel(self):
+        self.set()
+
+    @property
+    def cancelled(self):
+        return self.is_set()
+
+
+class Task:
+    def __init__(self, task_id, name, function, args, priority, lane, token, after, group, always):
+        self.id = task_id
+        self.name = name
+        self.function = function
+        self.args = args
+        self.priority = priority
+        self.lane = lane
+        self.token = token
+        self.after = list(after)
+        self.group = group
+        self.always = always
+        self.state = "pending"  # -> running -> done | failed | cancelled | skipped
+        self.result = None
+        self.error = None
+        self.finished = threading.Event()
+        self.scheduler = None
+        self.trace_args = {}
+
+    def annotate(self, **args):
+        # Extra arguments for the task's trace span
+        self.trace_args.update(args)
+
+    @property
+    def succeeded(self):
+        return self.state == "done"
+
+    def progress(self, fraction, text=""):
+        # fraction in [0, 1], or -1 when the total is unknown
+        self.scheduler._notify(self, "progress", fraction, text)
+
+
+class TaskScheduler:
+    # Runs the worker's tasks: a bounded pool for analysis work and one serialized lane ("dpkg")
+    # for anything that takes the dpkg lock. Ready tasks start lowest priority value first, FIFO
+    # among equals. A task starts once the tasks in its `after` list have finished and is skipped
+    # if one of them did not succeed, unless always=True. on_update(task, state, fraction, text)
+    # runs on the task's thread when it starts, reports progress and ends.
+    HIGH, NORMAL, LOW = 0, 10, 20
+    LANES = ("pool", "dpkg")
+
+    def __init__(self, workers=4, on_update=None, tracer=None):
+        self.workers = max(1, workers)
+        self.on_update = on_update
+        self.tracer = tracer
+        self._cond = threading.Condition()
+        self._ready = {lane: [] for lane in self.LANES}  # heaps of (priority, id, task)
+        self._threads = {lane: 0 for lane in self.LANES}
+        self._idle = {lane: 0 for lane in self.LANES}
+        self._waiting = []
+        self._unfinished = []
+        self._next_id = 1
+
+    def submit(self, name, function, *args, priority=NORMAL, lane="pool", token=None, after=(), group=None,
+               always=False):
+        # function(task, *args) runs on a scheduler thread; its return value becomes task.result
+        with self._cond:
+            task = Task(self._next_id, name, function, args, priority, lane, token or CancelToken(), after,
+                        group, always)
+            task.scheduler = self
+            self._next_id += 1
+            self._unfinished.append(task)
+            if all(parent.finished.is_set() for parent in task.after):
+                self._enqueue(task)
+            else:
+                self._waiting.append(task)
+        return task
+
+    def _enqueue(self, task):
+        # Called with self._cond held
+        heapq.heappush(self._ready[task.lane], (task.priority, task.id, task))
+        self._start_threads(task.lane)
+        self._cond.notify_all()
+
+    def _start_threads(self, lane):
+        # Called with self._cond held. Idle threads that were notified but have not woken yet still
+        # count as idle, so compare against the whole backlog: several tasks enqueued at once each get a thread
+        limit = 1 if lane == "dpkg" else self.workers
+        while len(self._ready[lane]) > self._idle[lane] and self._threads[lane] < limit:
+            self._threads[lane] += 1
+            threading.Thread(target=self._worker, args=(lane,), name=f"setdeb-{lane}-{self._threads[lane]}",
+                             daemon=True).start()
+
+    def _worker(self, lane):
+        try:
+            while True:
+                with self._cond:
+                    while not self._ready[lane]:
+                        self._idle[lane] += 1
+                        self._cond.wait()
+                        self._idle[lane] -= 1
+                    _, _, task = heapq.heappop(self._ready[lane])
+                self._run(task)
+        finally:
+            # A task raised something other than Exception: give its slot back so another thread starts
+            with self._cond:
+                self._threads[lane] -= 1
+                self._start_threads(lane)
+
+    def _run(self, task):
+        if task.token.is_set():
+            return self._finish(task, "cancelled")
+        if not task.always and not all(parent.succeeded for parent in task.after):
+            return self._finish(task, "skipped")
+        task.state = "running"
+        self._notify(task, "running", 0.0, "")
+        started = time.perf_counter()
+        # Anything else (SystemExit, KeyboardInterrupt) still ends the task, then ends this thread
+        state = "failed"
+        try:
+            task.result = task.function(task, *task.args)
+            state = "cancelled" if task.token.is_set() else "done"
+        except Exception as e:
+            task.error = e
+        finally:
+            if self.tracer is not None and self.tracer.enabled:
+                self.tracer.add(task.name, started, time.perf_counter(), "task",
+                                {"task": task.id, "lane": task.lane, "state": state, **task.trace_args})
+            self._finish(task, state)
+
+    def _finish(self, task, state):
+        with self._cond:
+            task.state = state
+            task.finished.set()
+            self._unfinished.remove(task)
+            waiting, self._waiting = self._waiting, []
+            for other in waiting:
+                if all(parent.finished.is_set() for parent in other.after):
+                    self._enqueue(other)
+                else:
+                    self._waiting.append(other)
+            self._cond.notify_all()
+        self._notify(task, state, 1.0 if state == "done" else 0.0, str(task.error or ""))
+
+    def _notify(self, task, state, fraction, text):
+        if self.on_update is not None:
+            self.on_update(task, state, fraction, text)
+
+    def cancel(self, group=None):
+        # Cancels the unfinished tasks of group (all when None); running ones stop at their next check
+        with self._cond:
+            tasks = [task for task in self._unfinished if group is None or task.group == group]
+        for task in tasks:
+            task.token.cancel()
+
+    def busy(self, group=None):
+        with self._cond:
+            return any(group is None or task.group == group for task in self._unfinished)
+
+    def join(self, group=None, timeout=None):
+        # Waits until no task of group (any task when None) is left; False on timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while any(group is None or task.group == group for task in self._unfinished):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+
+# --- Worker logic shared by the Qt wizard and the headless CLI ---
+class Emitter:
+    # Minimal stand-in for a Qt signal, used when running without PySide6
+    def __init__(self):
+        self._slots = []
+
+    def connect(self, slot):
+        self._slots.append(slot)
+
+    def disconnect(self, slot):
+        self._slots.remove(slot)
+
+    def emit(self, *args):
+        for slot in self._slots:
+            slot(*args)
+
+
+class _HeldSignal:
+    # Takes a signal's place while DebWorkerCore.hold_signals() is in effect
+    def __init__(self, worker, signal):
+        self._worker = worker
+        self.signal = signal
+
+    def connect(self, slot):
+        self.signal.connect(slot)
+
+    def emit(self, *args):
+        self._worker._emit_held(self.signal, args)
+
+
+class DebWorkerCore:
+    # All analysis and installation logic. Subclasses provide the signals named in SIGNALS (Qt
+    # Signals in setdeb.DebWorker, Emitters in the CLI). Work runs as TaskScheduler tasks, so the
+    # signals are emitted from scheduler threads.
+    SIGNALS = (
+        "packageInfoReady", "fileListReady", "dependenciesReady", "analysisStatusUpdate",
+        "analysisComplete", "installationProgress", "installationFinished", "packageAlreadyInstalled",
+        "fileListChunk", "fileListDone", "installPlanReady", "integrityReady", "phaseTimed",
+        "prefetchStatus", "taskStateChanged", "taskProgress", "upgradeDeltaReady", "diskSpaceReady",
+        "triggersReady",
+    )
+
+    MAX_ANALYSIS_WORKERS = 4
+    INSTALL_TIMEOUT = None  # seconds; None lets apt run as long as it needs
+    VERIFY_PAYLOAD = True  # hash data.tar against md5sums during analysis
+    CHECK_FILE_CONFLICTS = True  # load dpkg's file lists and check the packages' files against them
+    ANALYZE_TRIGGERS = True  # estimate the dpkg triggers an install activates
+    USE_HELPER = True  # install through setdeb_helper.py; False runs one sudo per install
+    PREFETCH = True  # download dependencies unprivileged while the password is being entered
+    STORE_ARTIFACTS = True  # keep installed and downloaded .debs in the local artifact store
+    DEFER_TRIGGERS = True  # run dpkg triggers once at the end instead of after every dpkg call
+    FILE_LIST_CHUNK = 2000
+
+    def __init__(self):
+        self.deb_paths = []
+        self.package_infos = {}
+        self.install_plan = None
+        self.upgrade_deltas = {}  # deb path -> UpgradeDelta.to_dict(), for packages with an installed copy
+        self.disk_space = None  # DiskSpaceReport.to_dict() of the last analysis
+        self.trigger_report = None  # TriggerReport.to_dict() of the last analysis
+        self.trigger_registry = TriggerRegistry()
+        self._triggers_started = None
+        self._manifest_locks = {}
+        self._manifest_locks_guard = threading.Lock()
+        self._held = None
+        self._held_lock = threading.Lock()
+        self.progress_engine = None
+        self._password = None
+        self.current_progress = 0
+        self._cleanup_needed = False
+        self.analysis_cache = AnalysisCache()
+        self.status_index = DpkgStatusIndex()
+        self._install_cancel = None
+        self._install_token = None
+        self.log_ring = LogRing()
+        self.lists_index = AptListsIndex()
+        self.owner_index = FileOwnerIndex()
+        self._resolver = None
+        self.helper_stand_in = os.environ.get('SETDEB_HELPER_STAND_IN') == '1'
+        # SETDEB_TRACE=<file> records phase timings and rewrites file as a Chrome trace after each task
+        self.trace_path = os.environ.get('SETDEB_TRACE')
+        self.tracer = PhaseTracer(enabled=bool(self.trace_path), on_span=lambda span: self.phaseTimed.emit(span))
+        self._awaiting_first_line = False
+        self._install_lines = 0
+        self.prefetcher = None
+        self.prefetch_dir = None  # None: ~/.cache/setdeb/archives
+        self.prefetch_options = []  # extra apt-get options, e.g. to point at another sources list
+        self.artifact_store = ArtifactStore()
+        self.scheduler = TaskScheduler(self.MAX_ANALYSIS_WORKERS, self._task_update, self.tracer)
+        self._install_task = None
+
+    def hold_signals(self):
+        # Until release_signals(), emits are recorded instead of delivered, so work can start before
+        # anything is connected (the wizard starts analysing before QApplication exists)
+        with self._held_lock:
+            self._held = []
+        for name in self.SIGNALS:
+            setattr(self, name, _HeldSignal(self, getattr(self, name)))
+
+    def signals_held(self):
+        return self._held is not None
+
+    def release_signals(self):
+        # Puts the real signals back and replays what was recorded, in order. The replay runs outside
+        # the lock: slots may emit worker signals themselves (analysisComplete starts the prefetch).
+        with self._held_lock:
+            held, self._held = self._held, None
+            for name in self.SIGNALS:
+                current = getattr(self, name)
+                if isinstance(current, _HeldSignal):
+                    setattr(self, name, current.signal)
+        for signal, args in held or ():
+            signal.emit(*args)
+
+    def _emit_held(self, signal, args):
+        with self._held_lock:
+            if self._held is not None:
+                self._held.append((signal, args))
+                return
+        signal.emit(*args)
+
+    def _task_update(self, task, state, fraction, text):
+        # taskStateChanged(name, id, state) and taskProgress(name, id, fraction, text)
+        if state == "progress":
+            self.taskProgress.emit(task.name, task.id, float(fraction), text)
+        else:
+            self.taskStateChanged.emit(task.name, task.id, state)
+
+    def busy(self, group=None):
+        # group: "analysis", "listing", "install" or None for any
+        return self.scheduler.busy(group)
+
+    def enable_tracing(self, path=None):
+        self.tracer.enabled = True
+        if path:
+            self.trace_path = path
+
+    def write_trace(self, path=None):
+        path = path or self.trace_path
+        try:
+            self.tracer.write(path)
+        except OSError as e:
+            self.log(f"[WARNING] Could not write trace to {path}: {e}")
+
+    def log(self, text):
+        # Lines are collected here and pulled by the UI at a capped rate instead of one signal each
+        self.log_ring.append(text)
+
+    def check_if_installed(self, package_name, version=None, arch=None):
+        # Returns the installed copy's relation to version: 'not-installed', 'older', 'same' or 'newer'
+        try:
+            return self.status_index.query([(package_name, version, arch)])[0].relation
+        except FileNotFoundError:
+            self.log("[ERROR] dpkg status database not found. Are you on a Debian-based system?")
+        except Exception as e:
+            self.log(f"[ERROR] Failed to check if package is installed: {e}")
+        return 'not-installed'
+
+    def package_control(self, deb_path):
+        info = self.package_infos.get(deb_path)
+        if info is None:
+            info = DebFile(deb_path).control()
+        return info
+
+    def _progress_engine(self, deb_paths, archives=()):
+        # Weights come from the dependency preflight plan plus the local packages' Installed-Size;
+        # archives downloaded in advance no longer count towards the download phase
+        plan = self.install_plan or {}
+        local_kib = 0
+        for path in deb_paths:
+            try:
+                local_kib += int(self.package_infos.get(path, {}).get('Installed-Size', '0'))
+            except ValueError:
+                pass
+        prefetched = 0
+        for path in archives:
+            try:
+                prefetched += os.path.getsize(path)
+            except OSError:
+                pass
+        triggers = self.trigger_report if self.DEFER_TRIGGERS and self.trigger_report else {}
+        return AptProgressEngine(download_bytes=max(0, plan.get('download_size', 0) - prefetched),
+                                 install_bytes=(local_kib + plan.get('installed_size', 0)) * 1024,
+                                 package_count=len(deb_paths) + len(plan.get('install', [])),
+                                 trigger_seconds=triggers.get('estimated_seconds', 0.0),
+                                 trigger_count=len(triggers.get('handlers', ())))
+
+    def _handle_status_record(self, record):
+        phase = apt_record_phase(record)
+        if phase == "triggers" and self._triggers_started is None:
+            self._triggers_started = time.perf_counter()
+        if phase and self.tracer.enabled:
+            self.tracer.mark("apt", phase, "apt")
+        update = self.progress_engine.feed(record)
+        if update is not None:
+            self.current_progress, text = update
+            self.installationProgress.emit(self.current_progress, text)
+            if self._install_task is not None:
+                self._install_task.progress(self.current_progress / 100.0, text)
+
+    def run_installation_command(self, command_list, password, archives=()):
+        # apt reports machine-readable progress on fd 3, which a root shell points at our FIFO
+        status_reader = StatusFdReader(self._handle_status_record, os.environ.get('SETDEB_STATUS_TRANSCRIPT'))
+        full_command = ['sudo', '-S', '-p', ''] + seed_archives_command(
+            archives, apt_status_command(status_reader.path, command_list))
+        self.log(f"[SUDO] Running: sudo -S {' '.join(command_list)}")
+        self._packages_to_configure = []
+        self._parsing_packages = False
+        self._auth_failed = False
+        self._triggers_started = None
+        self._install_cancel = self._install_token or threading.Event()
+        # sudo is silent until the password is accepted, so authentication ends at apt's first line
+        self._awaiting_first_line = self.tracer.enabled
+        self.tracer.mark("apt", "authenticate", "apt")
+        runner = ProcessRunner(full_command, self._handle_install_line, stdin_data=(password + '\n').encode(),
+                               timeout=self.INSTALL_TIMEOUT, cancel_event=self._install_cancel,
+                               tracer=self.tracer, name=os.path.basename(command_list[0]))
+        try:
+            return_code = runner.run()
+        except Exception as e:
+            self.log(f"[SUDO] ERROR: Exception: {str(e)}")
+            return -1
+        finally:
+            status_reader.close()
+            self.tracer.mark("apt", None)
+
+        for error in self.progress_engine.errors:
+            self.log(f"[DPKG] ERROR: {error}")
+        self._report_triggers()
+        if runner.timed_out:
+            self.log(f"[SUDO] ERROR: Installation timed out after {self.INSTALL_TIMEOUT} seconds.")
+            return -1
+        if runner.cancelled:
+            self.log("[SUDO] Installation cancelled.")
+            return -1
+        return -1 if self._auth_failed else return_code
+
+    def _report_triggers(self):
+        # The trigger pass is the last thing an install does, so it ends about now
+        if self._triggers_started is None:
+            return
+        seconds = time.perf_counter() - self._triggers_started
+        estimate = (self.trigger_report or {}).get('estimated_seconds')
+        self.log(f"[INFO] Triggers of {', '.join(self.progress_engine.triggered)} took {seconds:.1f} s"
+                 + (f" (estimated {estimate:g} s)." if estimate else "."))
+
+    def helper_available(self):
+        # True when installs can go through an already authenticated helper, i.e. no password needed
+        return self.USE_HELPER and helper_alive(stand_in=self.helper_stand_in)
+
+    def _connect_helper(self, password):
+        try:
+            return HelperClient(stand_in=self.helper_stand_in)
+        except (OSError, ValueError):
+            pass
+        if not password and not self.helper_stand_in:
+            raise HelperError("Authentication required: the install helper is not running.")
+        self.log("[SUDO] Starting the install helper...")
+        try:
+            start_helper(password, stand_in=self.helper_stand_in)
+        except HelperError:
+            # Another setdeb instance may have started one in the meantime
+            if not helper_alive(stand_in=self.helper_stand_in):
+                raise
+        return HelperClient(stand_in=self.helper_stand_in)
+
+    def run_helper_install(self, deb_paths, password, archives=(), reinstall=False):
+        # Same contract as run_installation_command, but the job runs in the privileged helper
+        try:
+            with self.tracer.span("helper-connect"):
+                client = self._connect_helper(password)
+        except HelperError as e:
+            if any(classify_apt_line("stderr", line) == "auth-failed" for line in str(e).splitlines()):
+                self.log("[SUDO] ERROR: Authentication failed. Incorrect password.")
+            else:
+                self.log(f"[SUDO] ERROR: {e}")
+            return -1
+        except (OSError, ValueError) as e:
+            self.log(f"[SUDO] ERROR: Could not reach the install helper: {e}")
+            return -1
+
+        self._packages_to_configure = []
+        self._parsing_packages = False
+        self._auth_failed = False
+        self._triggers_started = None
+        self._install_cancel = self._install_token or threading.Event()
+        self._install_lines = 0
+        self.tracer.mark("apt", "queued", "apt")
+        try:
+            with client, self.tracer.span("helper-job", "process") as span:
+                finished = client.run_job("install", self._handle_helper_event, cancel_event=self._install_cancel,
+                                          debs=[os.path.abspath(path) for path in deb_paths],
+                                          archives=list(archives), reinstall=reinstall,
+                                          defer_triggers=self.DEFER_TRIGGERS, timeout=self.INSTALL_TIMEOUT)
+                span.set(returncode=finished.get("returncode"), lines=self._install_lines)
+        except (OSError, ValueError, HelperError) as e:
+            self.log(f"[SUDO] ERROR: Install helper failed: {e}")
+            return -1
+        finally:
+            self.tracer.mark("apt", None)
+
+        for error in self.progress_engine.errors:
+            self.log(f"[DPKG] ERROR: {error}")
+        if finished.get("triggers_deferred"):
+            self.log("[INFO] Triggers deferred; they run once the install jobs queued after this one are done.")
+        else:
+            self._report_triggers()
+        if finished.get("error"):
+            self.log(f"[SUDO] ERROR: {finished['error']}")
+            return -1
+        if finished.get("timed_out"):
+            self.log(f"[SUDO] ERROR: Installation timed out after {self.INSTALL_TIMEOUT} seconds.")
+            return -1
+        if finished.get("cancelled"):
+            self.log("[SUDO] Installation cancelled.")
+            return -1
+        return finished.get("returncode", -1)
+
+    def _handle_helper_event(self, event):
+        kind = event.get("event")
+        if kind == "line":
+            self._install_lines += 1
+            self._handle_install_line(event["stream"], event["text"])
+        elif kind == "status":
+            self._handle_status_record(event["record"])
+        elif kind == "queued" and event.get("position"):
+            self.log(f"[SUDO] Waiting for {event['position']} earlier install job(s) in the helper.")
+            self.installationProgress.emit(self.current_progress, "Waiting for other installations...")
+        elif kind == "started":
+            self.tracer.mark("apt", "resolve", "apt")
+            self.log(f"[SUDO] Running: {' '.join(event['command'])}")
+
+    def cancel_installation(self):
+        self.cancel_prefetch()
+        self.scheduler.cancel("install")
+        if self._install_cancel is not None:
+            self._install_cancel.set()
+
+    def start_prefetch(self):
+        # Called by the front ends once analysis has succeeded, i.e. while the password is asked for
+        plan = self.install_plan
+        if not self.PREFETCH or self.prefetcher is not None or not plan or not plan['install'] or plan['unmet']:
+            return False
+        if shutil.which('apt-get') is None:
+            return False
+        self.prefetcher = DependencyPrefetcher(self.prefetch_dir, self.prefetch_options, self.tracer)
+        staged = self._stage_from_store(self.prefetcher.directory)
+        if staged == len(plan['install']):
+            # Everything is in the artifact store already; apt-get would not download anything
+            self.prefetcher.returncode = 0
+            self.prefetchStatus.emit(f"All {staged} dependencies are available locally.")
+            return True
+        try:
+            self.prefetcher.start(self.deb_paths, self._prefetch_done)
+        except OSError as e:
+            self.log(f"[WARNING] Could not start the background download: {e}")
+            self.prefetcher = None
+            return False
+        self.prefetchStatus.emit(f"Downloading {len(plan['install'])} dependencies "
+                                 f"({plan['download_size'] / 1e6:.1f} MB) in the background...")
+        return True
+
+    def _prefetch_done(self, prefetcher):
+        if prefetcher.cancelled:
+            return
+        if prefetcher.returncode == 0:
+            count = len(prefetcher.archives_for(self.install_plan['install']))
+            self._store_archives(prefetcher.directory)
+            self.prefetchStatus.emit(f"{count} dependencies downloaded; installation will not need to fetch them.")
+            return
+        for line in prefetcher.output:
+            self.log(f"[PREFETCH] {line}")
+        self.prefetchStatus.emit("Dependencies will be downloaded during installation.")
+
+    def cancel_prefetch(self):
+        if self.prefetcher is not None:
+            self.prefetcher.cancel()
+
+    def _prefetched_archives(self):
+        # Archives the privileged install can link into apt's cache instead of downloading them
+        if not self.install_plan or not self.install_plan['install']:
+            return []
+        prefetcher = self.prefetcher
+        if prefetcher is None:
+            # No background download ran; the artifact store may still have some of them
+            prefetcher = DependencyPrefetcher(self.prefetch_dir)
+            self._stage_from_store(prefetcher.directory)
+        elif prefetcher.running():
+            self.log("[INFO] Waiting for the background download to finish...")
+            self.installationProgress.emit(10, "Downloading dependencies...")
+            prefetcher.wait()
+        archives = prefetcher.archives_for(self.install_plan['install'])
+        if archives:
+            self.log(f"[INFO] Using {len(archives)} of {len(self.install_plan['install'])} dependencies "
+                     f"downloaded in advance.")
+        return archives
+
+    def _stage_from_store(self, directory):
+        # Links stored copies of the plan's archives into directory; returns how many were found
+        if not self.STORE_ARTIFACTS:
+            return 0
+        try:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+            return len(self.artifact_store.materialize(self.install_plan['install'], directory))
+        except OSError as e:
+            self.log(f"[WARNING] Could not use the artifact store: {e}")
+            return 0
+
+    def _store_archives(self, directory):
+        # Records downloaded dependencies; the Packages index hash has to match
+        if not self.STORE_ARTIFACTS:
+            return
+        for entry in self.install_plan['install']:
+            path = os.path.join(directory, archive_file_name(entry['name'], entry['version'], entry['arch']))
+            if not os.path.exists(path):
+                continue
+            try:
+                if self.artifact_store.add(path, entry['name'], entry['version'], entry['arch'],
+                                           entry.get('sha256'), owned=True) is None:
+                    self.log(f"[WARNING] {os.path.basename(path)} does not match the package index; not kept.")
+            except OSError as e:
+                self.log(f"[WARNING] Could not store {os.path.basename(path)}: {e}")
+
+    def _store_installed(self, deb_paths, archives):
+        if not self.STORE_ARTIFACTS:
+            return
+        for path in deb_paths:
+            info = self.package_infos.get(path) or {}
+            try:
+                self.artifact_store.add(path, info['Package'], info['Version'], info['Architecture'])
+            except (KeyError, OSError) as e:
+                self.log(f"[WARNING] Could not store {os.path.basename(path)}: {e}")
+        for path in archives:
+            # The store (and apt's cache) hold these now; the staging links would only pin evicted objects
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+    def _handle_install_line(self, stream, line):
+        # Called for stdout and stderr lines as they arrive, in arrival order
+        if self._awaiting_first_line:
+            self._awaiting_first_line = False
+            self.tracer.mark("apt", "resolve", "apt")
+        kind = classify_apt_line(stream, line)
+        line_stripped = line.strip()
+        if kind == "noise":
+            return
+        if kind == "auth-failed":
+            self._auth_failed = True
+            self.log("[SUDO] ERROR: Authentication failed. Incorrect password.")
+            return
+        if kind == "warning":
+            self.log(f"[APT] WARNING: {line_stripped}")
+            return
+        if kind == "error":
+            self.log(f"[APT] ERROR: {line_stripped}")
+            return
+
+        self.log(f"[APT] {line_stripped}")
+        if "The following NEW packages will be installed:" in line or \
+           "The following packages will be upgraded:" in line or \
+           "The following additional packages will be installed:" in line:
+            self._parsing_packages = True
+            return
+
+        if self._parsing_packages:
+            if line.startswith("  "):
+                self._packages_to_configure.extend(line_stripped.split())
+            else:
+                self._parsing_packages = False
+                if self._packages_to_configure:
+                    self.log(f"[INFO] Found {len(self._packages_to_configure)} packages to configure.")
+
+    def analyze_debs(self, deb_paths):
+        # Metadata, verification, the dependency preflight and the file-owner index run as separate
+        # tasks, so whatever does not depend on something else runs at the same time
+        self.scheduler.cancel("analysis")
+        self.deb_paths = list(deb_paths)
+        self.package_infos = {}
+        self.install_plan = None
+        self.upgrade_deltas = {}
+        self.disk_space = None
+        self.trigger_report = None
+        for path in self.deb_paths:
+            cached = self.analysis_cache.get(path)
+            if cached and 'control' in cached:
+                # Cache hit: show the package right away; only the checks are left to do
+                self._emit_analysis(path, cached['control'])
+        count = len(self.deb_paths)
+        self.analysisStatusUpdate.emit("Extracting package metadata..." if count == 1
+                                       else f"Analyzing {count} packages...")
+        token = CancelToken()
+
+        def submit(name, function, *args, **options):
+            return self.scheduler.submit(name, function, *args, token=token, group="analysis", **options)
+
+        high, normal = TaskScheduler.HIGH, TaskScheduler.NORMAL
+        metadata = {path: submit("metadata", self._task_metadata, path, priority=high)
+                    for path in self.deb_paths if path not in self.package_infos}
+        owners = submit("owner-index", self._task_owner_index, priority=normal) if self.CHECK_FILE_CONFLICTS else None
+        verify = {path: submit("verify", self._task_verify, path, priority=normal,
+                               after=[metadata[path]] if path in metadata else [])
+                  for path in self.deb_paths} if self.VERIFY_PAYLOAD else {}
+        # After verification, which leaves the manifest in the cache
+        deltas = [submit("upgrade-delta", self._task_upgrade_delta, path, priority=normal,
+                         after=[t for t in (metadata.get(path), verify.get(path)) if t is not None])
+                  for path in self.deb_paths]
+        verify = list(verify.values())
+        preflight = submit("preflight", self._task_preflight, priority=high, after=list(metadata.values()))
+        checks = [preflight, submit("disk-space", self._task_disk_space, priority=normal, after=[preflight] + verify)]
+        if owners is not None:
+            checks.append(submit("file-conflicts", self._task_file_conflicts, priority=normal,
+                                 after=[preflight, owners] + verify))
+        if self.ANALYZE_TRIGGERS:
+            checks.append(submit("triggers", self._task_triggers, priority=normal,
+                                 after=list(metadata.values()) + verify))
+        submit("analysis-complete", self._task_analysis_complete, count, list(metadata.values()), verify,
+               priority=high, after=list(metadata.values()) + verify + deltas + checks, always=True)
+
+    def _emit_analysis(self, deb_path, package_data):
+        self.package_infos[deb_path] = package_data
+        self.packageInfoReady.emit(deb_path, package_data)
+        self.dependenciesReady.emit(package_data.get('Depends', 'No dependencies listed.'))
+
+    def _analyze_one(self, deb_path):
+        cached = self.analysis_cache.get(deb_path)
+        if cached and 'control' in cached:
+            return cached['control']
+        deb = DebFile(deb_path)
+        package_data = deb.control()
+        # Only the first tar header is decoded; the full listing is read lazily via DebFile.iter_entries()
+        deb.check_data()
+        self.analysis_cache.put(deb_path, control=package_data,
+                                depends=package_data.get('Depends', ''))
+        return package_data
+
+    def _task_metadata(self, task, deb_path):
+        task.annotate(package=os.path.basename(deb_path))
+        try:
+            package_data = self._analyze_one(deb_path)
+        except Exception as e:
+            self.log(f"Error analyzing {os.path.basename(deb_path)}: {e}")
+            raise
+        self._emit_analysis(deb_path, package_data)
+        count = len(self.deb_paths)
+        if count > 1:
+            self.analysisStatusUpdate.emit(f"Analyzed {len(self.package_infos)} of {count} packages...")
+
+    def _task_analysis_complete(self, task, count, metadata, verify):
+        success = count > 0 and not task.token.is_set() and all(t.succeeded for t in metadata) and \
+            all(t.succeeded and t.result for t in verify)
+        if success:
+            self.fileListReady.emit("Package contents are readable.")
+        self.analysisComplete.emit(success)
+        if self.trace_path and self.tracer.enabled:
+            self.write_trace()
+        return success
+
+    def _verify_one(self, deb_path, cancel=None):
+        cached = self.analysis_cache.get(deb_path) or {}
+        if 'integrity' in cached:
+            return cached['integrity']
+        report = verify_payload(DebFile(deb_path), cancel=cancel)
+        if report is None:
+            return None
+        integrity = report.to_dict()
+        if not self.analysis_cache.has_manifest(deb_path):
+            # The same pass produced the listing; the file view will not have to decompress again
+            self.analysis_cache.put_manifest(deb_path, report.manifest)
+        self.analysis_cache.put(deb_path, integrity=integrity)
+        return integrity
+
+    def _task_verify(self, task, deb_path):
+        # Runs before the password is asked for, so a damaged package never reaches apt.
+        # Returns whether the contents matched.
+        if len(self.deb_paths) == 1:
+            self.analysisStatusUpdate.emit("Verifying package contents...")
+        name = os.path.basename(deb_path)
+        try:
+            report = self._verify_one(deb_path, task.token)
+        except Exception as e:
+            report = {"ok": False, "error": str(e), "mismatched": [], "missing": []}
+            self.log(f"[ERROR] Could not read the contents of {name}: {e}")
+        if report is None:
+            return False  # cancelled
+        task.annotate(package=name, files=report.get("checked"), bytes=report.get("bytes"),
+                      mb_per_s=round(report.get("mb_per_s", 0.0), 2))
+        if report["ok"] and report["has_md5sums"]:
+            self.log(f"[INFO] {name}: {report['checked']} files match md5sums "
+                     f"({report['bytes'] / 1e6:.1f} MB at {report['mb_per_s']:.1f} MB/s).")
+        elif report["ok"]:
+            self.log(f"[WARNING] {name} has no md5sums; contents were read but not verified.")
+        for path_in_deb in report["mismatched"]:
+            self.log(f"[ERROR] {name}: checksum mismatch for {path_in_deb}")
+        for path_in_deb in report["missing"]:
+            self.log(f"[ERROR] {name}: {path_in_deb} is listed in md5sums but missing from the package")
+        self.integrityReady.emit(deb_path, report)
+        return report["ok"]
+
+    def _manifest(self, deb_path):
+        # (path, size, kind) of every data.tar entry; usually left in the cache by verification,
+        # otherwise read from the tar headers (no file is extracted). Tasks asking for the same
+        # package at once wait for the first one instead of decompressing it again.
+        with self._manifest_locks_guard:
+            lock = self._manifest_locks.setdefault(deb_path, threading.Lock())
+        with lock:
+            manifest = self.analysis_cache.get_manifest(deb_path)
+            if manifest is None:
+                manifest = [(e.path, e.size, e.kind) for e in DebFile(deb_path).iter_entries(default_workers())]
+                self.analysis_cache.put_manifest(deb_path, manifest)
+        return manifest
+
+    def _task_disk_space(self, task):
+        try:
+            report = disk_space_preflight([self._manifest(path) for path in self.deb_paths], self.install_plan)
+        except Exception as e:
+            self.log(f"[WARNING] Disk space check failed: {e}")
+            raise
+        for entry in report.short:
+            self.log(f"[ERROR] Not enough space on {entry['mount']}: {report.needed(entry) / 1e6:.1f} MB needed, "
+                     f"{entry['available'] / 1e6:.1f} MB available.")
+        self.disk_space = report.to_dict()
+        task.annotate(mounts=len(report.mounts), ok=report.ok)
+        self.diskSpaceReady.emit(self.disk_space)
+        return report
+
+    def _package_triggers(self, deb_path):
+        cached = self.analysis_cache.get(deb_path) or {}
+        found = cached.get('triggers')
+        if found is None:
+            found = package_triggers(DebFile(deb_path))
+            self.analysis_cache.put(deb_path, triggers=found)
+        return found
+
+    def _task_triggers(self, task):
+        # Which triggers the install will set off, from control.tar and the installed interests
+        try:
+            self.trigger_registry.refresh()
+            packages = [(self.package_infos[path].get('Package', ''), self._package_triggers(path),
+                         self._manifest(path)) for path in self.deb_paths]
+            report = trigger_preflight(packages, self.trigger_registry)
+        except Exception as e:
+            self.log(f"[WARNING] Trigger check failed: {e}")
+            raise
+        for entry in report.expensive:
+            self.log(f"[INFO] Activates the {entry['label']} trigger ({', '.join(entry['handlers'])}, "
+                     f"about {entry['seconds']:g} s).")
+        for entry in report.scripts:
+            if entry['expensive']:
+                self.log(f"[INFO] {entry['package']}'s {entry['script']} runs {entry['command']} itself "
+                         f"({entry['label']}, about {entry['seconds']:g} s).")
+        self.trigger_report = report.to_dict()
+        task.annotate(triggers=len(report.triggers), handlers=len(self.trigger_report['handlers']))
+        self.triggersReady.emit(self.trigger_report)
+        return report
+
+    def installed_delta(self, deb_path):
+        # UpgradeDelta of deb_path against the installed copy of its package, None if there is none
+        info = self.package_control(deb_path)
+        name = info.get('Package', '').strip()
+        installed = self.status_index.lookup(name, info.get('Architecture')) if name else None
+        if installed is None or installed.state not in INSTALLED_STATES:
+            return None
+        info_dir = self.owner_index.info_dir
+        installed_list = read_info_file(info_dir, name, installed.arch, "list")
+        if installed_list is None:
+            return None
+        deb = DebFile(deb_path)
+        manifest = self._manifest(deb_path)
+        new_sums = parse_md5sums((deb.control_file("md5sums") or b"").decode("utf-8", "surrogateescape"))
+        installed_sums = parse_md5sums(read_info_file(info_dir, name, installed.arch, "md5sums") or "")
+        return upgrade_delta(manifest, new_sums, installed_list.split("\n"), installed_sums, installed.version)
+
+    def _task_upgrade_delta(self, task, deb_path):
+        name = os.path.basename(deb_path)
+        task.annotate(package=name)
+        try:
+            delta = self.installed_delta(deb_path)
+        except Exception as e:
+            self.log(f"[WARNING] Could not compare {name} with the installed copy: {e}")
+            raise
+        if delta is None:
+            return None
+        report = delta.to_dict()
+        task.annotate(changed=report['counts']['changed'], identical=report['identical'])
+        self.upgrade_deltas[deb_path] = report
+        self.upgradeDeltaReady.emit(deb_path, report)
+        return report
+
+    def _delta_for(self, deb_path):
+        # The analysis result, or a fresh comparison when analysis did not produce one
+        if deb_path in self.upgrade_deltas:
+            return self.upgrade_deltas[deb_path]
+        try:
+            delta = self.installed_delta(deb_path)
+        except Exception as e:
+            self.log(f"[WARNING] Could not compare {os.path.basename(deb_path)} with the installed copy: {e}")
+            return None
+        return delta.to_dict() if delta is not None else None
+
+    def _task_preflight(self, task):
+        # Offline check against dpkg status and the local apt lists; apt has the final word. The
+        # plan is published now and again once the file-conflict check has added to it.
+        self.analysisStatusUpdate.emit("Checking dependencies...")
+        try:
+            if self._resolver is None:
+                self._resolver = DependencyResolver(self.status_index, self.lists_index)
+            plan = self._resolver.resolve([self.package_infos[path] for path in self.deb_paths])
+        except Exception as e:
+            self.log(f"[WARNING] Dependency preflight failed: {e}")
+            raise
+        self.install_plan = plan.to_dict()
+        self.installPlanReady.emit(self.install_plan)
+        return plan
+
+    def _task_owner_index(self, task):
+        try:
+            self.owner_index.refresh()
+        except OSError as e:
+            self.log(f"[WARNING] Could not read the dpkg file lists: {e}")
+            raise
+
+    def _task_file_conflicts(self, task):
+        plan = task.after[0].result
+        try:
+            self._check_file_conflicts(plan)
+        except Exception as e:
+            self.log(f"[WARNING] File conflict check failed: {e}")
+            raise
+        if plan.conflicts:
+            self.install_plan = plan.to_dict()
+            self.installPlanReady.emit(self.install_plan)
+
+    def _check_file_conflicts(self, plan):
+        # Files another installed package already owns, or another package of this batch ships, make
+        # dpkg stop halfway through the install. owner_index must have been refreshed (the owner-index task).
+        batch_versions = {}
+        for path in self.deb_paths:
+            info = self.package_infos[path]
+            batch_versions[info.get('Package', '')] = info.get('Version', '')
+        batch = []
+        for path in self.deb_paths:
+            info = self.package_infos[path]
+            name = info.get('Package', '')
+            manifest = self._manifest(path)
+            replaces, batch_replaces = [], []
+            for group in parse_relations(info.get('Replaces', '')):
+                for relation in group:
+                    installed = self.status_index.installed_version(relation.name)
+                    if installed and (relation.op is None or version_satisfies(installed, relation.op, relation.version)):
+                        replaces.append(relation.name)
+                    version = batch_versions.get(relation.name)
+                    if version and (relation.op is None or version_satisfies(version, relation.op, relation.version)):
+                        batch_replaces.append(relation.name)
+            for conflict in self.owner_index.conflicts(manifest, name, replaces):
+                plan.conflicts.append(f"{name}: {conflict.path} is already owned by {', '.join(conflict.owners)}")
+            batch.append((name, manifest, batch_replaces))
+        for conflict in self.owner_index.batch_conflicts(batch):
+            plan.conflicts.append(f"{conflict.path} is shipped by several packages of this batch: "
+                                  f"{', '.join(conflict.owners)}")
+
+    def list_files(self, deb_paths):
+        # Low priority tasks, one per package, so installation and analysis never wait for them
+        self.cancel_file_listing()
+        token = CancelToken()
+        for path in deb_paths:
+            self.scheduler.submit("listing", self._task_list_files, path, priority=TaskScheduler.LOW, token=token,
+                                  group="listing")
+
+    def cancel_file_listing(self):
+        self.scheduler.cancel("listing")
+
+    def _task_list_files(self, task, path):
+        cached = self.analysis_cache.get_manifest(path)
+        from_cache = cached is not None
+        try:
+            if from_cache:
+                rows = (tuple(row) for row in cached)
+            else:
+                rows = ((e.path, e.size, e.kind) for e in DebFile(path).iter_entries(default_workers()))
+            chunk, manifest = [], []
+            for row in rows:
+                if task.token.is_set():
+                    rows.close()
+                    return
+                chunk.append(row)
+                if len(chunk) >= self.FILE_LIST_CHUNK:
+                    self.fileListChunk.emit(path, chunk)
+                    manifest.extend(chunk)
+                    chunk = []
+                    task.progress(-1, f"{len(manifest)} files")
+            self.fileListChunk.emit(path, chunk)
+            manifest.extend(chunk)
+        except Exception as e:
+            self.log(f"Error listing files of {os.path.basename(path)}: {e}")
+            self.fileListDone.emit(path, False)
+            raise
+        if not from_cache:
+            self.analysis_cache.put_manifest(path, manifest)
+        task.annotate(package=os.path.basename(path), files=len(manifest), cached=from_cache)
+        self.fileListDone.emit(path, True)
+
+    def install_packages(self, deb_paths, password):
+        # The dpkg lane runs one install at a time; a second request queues behind the first
+        self.deb_paths = list(deb_paths)
+        self._install_task = self.scheduler.submit("install", self._task_install, password,
+                                                   priority=TaskScheduler.HIGH, lane="dpkg", group="install")
+
+    def _task_install(self, task, password):
+        self._password = password
+        self._install_token = task.token
+        try:
+            self._do_install_package()
+        finally:
+            self._install_token = None
+            if self.trace_path and self.tracer.enabled:
+                self.write_trace()
+
+    def _do_install_package(self):
+        self.current_progress = 0
+        if self.disk_space and not self.disk_space['ok']:
+            # The front ends stop here already; apt would otherwise fail halfway, as root
+            self.installationFinished.emit(False, "Not enough disk space. Free some space and try again.")
+            return
+        self.installationProgress.emit(10, "Authenticating...")
+        try:
+            self.log(f"[INFO] Full log: {self.log_ring.open_file()}")
+        except OSError as e:
+            self.log(f"[WARNING] Could not create log file: {e}")
+
+        pending, installed, reinstall = [], [], False
+        check_started = time.perf_counter()
+        for path in self.deb_paths:
+            try:
+                info = self.package_control(path)
+            except Exception:
+                info = {}
+            name, version = info.get('Package', '').strip(), info.get('Version', '').strip()
+            relation = self.check_if_installed(name, version, info.get('Architecture')) if name else 'not-installed'
+            delta = self._delta_for(path) if relation in ('same', 'older') else None
+            if relation == 'same' and delta and delta['differs']:
+                # Same version, different contents (a rebuild); apt only replaces it with --reinstall
+                self.log(f"[INFO] {name} {version} is installed, but {_describe_delta(delta)}; reinstalling.")
+                reinstall = True
+                pending.append(path)
+            elif relation in ('same', 'newer'):
+                if relation == 'newer':
+                    self.log(f"[INFO] A newer version of {name} is installed "
+                             f"({self.status_index.installed_version(name)}); not downgrading to {version}.")
+                elif delta and delta['identical']:
+                    self.log(f"[INFO] {name} {version} is identical to the installed copy.")
+                elif delta and delta['comparable']:
+                    self.log(f"[INFO] {name} {version} matches the installed copy, except {delta['unverified']} "
+                             f"file(s) without checksums that could not be compared.")
+                installed.append(name)
+            else:
+                if relation == 'older':
+                    churn = f": {_describe_delta(delta)}" if delta else ""
+                    self.log(f"[INFO] Upgrading {name} from {self.status_index.installed_version(name)} "
+                             f"to {version}{churn}.")
+                pending.append(path)
+
+        self.tracer.add("check-installed", check_started, time.perf_counter(), "phase",
+                        {"pending": len(pending), "installed": len(installed)})
+        archives = []
+        if pending:
+            if installed:
+                self.log(f"[INFO] Skipping already installed: {', '.join(installed)}")
+            archives = self._prefetched_archives()
+            self.progress_engine = self._progress_engine(pending, archives)
+            # Gunakan apt untuk menangani dependensi secara otomatis, satu transaksi untuk semua paket
+            if self.USE_HELPER:
+                ret = self.run_helper_install(pending, self._password, archives, reinstall)
+            else:
+                command = ['apt', 'install', '--yes'] + (['--reinstall'] if reinstall else []) + \
+                    (APT_DEFER_TRIGGERS if self.DEFER_TRIGGERS else []) + pending
+                ret = self.run_installation_command(command, self._password, archives)
+        else:
+            self.cancel_prefetch()
+            self.packageAlreadyInstalled.emit(True, ", ".join(installed))
+            ret = 0
+        self._password = None # Hapus kata sandi dari memori
+
+        if ret == 0:
+            self.installationProgress.emit(100, "Installed")
+            noun = "Package" if len(self.deb_paths) == 1 else f"{len(self.deb_paths)} packages"
+            self.installationFinished.emit(True, f"{noun} installed successfully.")
+            self._store_installed(pending, archives)
+        else:
+            self.installationFinished.emit(False, "Installation failed. Check terminal output for details.")
+        self.log_ring.close_file()
@@ -2,16 +2,26 @@
 
 import sys
 import os
-import subprocess
-import re
+
+# Headless modes must not pay for (or require) Qt: dispatch before PySide6 is imported
+if __name__ == '__main__' and {'--analyze', '--install'} & set(sys.argv[1:]):
+    from setdeb_cli import main as cli_main
+    sys.exit(cli_main(sys.argv[1:]))
+
+import html
+import json
+import time
 
 from PySide6.QtWidgets import (
     QApplication, QWizard, QWizardPage, QVBoxLayout, QHBoxLayout,
-    QPushButton, QLabel, QTextEdit, QLineEdit,
+    QPushButton, QLabel, QPlainTextEdit, QLineEdit,
     QMessageBox, QSizePolicy, QSpacerItem, QWidget, QFormLayout, QStyle,  # <-- add this import
+    QScrollArea, QTreeView, QHeaderView,
 )
 from PySide6.QtGui import QPainter, QColor, QFont, QPen, QIcon
-from PySide6.QtCore import Qt, QThread, Signal, QRectF, QSize, QTimer
+from PySide6.QtCore import Qt, QObject, Signal, QRectF, QSize, QTimer, QAbstractItemModel, QModelIndex
+
+from debcore import DebWorkerCore, collect_deb_paths
 
 # --- Circular Progress Bar Widget (Gaya diperbarui) ---
 class CircularProgressBar(QWidget):
@@ -63,203 +73,176 @@ class CircularProgressBar(QWidget):
         text_rect = self.rect().adjusted(self._pen_width, self._pen_width, -self._pen_width, -self._pen_width)
         painter.drawText(text_rect, Qt.AlignCenter, f"{self._progress_text}\n{self._value}%")
 
-# --- DebWorker (Tidak Berubah) ---
-class DebWorker(QThread):
-    packageInfoReady = Signal(dict)
+# --- Package File List Model ---
+class _FileNode:
+    __slots__ = ('name', 'parent', 'row', 'size', 'is_dir', 'children', 'lookup', 'fetched')
+
+    def __init__(self, name, parent, row, is_dir, size=0):
+        self.name = sys.intern(name)
+        self.parent = parent
+        self.row = row
+        self.size = size
+        self.is_dir = is_dir
+        # Only directories carry child containers; files stay as small as possible
+        self.children = [] if is_dir else None
+        self.lookup = {} if is_dir else None
+        self.fetched = 0
+
+
+def _human_size(size):
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if size < 1024 or unit == "GiB":
+            return f"{size} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+class PackageFileModel(QAbstractItemModel):
+    # Lazily populated tree: rows arrive in chunks from the worker, but only FETCH_BATCH rows per
+    # directory are exposed to the view at a time (canFetchMore/fetchMore), so the view never has
+    # to lay out hundreds of thousands of rows at once.
+    FETCH_BATCH = 500
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._root = _FileNode('', None, 0, True)
+        self._last_dir = ('', self._root)
+        self._touched = set()
+        self.file_count = 0
+
+    def clear(self):
+        self.beginResetModel()
+        self._root = _FileNode('', None, 0, True)
+        self._last_dir = ('', self._root)
+        self.file_count = 0
+        self.endResetModel()
+
+    def _child_dir(self, node, name):
+        child = node.lookup.get(name)
+        if child is None:
+            child = _FileNode(name, node, len(node.children), True)
+            node.children.append(child)
+            node.lookup[child.name] = child
+            self._touched.add(node)
+        return child
+
+    def _dir_node(self, dir_path):
+        # tar output is grouped by directory, so the previous lookup is usually the right one
+        if self._last_dir[0] == dir_path:
+            return self._last_dir[1]
+        node = self._root
+        for part in dir_path.split('/'):
+            if part:
+                node = self._child_dir(node, part)
+        self._last_dir = (dir_path, node)
+        return node
+
+    def add_entries(self, rows, prefix=''):
+        for path, size, kind in rows:
+            if path == '/':
+                continue
+            dir_path, _, name = (prefix + path).rpartition('/')
+            parent = self._dir_node(dir_path)
+            if kind == 'd':
+                self._child_dir(parent, name)
+            elif name not in parent.lookup:
+                parent.children.append(_FileNode(name, parent, len(parent.children), False, size))
+                self.file_count += 1
+                self._touched.add(parent)
+        touched, self._touched = self._touched, set()
+        for node in touched:
+            # Fill the window the view has already opened; further rows are fetched on scroll
+            window = -(-max(node.fetched, 1) // self.FETCH_BATCH) * self.FETCH_BATCH
+            if (node is self._root or node.fetched) and node.fetched < min(window, len(node.children)):
+                self._reveal(node, min(window, len(node.children)))
+
+    def _index_for(self, node):
+        if node is self._root or node is None:
+            return QModelIndex()
+        return self.createIndex(node.row, 0, node)
+
+    def _reveal(self, node, count):
+        self.beginInsertRows(self._index_for(node), node.fetched, count - 1)
+        node.fetched = count
+        self.endInsertRows()
+
+    def _node(self, index):
+        return index.internalPointer() if index.isValid() else self._root
+
+    def index(self, row, column, parent=QModelIndex()):
+        node = self._node(parent)
+        if not node.is_dir or row < 0 or row >= node.fetched:
+            return QModelIndex()
+        return self.createIndex(row, column, node.children[row])
+
+    def parent(self, index):
+        if not index.isValid():
+            return QModelIndex()
+        return self._index_for(index.internalPointer().parent)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.column() > 0:
+            return 0
+        node = self._node(parent)
+        return node.fetched if node.is_dir else 0
+
+    def columnCount(self, parent=QModelIndex()):
+        return 2
+
+    def hasChildren(self, parent=QModelIndex()):
+        node = self._node(parent)
+        return node.is_dir and bool(node.children)
+
+    def canFetchMore(self, parent):
+        node = self._node(parent)
+        return node.is_dir and node.fetched < len(node.children)
+
+    def fetchMore(self, parent):
+        node = self._node(parent)
+        self._reveal(node, min(len(node.children), node.fetched + self.FETCH_BATCH))
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        node = index.internalPointer()
+        if role == Qt.DisplayRole:
+            if index.column() == 0:
+                return node.name
+            return "" if node.is_dir else _human_size(node.size)
+        if role == Qt.TextAlignmentRole and index.column() == 1:
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return ("Name", "Size")[section]
+        return None
+
+# --- DebWorker (Qt signals over debcore.DebWorkerCore) ---
+class DebWorker(DebWorkerCore, QObject):
+    # Lives on the GUI thread; its signals are emitted from the scheduler's threads and delivered queued
+    packageInfoReady = Signal(str, dict)
     fileListReady = Signal(str)
     dependenciesReady = Signal(str)
-    logMessage = Signal(str)
     analysisStatusUpdate = Signal(str)
     analysisComplete = Signal(bool)
     installationProgress = Signal(int, str)
     installationFinished = Signal(bool, str)
     packageAlreadyInstalled = Signal(bool, str)
+    fileListChunk = Signal(str, list)
+    fileListDone = Signal(str, bool)
+    installPlanReady = Signal(dict)
+    integrityReady = Signal(str, dict)
+    phaseTimed = Signal(dict)
+    prefetchStatus = Signal(str)
+    taskStateChanged = Signal(str, int, str)
+    taskProgress = Signal(str, int, float, str)
+    upgradeDeltaReady = Signal(str, dict)
+    diskSpaceReady = Signal(dict)
+    triggersReady = Signal(dict)
 
     def __init__(self):
-        super().__init__()
-        self.deb_path = None
-        self._current_task = None
-        self._password = None
-        self.current_progress = 0
-        self._cleanup_needed = False
-
-    def check_if_installed(self, package_name):
-        try:
-            result = subprocess.run(['dpkg', '-l', package_name],
-                                 capture_output=True, text=True, check=False)
-            if f"ii  {package_name}" in result.stdout:
-                return True
-        except FileNotFoundError:
-            self.logMessage.emit("[ERROR] `dpkg` command not found. Are you on a Debian-based system?")
-        except Exception as e:
-            self.logMessage.emit(f"[ERROR] Failed to check if package is installed: {e}")
-        return False
-
-    def run_installation_command(self, command_list, password):
-        try:
-            pkg_name = subprocess.check_output(['dpkg-deb', '-f', self.deb_path, 'Package'],
-                                            text=True).strip()
-            if self.check_if_installed(pkg_name):
-                self.packageAlreadyInstalled.emit(True, pkg_name)
-                return 0
-        except Exception:
-            pass
-
-        full_command = ['sudo', '-S'] + command_list
-        self.logMessage.emit(f"[SUDO] Running: sudo -S {' '.join(command_list)}")
-        try:
-            process = subprocess.Popen(full_command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
-                                     stderr=subprocess.PIPE, text=True, bufsize=1, errors='replace')
-            if process.stdin:
-                process.stdin.write(password + '\n')
-                process.stdin.flush()
-
-            packages_to_configure = []
-            parsing_packages = False
-            setup_counter = 0
-
-            if process.stdout:
-                for line in iter(process.stdout.readline, ''):
-                    line_stripped = line.strip()
-                    # Filter out apt warning about unstable CLI and debconf dialog fallback
-                    if (
-                        "apt does not have a stable CLI interface" in line_stripped or
-                        "debconf: unable to initialize frontend: Dialog" in line_stripped or
-                        "debconf: (Dialog frontend requires a screen at least" in line_stripped or
-                        "debconf: falling back to frontend: Readline" in line_stripped
-                    ):
-                        continue
-                    self.logMessage.emit(f"[APT] {line_stripped}")
-
-                    if "The following NEW packages will be installed:" in line or \
-                       "The following packages will be upgraded:" in line or \
-                       "The following additional packages will be installed:" in line:
-                        parsing_packages = True
-                        continue
-
-                    if parsing_packages:
-                        if line.startswith("  "):
-                            packages_to_configure.extend(line.strip().split())
-                        else:
-                            parsing_packages = False
-                            if packages_to_configure:
-                                self.logMessage.emit(f"[INFO] Found {len(packages_to_configure)} packages to configure.")
-
-                    download_match = re.search(r"Progress:.*?(\d+)%", line)
-                    if download_match:
-                        progress_percent = int(download_match.group(1))
-                        scaled_progress = 10 + int(progress_percent * 0.65)
-                        self.current_progress = scaled_progress
-                        self.installationProgress.emit(self.current_progress, "Downloading...")
-                        continue
-
-                    if "Unpacking" in line or "Preparing to unpack" in line:
-                        if self.current_progress < 75:
-                            self.current_progress = 75
-                            self.installationProgress.emit(self.current_progress, "Unpacking...")
-                        continue
-
-                    if "Setting up" in line:
-                        setup_counter += 1
-                        total_packages = len(packages_to_configure) if packages_to_configure else 1
-                        setup_progress = 90 + int((setup_counter / total_packages) * 8 if total_packages > 0 else 8)
-                        self.current_progress = min(setup_progress, 98)
-                        self.installationProgress.emit(self.current_progress, f"Setting up ({setup_counter}/{total_packages})")
-                        continue
-
-            return_code = process.wait()
-
-            if process.stderr:
-                stderr_output = process.stderr.read()
-                if stderr_output:
-                    # Filter out apt warning about unstable CLI and debconf dialog fallback
-                    filtered_lines = [
-                        l for l in stderr_output.splitlines()
-                        if "apt does not have a stable CLI interface" not in l
-                        and "debconf: unable to initialize frontend: Dialog" not in l
-                        and "debconf: (Dialog frontend requires a screen at least" not in l
-                        and "debconf: falling back to frontend: Readline" not in l
-                    ]
-                    filtered_stderr = "\n".join(filtered_lines)
-                    if "sudo: 1 incorrect password attempt" in filtered_stderr:
-                        self.logMessage.emit("[SUDO] ERROR: Authentication failed. Incorrect password.")
-                        return_code = -1
-                    elif "WARNING:" in filtered_stderr:
-                        self.logMessage.emit(f"[APT] WARNING: {filtered_stderr.strip()}")
-                    elif filtered_stderr.strip():
-                        self.logMessage.emit(f"[APT] ERROR: {filtered_stderr.strip()}")
-
-            return return_code
-        except Exception as e:
-            self.logMessage.emit(f"[SUDO] ERROR: Exception: {str(e)}")
-            return -1
-
-    def analyze_deb(self, deb_path):
-        self.deb_path = deb_path
-        self._current_task = "analyze"
-        self.start()
-
-    def _do_analyze_deb(self):
-        self.analysisStatusUpdate.emit("Extracting package metadata...")
-        info_ok, contents_ok = False, False
-        try:
-            raw_info = subprocess.check_output(['dpkg-deb', '-f', self.deb_path], text=True)
-            package_data = {}
-            current_field, current_value = None, []
-
-            for line in raw_info.split('\n'):
-                if line.startswith(' ') and current_field:
-                    current_value.append(line.strip())
-                elif ': ' in line:
-                    if current_field:
-                        package_data[current_field] = ' '.join(current_value)
-                    current_field, value = line.split(': ', 1)
-                    current_value = [value.strip()]
-            if current_field:
-                package_data[current_field] = ' '.join(current_value)
-
-            self.packageInfoReady.emit(package_data)
-            self.dependenciesReady.emit(package_data.get('Depends', 'No dependencies listed.'))
-            info_ok = True
-        except Exception as e:
-            self.logMessage.emit(f"Error extracting package info: {e}")
-
-        if info_ok:
-            self.analysisStatusUpdate.emit("Listing package contents...")
-            try:
-                # Ini bisa memakan waktu, cukup konfirmasi bahwa itu berhasil
-                subprocess.check_output(['dpkg-deb', '-c', self.deb_path], text=True)
-                self.fileListReady.emit("Contents listed successfully.")
-                contents_ok = True
-            except Exception as e:
-                self.logMessage.emit(f"Error listing files: {e}")
-        self.analysisComplete.emit(info_ok and contents_ok)
-
-    def install_package(self, deb_path, password):
-        self.deb_path = deb_path
-        self._password = password
-        self._current_task = "install"
-        self.start()
-
-    def _do_install_package(self):
-        self.current_progress = 0
-        self.installationProgress.emit(10, "Authenticating...")
-        # Gunakan apt untuk menangani dependensi secara otomatis
-        ret = self.run_installation_command(['apt', 'install', '--yes', self.deb_path], self._password)
-        self._password = None # Hapus kata sandi dari memori
-
-        if ret == 0:
-            self.installationProgress.emit(100, "Installed")
-            self.installationFinished.emit(True, "Package installed successfully.")
-        else:
-            self.installationFinished.emit(False, "Installation failed. Check terminal output for details.")
-
-    def run(self):
-        if self._current_task == "analyze":
-            self._do_analyze_deb()
-        elif self._current_task == "install":
-            self._do_install_package()
-        self._current_task = None
+        QObject.__init__(self)
+        DebWorkerCore.__init__(self)
 
 
 # --- Halaman Wizard (Desain Ulang) ---
@@ -270,6 +253,11 @@ class AnalysisConfirmationPage(QWizardPage):
         self.setSubTitle("Review the package description before proceeding.")
         self.analysis_done = False
         self.analysis_successful = False
+        self.space_ok = True
+        self.helper_ready = False
+        self.package_infos = {}
+        self.integrity_reports = {}
+        self.file_model = PackageFileModel(self)
 
         main_layout = QVBoxLayout(self)
         main_layout.setSpacing(20)
@@ -280,46 +268,266 @@ class AnalysisConfirmationPage(QWizardPage):
         self.lbl_pkg_description.setWordWrap(True)
         self.lbl_pkg_description.setStyleSheet("background-color: #f0f0f0; border: 1px solid #ddd; padding: 10px; border-radius: 5px;")
         self.lbl_pkg_description.setAlignment(Qt.AlignTop | Qt.AlignLeft)
-        main_layout.addWidget(self.lbl_pkg_description, 1)
+        # Scrollable so a batch of many packages still fits the page
+        description_scroll = QScrollArea()
+        description_scroll.setWidgetResizable(True)
+        description_scroll.setFrameShape(QScrollArea.NoFrame)
+        description_scroll.setWidget(self.lbl_pkg_description)
+        self.description_scroll = description_scroll
+        main_layout.addWidget(description_scroll, 1)
+
+        # Install plan from the offline dependency preflight
+        self.plan_label = QLabel()
+        self.plan_label.setWordWrap(True)
+        self.plan_label.hide()
+        main_layout.addWidget(self.plan_label)
+
+        # Result of hashing the payload against the package's md5sums
+        self.integrity_label = QLabel()
+        self.integrity_label.setWordWrap(True)
+        self.integrity_label.hide()
+        main_layout.addWidget(self.integrity_label)
+
+        # What an upgrade or reinstall changes compared with the installed copy
+        self.delta_label = QLabel()
+        self.delta_label.setWordWrap(True)
+        self.delta_label.hide()
+        main_layout.addWidget(self.delta_label)
+
+        # Space needed per filesystem against what is free; Next stays disabled when it does not fit
+        self.space_label = QLabel()
+        self.space_label.setWordWrap(True)
+        self.space_label.hide()
+        main_layout.addWidget(self.space_label)
+
+        # Triggers the install sets off (ldconfig, man-db, ...); the slow ones are what setup waits on
+        self.trigger_label = QLabel()
+        self.trigger_label.setWordWrap(True)
+        self.trigger_label.hide()
+        main_layout.addWidget(self.trigger_label)
+
+        # Package contents, filled incrementally while the payload is decompressed
+        self.file_view = QTreeView()
+        self.file_view.setModel(self.file_model)
+        self.file_view.setUniformRowHeights(True)
+        self.file_view.header().setStretchLastSection(False)
+        self.file_view.header().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.file_view.header().setSectionResizeMode(1, QHeaderView.ResizeToContents)
+        self.file_view.hide()
+        main_layout.addWidget(self.file_view, 1)
 
         main_layout.addSpacerItem(QSpacerItem(20, 20, QSizePolicy.Minimum, QSizePolicy.Expanding))
 
         self.status_label = QLabel("Analyzing, please wait...")
         self.status_label.setAlignment(Qt.AlignCenter)
         main_layout.addWidget(self.status_label)
+
+        self.files_btn = QPushButton("Show Files")
+        self.files_btn.setCheckable(True)
+        self.files_btn.setStyleSheet("""
+            QPushButton { 
+                border: 1px solid #ccc; 
+                padding: 8px 12px; 
+                border-radius: 4px;
+                background-color: #f0f0f0;
+            }
+            QPushButton:hover { background-color: #e0e0e0; }
+            QPushButton:checked { background-color: #d0d0d0; }
+        """)
+        self.files_btn.setEnabled(False)
+        self.files_btn.clicked.connect(self.toggle_view)
+
+        btn_layout = QHBoxLayout()
+        btn_layout.addStretch()
+        btn_layout.addWidget(self.files_btn)
+        main_layout.addLayout(btn_layout)
         
         self.setLayout(main_layout)
 
     def initializePage(self):
         self.analysis_done = False
         self.analysis_successful = False
+        self.package_infos = {}
+        self.integrity_reports = {}
+        self.upgrade_deltas = {}
+        self.space_ok = True
+        self.file_model.clear()
+        self.files_btn.setEnabled(False)
+        self.plan_label.hide()
+        self.integrity_label.hide()
+        self.delta_label.hide()
+        self.space_label.hide()
+        self.trigger_label.hide()
         self.completeChanged.emit()
-        self.wizard().start_package_analysis(self.wizard().deb_path)
+        self.wizard().start_package_analysis(self.wizard().deb_paths)
+
+    def toggle_view(self):
+        is_checked = self.files_btn.isChecked()
+        self.description_scroll.setVisible(not is_checked)
+        self.file_view.setVisible(is_checked)
+        self.files_btn.setText("Show Description" if is_checked else "Show Files")
+
+    def add_file_rows(self, deb_path, rows):
+        prefix = ''
+        if len(self.wizard().deb_paths) > 1:
+            # Batches get one top-level folder per package
+            prefix = '/' + self.package_infos.get(deb_path, {}).get('Package', os.path.basename(deb_path))
+        self.file_model.add_entries(rows, prefix)
+        self.files_btn.setEnabled(True)
+
+    def handle_file_list_done(self, deb_path, success):
+        if self.analysis_done and self.analysis_successful:
+            self.update_status_label(f"Analysis complete ({self.file_model.file_count} files). Click 'Next' to continue.")
 
     def update_status_label(self, s):
         self.status_label.setText(f"<i>{s}</i>")
 
-    def update_package_info(self, info):
-        # Set window title to "Installer - <package> <version>"
-        pkg = info.get('Package', 'Unknown')
-        ver = info.get('Version', '')
-        title = f"Installer - {pkg} {ver}".strip()
-        self.wizard().setWindowTitle(title)
-        # Only show description
-        description = info.get('Description', 'No description available.')
-        self.lbl_pkg_description.setText(description)
+    def update_package_info(self, deb_path, info):
+        self.package_infos[deb_path] = info
+        deb_paths = self.wizard().deb_paths
+        if len(deb_paths) == 1:
+            # Set window title to "Installer - <package> <version>"
+            pkg = info.get('Package', 'Unknown')
+            ver = info.get('Version', '')
+            title = f"Installer - {pkg} {ver}".strip()
+            self.wizard().setWindowTitle(title)
+            # Only show description
+            description = info.get('Description', 'No description available.')
+            self.lbl_pkg_description.setText(description)
+            return
+
+        # Batch: one line per analysed package, in command line order
+        self.wizard().setWindowTitle(f"Installer - {len(deb_paths)} packages")
+        lines = []
+        for path in deb_paths:
+            if path not in self.package_infos:
+                continue
+            pkg_info = self.package_infos[path]
+            summary = pkg_info.get('Description', '')
+            if len(summary) > 90:
+                summary = summary[:87] + "..."
+            lines.append(f"<b>{html.escape(pkg_info.get('Package', os.path.basename(path)))} "
+                         f"{html.escape(pkg_info.get('Version', ''))}</b> &mdash; {html.escape(summary)}")
+        self.lbl_pkg_description.setText("<br>".join(lines))
+
+    def show_install_plan(self, plan):
+        parts = []
+        if plan['install']:
+            names = [entry['name'] for entry in plan['install']]
+            shown = ", ".join(names[:10]) + (f" and {len(names) - 10} more" if len(names) > 10 else "")
+            parts.append(f"Also installs {len(names)} package(s) "
+                         f"({_human_size(plan['download_size'])} to download, "
+                         f"{_human_size(plan['installed_size'] * 1024)} on disk): {html.escape(shown)}")
+        else:
+            parts.append("No additional packages need to be downloaded.")
+        for title, problems in (("Unmet dependencies", plan['unmet']), ("Conflicts", plan['conflicts'])):
+            if problems:
+                items = "<br>".join(html.escape(p) for p in problems[:10])
+                parts.append(f"<span style='color: #c0392b;'><b>{title}:</b><br>{items}</span>")
+        self.plan_label.setText("<br>".join(parts))
+        self.plan_label.show()
+
+    def show_integrity(self, deb_path, report):
+        self.integrity_reports[deb_path] = report
+        reports = self.integrity_reports.values()
+        problems = []
+        for path, item in self.integrity_reports.items():
+            name = html.escape(self.package_infos.get(path, {}).get('Package', os.path.basename(path)))
+            if item.get('error'):
+                problems.append(f"{name}: {html.escape(item['error'])}")
+            problems += [f"{name}: {html.escape(p)} (checksum mismatch)" for p in item['mismatched']]
+            problems += [f"{name}: {html.escape(p)} (missing)" for p in item['missing']]
+        if problems:
+            shown = "<br>".join(problems[:10]) + (f"<br>and {len(problems) - 10} more" if len(problems) > 10 else "")
+            self.integrity_label.setText(f"<span style='color: #c0392b;'><b>Package contents are damaged "
+                                         f"or were modified:</b><br>{shown}</span>")
+        else:
+            checked = sum(item['checked'] for item in reports)
+            size = sum(item['bytes'] for item in reports)
+            seconds = sum(item['seconds'] for item in reports)
+            rate = f" at {size / 1e6 / seconds:.0f} MB/s" if seconds else ""
+            text = f"Contents verified: {checked} files ({_human_size(size)}){rate}."
+            if not all(item['has_md5sums'] for item in reports):
+                text += " Some packages ship no md5sums and could not be checked."
+            self.integrity_label.setText(text)
+        self.integrity_label.show()
+
+    def show_upgrade_delta(self, deb_path, delta):
+        self.upgrade_deltas[deb_path] = delta
+        lines = []
+        for path, item in self.upgrade_deltas.items():
+            name = html.escape(self.package_infos.get(path, {}).get('Package', os.path.basename(path)))
+            installed = html.escape(item['installed_version'])
+            if item['identical']:
+                lines.append(f"{name} {installed} is already installed with identical contents.")
+                continue
+            counts, sizes = item['counts'], item['bytes']
+            changes = [f"{counts[c]} {c} ({_human_size(sizes[c])})" for c in ("changed", "added", "removed") if counts[c]]
+            unverified = f", {item['unverified']} without checksums not compared" if item['unverified'] else ""
+            lines.append(f"Replaces {name} {installed}: {', '.join(changes) or 'no file changes'}, "
+                         f"{counts['unchanged']} unchanged{unverified}.")
+        self.delta_label.setText("<br>".join(lines))
+        self.delta_label.show()
+
+    def show_disk_space(self, report):
+        self.space_ok = report['ok']
+        short = [entry for entry in report['mounts'] if not entry['ok']]
+        if short:
+            rows = [f"{html.escape(entry['mount'])}: {_human_size(entry['needed'])} needed, "
+                    f"{_human_size(entry['available'])} free" for entry in short]
+            self.space_label.setText(f"<span style='color: #c0392b;'><b>Not enough disk space:</b><br>"
+                                     f"{'<br>'.join(rows)}</span>")
+        else:
+            rows = [f"{html.escape(entry['mount'])} {_human_size(entry['needed'])} of {_human_size(entry['available'])}"
+                    for entry in report['mounts'] if entry['needed']]
+            self.space_label.setText(f"Disk space: {', '.join(rows) or 'nothing to write'}.")
+        self.space_label.show()
+        self.completeChanged.emit()
+
+    def show_triggers(self, report):
+        if not report['triggers']:
+            self.trigger_label.hide()
+            return
+        items = []
+        for entry in report['triggers']:
+            text = f"{html.escape(entry['label'])} (~{entry['seconds']:g} s)"
+            items.append(f"<b>{text}</b>" if entry['expensive'] else text)
+        when = "once, after all packages are set up" if self.wizard().deb_worker.DEFER_TRIGGERS else "during setup"
+        self.trigger_label.setText(f"Triggers, run {when}: {', '.join(items)}.")
+        self.trigger_label.show()
 
     def handle_analysis_complete(self, success):
         self.analysis_done = True
         self.analysis_successful = success
-        if success:
+        if success and not self.space_ok:
+            # Neither listing nor the background download: the latter would only fill the disk further
+            self.update_status_label("<b>Not enough disk space.</b> Free some space and try again.")
+        elif success:
             self.update_status_label("Analysis complete. Click 'Next' to continue.")
+            self.wizard().deb_worker.list_files(self.wizard().deb_paths)
+            self.wizard().deb_worker.start_prefetch()
+        elif any(not report['ok'] for report in self.integrity_reports.values()):
+            self.update_status_label("<b>Verification failed.</b> Download the package again and retry.")
         else:
             self.update_status_label("<b>Analysis failed.</b> Please check the file and try again.")
         self.completeChanged.emit()
 
     def isComplete(self):
-        return self.analysis_done and self.analysis_successful
+        return self.analysis_done and self.analysis_successful and self.space_ok
+
+    def validatePage(self):
+        # Checked once on Next rather than in nextId(), which QWizard calls on every button update.
+        # QWizard switches pages only after this, so the remaining pages can still be built here.
+        self.helper_ready = self.wizard().deb_worker.helper_available()
+        self.wizard().build_remaining_pages()
+        return True
+
+    def nextId(self):
+        # An already authenticated install helper makes the password page unnecessary. The ids are
+        # returned directly: the pages they name may not have been built yet.
+        if self.helper_ready:
+            return self.wizard().Page_Installation
+        return self.wizard().Page_Password
 
 class PasswordPage(QWizardPage):
     def __init__(self, parent=None):
@@ -346,8 +554,16 @@ class PasswordPage(QWizardPage):
         h_layout.addWidget(self.password_field)
         h_layout.addStretch()
 
+        # Status of the dependency download that runs while the password is typed
+        self.prefetch_label = QLabel()
+        self.prefetch_label.setAlignment(Qt.AlignCenter)
+        self.prefetch_label.setWordWrap(True)
+        self.prefetch_label.setStyleSheet("color: #7f8c8d;")
+        self.prefetch_label.hide()
+
         layout.addWidget(self.info_label)
         layout.addLayout(h_layout)
+        layout.addWidget(self.prefetch_label)
 
         layout.addSpacerItem(QSpacerItem(20, 40, QSizePolicy.Minimum, QSizePolicy.Expanding))
 
@@ -356,6 +572,10 @@ class PasswordPage(QWizardPage):
         # Daftarkan field agar wizard dapat mengakses nilainya
         self.registerField("password*", self.password_field)
 
+    def show_prefetch_status(self, text):
+        self.prefetch_label.setText(text)
+        self.prefetch_label.show()
+
     def initializePage(self):
         # Disable back navigation for this page
         wizard = self.wizard()
@@ -372,11 +592,26 @@ class PasswordPage(QWizardPage):
         super().cleanupPage()
 
 class InstallationPage(QWizardPage):
+    MAX_LOG_BLOCKS = 10000
+    LOG_FLUSH_MS = 100
+    PROGRESS_FLUSH_MS = 33
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setTitle("Installation in Progress")
         self.setSubTitle("Please wait while the package is being installed on your system.")
         self.installation_running = False
+        self._pending_progress = None
+
+        # Log lines are pulled from the worker's ring buffer at most LOG_FLUSH_MS apart
+        self.log_timer = QTimer(self)
+        self.log_timer.setInterval(self.LOG_FLUSH_MS)
+        self.log_timer.timeout.connect(self.flush_log)
+        # Bursts of progress signals collapse into one repaint per PROGRESS_FLUSH_MS
+        self.progress_timer = QTimer(self)
+        self.progress_timer.setSingleShot(True)
+        self.progress_timer.setInterval(self.PROGRESS_FLUSH_MS)
+        self.progress_timer.timeout.connect(self.flush_progress)
 
         layout = QVBoxLayout(self)
         layout.setSpacing(15)
@@ -384,11 +619,13 @@ class InstallationPage(QWizardPage):
 
         self.progress_bar = CircularProgressBar()
 
-        # Make log_output expand vertically when visible
-        self.log_output = QTextEdit()
+        # Make log_output expand vertically when visible. Plain text with a block cap keeps appends
+        # cheap and memory flat; the complete log is written to disk by the worker.
+        self.log_output = QPlainTextEdit()
         self.log_output.setReadOnly(True)
+        self.log_output.setMaximumBlockCount(self.MAX_LOG_BLOCKS)
         self.log_output.setFont(QFont("Monospace", 9))
-        self.log_output.setStyleSheet("QTextEdit { background-color: #ffffff; color: #333; border: 1px solid #ccc; }")
+        self.log_output.setStyleSheet("QPlainTextEdit { background-color: #ffffff; color: #333; border: 1px solid #ccc; }")
         self.log_output.hide()
         self.log_output.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)  # Allow vertical expansion
 
@@ -438,17 +675,29 @@ class InstallationPage(QWizardPage):
         
         self.update_progress(5, "Initializing...")
         self.log_output.clear()
+        self.log_timer.start()
         
         password = self.field("password")
-        self.wizard().start_package_installation(self.wizard().deb_path, password)
+        self.wizard().start_package_installation(self.wizard().deb_paths, password)
         self.setField("password", "")
 
     def update_progress(self, value, text):
-        self.progress_bar.setValue(value)
-        self.progress_bar.setProgressText(text)
+        self._pending_progress = (value, text)
+        if not self.progress_timer.isActive():
+            self.progress_timer.start()
+
+    def flush_progress(self):
+        if self._pending_progress is not None:
+            value, text = self._pending_progress
+            self._pending_progress = None
+            self.progress_bar.setValue(value)
+            self.progress_bar.setProgressText(text)
 
     def handle_installation_finished(self, success, message):
         self.installation_running = False
+        self.log_timer.stop()
+        self.flush_log()
+        self.flush_progress()
         self.setFinalPage(True)
         self.wizard().installation_result_message = message 
         self.wizard().installation_success_status = success
@@ -462,6 +711,7 @@ class InstallationPage(QWizardPage):
 
         if success:
             self.update_progress(100, "Completed!")
+            self.flush_progress()
             self.setSubTitle("The installation has completed successfully.")
             # Move to finish page after a short delay (disable next immediately)
             QTimer.singleShot(1, lambda: self.wizard().setCurrentId(self.wizard().Page_Finish))
@@ -476,8 +726,13 @@ class InstallationPage(QWizardPage):
             
         self.completeChanged.emit()
 
-    def append_log(self, text):
-        self.log_output.append(text)
+    def flush_log(self):
+        lines, dropped = self.wizard().deb_worker.log_ring.drain()
+        if dropped:
+            log_path = self.wizard().deb_worker.log_ring.log_path
+            lines.insert(0, f"[... {dropped} lines not shown, see {log_path or 'the log file'} ...]")
+        if lines:
+            self.log_output.appendPlainText("\n".join(lines))
 
     def isComplete(self):
         return not self.installation_running
@@ -526,7 +781,7 @@ class DebInstallerWizard(QWizard):
     Page_Installation = 2
     Page_Finish = 3
 
-    def __init__(self, deb_path, parent=None):
+    def __init__(self, deb_paths, parent=None, worker=None):
         super().__init__(parent)
         self.setWizardStyle(QWizard.ModernStyle)
         self.setWindowTitle("Installer")
@@ -543,33 +798,77 @@ class DebInstallerWizard(QWizard):
             back_btn.hide()
             back_btn.setEnabled(False)
         
-        self.deb_path = deb_path
-        self.deb_worker = DebWorker()
+        self.deb_paths = list(deb_paths)
+        # A worker passed in may already be analysing with its signals held (see __main__)
+        self.deb_worker = worker or DebWorker()
         self.installation_result_message = ""
         self.installation_success_status = False
+        self.prefetch_status = None
+        self._startup_probe = {} if os.environ.get('SETDEB_STARTUP_PROBE') else None
 
+        # Only the first page is built up front; the others on the first Next (build_remaining_pages)
         self.setPage(self.Page_Analysis, AnalysisConfirmationPage(self))
-        self.setPage(self.Page_Password, PasswordPage(self))
-        self.setPage(self.Page_Installation, InstallationPage(self))
-        self.setPage(self.Page_Finish, FinishPage(self))
         self.setStartId(self.Page_Analysis)
 
         # Hubungkan sinyal dari worker ke slot di UI
         self.deb_worker.analysisStatusUpdate.connect(self.page(self.Page_Analysis).update_status_label)
         self.deb_worker.packageInfoReady.connect(self.page(self.Page_Analysis).update_package_info)
         self.deb_worker.analysisComplete.connect(self.page(self.Page_Analysis).handle_analysis_complete)
+        self.deb_worker.fileListChunk.connect(self.page(self.Page_Analysis).add_file_rows)
+        self.deb_worker.fileListDone.connect(self.page(self.Page_Analysis).handle_file_list_done)
+        self.deb_worker.installPlanReady.connect(self.page(self.Page_Analysis).show_install_plan)
+        self.deb_worker.integrityReady.connect(self.page(self.Page_Analysis).show_integrity)
+        self.deb_worker.upgradeDeltaReady.connect(self.page(self.Page_Analysis).show_upgrade_delta)
+        self.deb_worker.diskSpaceReady.connect(self.page(self.Page_Analysis).show_disk_space)
+        self.deb_worker.triggersReady.connect(self.page(self.Page_Analysis).show_triggers)
+        self.deb_worker.packageAlreadyInstalled.connect(self.handle_existing_package)
+        # Arrives while the analysis page is still shown; kept until the password page exists
+        self.deb_worker.prefetchStatus.connect(self.handle_prefetch_status)
+        if self._startup_probe is not None:
+            self.deb_worker.analysisComplete.connect(lambda success: self.record_startup('analysis_complete'))
+
+    def build_remaining_pages(self):
+        if self.page(self.Page_Password) is not None:
+            return
+        self.setPage(self.Page_Password, PasswordPage(self))
+        self.setPage(self.Page_Installation, InstallationPage(self))
+        self.setPage(self.Page_Finish, FinishPage(self))
         self.deb_worker.installationProgress.connect(self.page(self.Page_Installation).update_progress)
         self.deb_worker.installationFinished.connect(self.page(self.Page_Installation).handle_installation_finished)
-        self.deb_worker.logMessage.connect(self.page(self.Page_Installation).append_log)
-        self.deb_worker.packageAlreadyInstalled.connect(self.handle_existing_package)
+        if self.prefetch_status:
+            self.page(self.Page_Password).show_prefetch_status(self.prefetch_status)
 
-    def start_package_analysis(self, path):
-        if self.deb_worker.isRunning(): return
-        self.deb_worker.analyze_deb(path)
+    def handle_prefetch_status(self, text):
+        self.prefetch_status = text
+        if (page := self.page(self.Page_Password)) is not None:
+            page.show_prefetch_status(text)
 
-    def start_package_installation(self, deb_path, password):
-        if self.deb_worker.isRunning(): return
-        self.deb_worker.install_package(deb_path, password)
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if self._startup_probe is not None and 'first_paint' not in self._startup_probe:
+            self.record_startup('first_paint')
+
+    def record_startup(self, name):
+        # SETDEB_STARTUP_PROBE=<file>: wall clock times of the first paint and of analysis complete
+        # are written there (for bench.py startup) and the wizard closes
+        self._startup_probe.setdefault(name, time.time())
+        if len(self._startup_probe) == 2:
+            with open(os.environ['SETDEB_STARTUP_PROBE'], 'w') as f:
+                json.dump(self._startup_probe, f)
+            QTimer.singleShot(0, self.reject)
+
+    def start_package_analysis(self, paths):
+        # An analysis started before the window existed is adopted by replaying its signals; a
+        # running one is otherwise cancelled and replaced
+        if self.deb_worker.signals_held():
+            self.deb_worker.release_signals()
+            return
+        self.deb_worker.analyze_debs(paths)
+
+    def start_package_installation(self, deb_paths, password):
+        if self.deb_worker.busy("install"): return
+        self.deb_worker.cancel_file_listing()
+        self.deb_worker.install_packages(deb_paths, password)
 
     def handle_existing_package(self, installed, pkg_name):
         if installed:
@@ -581,6 +880,12 @@ class DebInstallerWizard(QWizard):
             # Langsung ke halaman akhir
             self.setCurrentId(self.Page_Finish)
 
+    def reject(self):
+        self.deb_worker.cancel_prefetch()
+        self.deb_worker.cancel_file_listing()
+        self.deb_worker.scheduler.cancel("analysis")
+        super().reject()
+
     # Override navigation methods to prevent back
     def back(self):
         pass
@@ -590,23 +895,32 @@ class DebInstallerWizard(QWizard):
 
 
 if __name__ == '__main__':
+    # argv is checked before Qt is set up, so analysis can run while QApplication and the wizard are
+    # built; its signals are held until the first page is shown
+    error, deb_file_paths, worker = None, [], None
+    if len(sys.argv) < 2:
+        error = f"<b>Usage:</b> {os.path.basename(sys.argv[0])} &lt;deb-file-or-directory&gt; ..."
+    else:
+        try:
+            deb_file_paths = collect_deb_paths(sys.argv[1:])
+        except ValueError as e:
+            error = html.escape(str(e))
+    if error is None:
+        worker = DebWorker()
+        worker.hold_signals()
+        worker.analyze_debs(deb_file_paths)
+
     app = QApplication(sys.argv)
     
     # Atur font default untuk konsistensi
     font = QFont("Segoe UI", 10)
     app.setFont(font)
     
-    if len(sys.argv) < 2:
-        QMessageBox.critical(None, "Error", f"<b>Usage:</b> {os.path.basename(sys.argv[0])} &lt;path-to-deb-file&gt;")
+    if error is not None:
+        QMessageBox.critical(None, "Error", error)
         sys.exit(1)
-        
-    deb_file_path = os.path.abspath(sys.argv[1])
-    
-    if not os.path.isfile(deb_file_path) or not deb_file_path.lower().endswith('.deb'):
-        QMessageBox.critical(None, "Error", f"The file '<b>{os.path.basename(deb_file_path)}</b>' is not a valid .deb file.")
-        sys.exit(1)
-        
-    wizard = DebInstallerWizard(deb_path=deb_file_path)
+
+    wizard = DebInstallerWizard(deb_paths=deb_file_paths, worker=worker)
     # Atur ukuran default yang lebih baik, biarkan tata letak menangani sisanya
     wizard.resize(580, 460)
     sys.exit(wizard.exec())
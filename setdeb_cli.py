@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+# Headless front end for setdeb (--analyze / --install). Must never import PySide6.
+
+import os
+import sys
+import json
+import time
+import threading
+import argparse
+
+from debcore import DebWorkerCore, DropFolderWatcher, Emitter, collect_deb_paths
+
+
+class HeadlessWorker(DebWorkerCore):
+    # DebWorkerCore with plain Emitters instead of Qt signals. analyze_debs/install_packages return
+    # once their tasks have finished; the tasks themselves still run concurrently.
+    def __init__(self, on_log=None):
+        for name in self.SIGNALS:
+            setattr(self, name, Emitter())
+        DebWorkerCore.__init__(self)
+        self._on_log = on_log
+
+    def log(self, text):
+        super().log(text)
+        if self._on_log is not None:
+            self._on_log(text)
+
+    def analyze_debs(self, deb_paths):
+        super().analyze_debs(deb_paths)
+        self.scheduler.join("analysis")
+
+    def install_packages(self, deb_paths, password):
+        super().install_packages(deb_paths, password)
+        self.scheduler.join("install")
+
+
+class _Output:
+    # Line-delimited JSON events with --json, short human readable lines otherwise
+    def __init__(self, as_json, stream=sys.stdout):
+        self.as_json = as_json
+        self.stream = stream
+
+    def event(self, name, text, **fields):
+        if self.as_json:
+            self.stream.write(json.dumps({"event": name, **fields}) + "\n")
+        else:
+            self.stream.write(text + "\n")
+        self.stream.flush()
+
+
+def run_analysis(worker, deb_paths, output):
+    result = {"success": False, "packages": {}, "plan": None, "integrity": {}, "deltas": {}, "space": None,
+              "triggers": None}
+    slots = [
+        (worker.packageInfoReady, lambda path, info: result["packages"].__setitem__(path, info)),
+        (worker.installPlanReady, lambda plan: result.__setitem__("plan", plan)),
+        (worker.integrityReady, lambda path, report: result["integrity"].__setitem__(path, report)),
+        (worker.upgradeDeltaReady, lambda path, delta: result["deltas"].__setitem__(path, delta)),
+        (worker.diskSpaceReady, lambda report: result.__setitem__("space", report)),
+        (worker.triggersReady, lambda report: result.__setitem__("triggers", report)),
+        (worker.analysisComplete, lambda success: result.__setitem__("success", success)),
+    ]
+    if output is not None:
+        slots.append((worker.analysisStatusUpdate, lambda text: output.event("status", text, status=text)))
+    for emitter, slot in slots:
+        emitter.connect(slot)
+    try:
+        worker.analyze_debs(deb_paths)
+    finally:
+        # Watch mode analyses many times with the same worker
+        for emitter, slot in slots:
+            emitter.disconnect(slot)
+    return result
+
+
+def _analysis_packages(result, deb_paths):
+    return [{"path": path, "control": result["packages"].get(path), "integrity": result["integrity"].get(path),
+             "delta": result["deltas"].get(path)} for path in deb_paths]
+
+
+def _space_problems(result):
+    report = result["space"]
+    return [f"{entry['mount']}: {entry['needed'] / 1e6:.1f} MB needed, {entry['available'] / 1e6:.1f} MB available"
+            for entry in (report["mounts"] if report else ()) if not entry["ok"]]
+
+
+def _print_analysis(result, deb_paths, as_json):
+    packages = _analysis_packages(result, deb_paths)
+    if as_json:
+        print(json.dumps({"success": result["success"], "packages": packages, "plan": result["plan"],
+                          "disk_space": result["space"], "triggers": result["triggers"]}, indent=2, sort_keys=True))
+        return
+    for package in packages:
+        control = package["control"] or {}
+        print(f"{control.get('Package', package['path'])} {control.get('Version', '')}".rstrip())
+        if control.get("Depends"):
+            print(f"  Depends: {control['Depends']}")
+        integrity = package["integrity"]
+        if integrity and integrity["ok"] and integrity["has_md5sums"]:
+            print(f"  Verified: {integrity['checked']} files, {integrity['bytes'] / 1e6:.1f} MB "
+                  f"at {integrity['mb_per_s']:.1f} MB/s")
+        elif integrity:
+            problems = [integrity["error"]] if integrity.get("error") else []
+            problems += [f"{p}: checksum mismatch" for p in integrity["mismatched"]]
+            problems += [f"{p}: missing" for p in integrity["missing"]]
+            for problem in problems:
+                print(f"  ! {problem}")
+        delta = package["delta"]
+        if delta and delta["identical"]:
+            print(f"  Installed: {delta['installed_version']}, identical; installing would change nothing")
+        elif delta:
+            counts, sizes = delta["counts"], delta["bytes"]
+            print(f"  Installed: {delta['installed_version']}; "
+                  + ", ".join(f"{counts[c]} {c} ({sizes[c] / 1e6:.1f} MB)" for c in ("changed", "added", "removed"))
+                  + f", {counts['unchanged']} unchanged"
+                  + (f", {delta['unverified']} not compared" if delta["unverified"] else ""))
+    plan = result["plan"]
+    if plan:
+        if plan["install"]:
+            names = ", ".join(entry["name"] for entry in plan["install"])
+            print(f"Also installs {len(plan['install'])} package(s), {plan['download_size']} bytes to download: {names}")
+        for problem in plan["unmet"] + plan["conflicts"]:
+            print(f"  ! {problem}")
+    if result["space"]:
+        needed = sum(entry["needed"] for entry in result["space"]["mounts"])
+        print(f"Needs {needed / 1e6:.1f} MB on {len(result['space']['mounts'])} filesystem(s)")
+        for problem in _space_problems(result):
+            print(f"  ! Not enough space on {problem}")
+    triggers = result["triggers"]
+    if triggers and (triggers["triggers"] or triggers["scripts"]):
+        print(f"Triggers: about {triggers['estimated_seconds']:g} s for {len(triggers['handlers'])} package(s)")
+        for entry in triggers["triggers"]:
+            print(f"  {'*' if entry['expensive'] else '-'} {entry['label']} ({', '.join(entry['handlers'])}, "
+                  f"~{entry['seconds']:g} s), activated by {', '.join(entry['packages'])}")
+        for entry in triggers["scripts"]:
+            if entry["expensive"]:
+                print(f"  * {entry['package']} {entry['script']} runs {entry['command']} itself "
+                      f"(~{entry['seconds']:g} s, not deferrable)")
+    print("Analysis complete." if result["success"] else "Analysis failed.")
+
+
+def _read_password(worker, args):
+    if worker.helper_available():
+        return None  # the running install helper is already authenticated
+    if args.password_stdin:
+        return sys.stdin.readline().rstrip("\n")
+    import getpass
+    return getpass.getpass("[sudo] password: ")
+
+
+def _connect_install_output(worker, output, finished):
+    worker.installationProgress.connect(
+        lambda percent, text: output.event("progress", f"[{percent:3d}%] {text}", percent=percent, status=text))
+    worker.packageAlreadyInstalled.connect(
+        lambda installed, names: output.event("already-installed", f"Already installed: {names}", packages=names))
+    worker.installationFinished.connect(lambda success, message: finished.update(success=success, message=message))
+
+
+def _package_problems(package):
+    integrity = package["integrity"]
+    if package["control"] is None:
+        return ["could not be read"]
+    if integrity is None or integrity["ok"]:
+        return []
+    problems = [integrity["error"]] if integrity.get("error") else []
+    return problems + [f"{p}: checksum mismatch" for p in integrity["mismatched"]] + \
+        [f"{p}: missing" for p in integrity["missing"]]
+
+
+def run_watch(worker, directory, output, install, interval, password=None):
+    # Drop-folder mode. The watcher hands over batches of files that have stopped changing; each
+    # batch is analysed in this process (cache hits for anything seen before) and packages that
+    # pass are installed together every `interval` seconds. A batch whose plan or install fails is
+    # held and retried once more packages have arrived, which may be the missing dependencies.
+    import queue
+    import signal
+    events = queue.Queue()
+    watcher = DropFolderWatcher(directory, lambda paths: events.put(("ready", paths)),
+                                lambda path: events.put(("removed", path)))
+    ready, held = {}, {}  # path -> control
+    finished = {}
+    if install:
+        _connect_install_output(worker, output, finished)
+    watcher.start()
+    output.event("watching", f"Watching {watcher.directory} for .deb files ({watcher.mode}); Ctrl+C to stop.",
+                 directory=watcher.directory, mode=watcher.mode)
+    # Ctrl+C / SIGTERM finish the batch in progress instead of interrupting dpkg
+    stop = threading.Event()
+    previous = {sig: signal.signal(sig, lambda *_: stop.set()) for sig in (signal.SIGINT, signal.SIGTERM)}
+    next_install = time.monotonic() + interval
+    try:
+        while watcher.error is None and not stop.is_set():
+            try:
+                items = [events.get(timeout=max(0.0, min(1.0, next_install - time.monotonic())))]
+            except queue.Empty:
+                items = []
+            while True:
+                # A burst arrives as several quiet periods; analyse everything queued as one batch
+                try:
+                    items.append(events.get_nowait())
+                except queue.Empty:
+                    break
+            arrived = {}
+            for kind, value in items:
+                if kind == "ready":
+                    arrived.update(dict.fromkeys(value))
+                    continue
+                arrived.pop(value, None)
+                if ready.pop(value, None) is not None or held.pop(value, None) is not None:
+                    output.event("removed", f"Removed: {os.path.basename(value)}", path=value)
+            if arrived:
+                _watch_analyze(worker, list(arrived), output, install, ready, held)
+            if time.monotonic() < next_install:
+                continue
+            next_install = time.monotonic() + interval
+            if install and ready:
+                _watch_install(worker, output, ready, held, finished, password)
+    finally:
+        watcher.stop()
+        for sig, handler in previous.items():
+            signal.signal(sig, handler)
+    if watcher.error:
+        output.event("finished", f"Stopped watching: {watcher.error}", success=False, message=watcher.error)
+        return 1
+    pending = len(ready) + len(held)
+    output.event("finished", f"Stopped watching; {pending} package(s) not installed." if install else
+                 "Stopped watching.", success=True, pending=pending)
+    return 0
+
+
+def _watch_analyze(worker, paths, output, install, ready, held):
+    result = run_analysis(worker, paths, None)
+    if not install:
+        if output.as_json:
+            output.event("analysis", "", success=result["success"], packages=_analysis_packages(result, paths),
+                         plan=result["plan"], disk_space=result["space"], triggers=result["triggers"])
+        else:
+            _print_analysis(result, paths, False)
+        return
+    passed = 0
+    for package in _analysis_packages(result, paths):
+        path, control = package["path"], package["control"]
+        held.pop(path, None)
+        problems = _package_problems(package)
+        if problems:
+            ready.pop(path, None)
+            output.event("rejected", f"Rejected {os.path.basename(path)}: {'; '.join(problems)}",
+                         path=path, problems=problems)
+            continue
+        ready[path] = control
+        passed += 1
+        output.event("ready", f"Ready: {control.get('Package', '')} {control.get('Version', '')}",
+                     path=path, package=control.get("Package"), version=control.get("Version"))
+    if passed and held:
+        ready.update(held)
+        held.clear()
+
+
+def _watch_install(worker, output, ready, held, finished, password):
+    # The whole batch is analysed again: cache hits, but dependencies and file conflicts are
+    # checked against what earlier batches installed
+    paths = sorted(ready)
+    output.event("batch", f"Installing {len(paths)} package(s)...", paths=paths)
+    result = run_analysis(worker, paths, output)
+    finished.clear()
+    if _space_problems(result):
+        finished.update(success=False, message="Not enough space on " + "; ".join(_space_problems(result)))
+    elif result["success"]:
+        worker.install_packages(paths, password)
+    else:
+        plan = result["plan"] or {"unmet": [], "conflicts": []}
+        finished.update(success=False, message="; ".join(plan["unmet"] + plan["conflicts"]) or "Analysis failed.")
+    output.event("batch-finished", finished.get("message", ""), count=len(paths), **finished)
+    if not finished.get("success"):
+        held.update(ready)
+        output.event("held", f"Holding {len(held)} package(s) until more packages arrive.", count=len(held))
+    ready.clear()
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="setdeb.py", description="Analyze or install .deb packages without a GUI.")
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument("--analyze", action="store_true", help="print package metadata and the install plan")
+    mode.add_argument("--install", action="store_true", help="install the packages with apt")
+    parser.add_argument("--json", action="store_true", help="machine readable output")
+    parser.add_argument("--yes", action="store_true", help="required with --install; do not ask for confirmation")
+    parser.add_argument("--no-verify", action="store_true", help="skip hashing the payload against md5sums")
+    # Both read large parts of dpkg's database; --install and --watch always do them
+    parser.add_argument("--conflicts", action="store_true",
+                        help="with --analyze, also check for files installed packages already own")
+    parser.add_argument("--triggers", action="store_true",
+                        help="with --analyze, also estimate the dpkg triggers the install would run")
+    parser.add_argument("--no-prefetch", action="store_true",
+                        help="do not download dependencies before the password is read")
+    parser.add_argument("--password-stdin", action="store_true", help="read the sudo password from standard input")
+    parser.add_argument("--trace", metavar="FILE", help="write per-phase timings to FILE as a Chrome trace")
+    parser.add_argument("--watch", action="store_true",
+                        help="keep running and handle .deb files as they appear in the given directory")
+    parser.add_argument("--batch-interval", type=float, default=60.0, metavar="SECONDS",
+                        help="with --watch --install, how often ready packages are installed (default: 60)")
+    parser.add_argument("paths", nargs="+", metavar="deb-file-or-directory")
+    args = parser.parse_args(argv)
+
+    if args.watch:
+        if len(args.paths) != 1 or not os.path.isdir(args.paths[0]):
+            parser.error("--watch takes exactly one directory")
+        if args.install and not args.yes:
+            parser.error("--install requires --yes")
+        output = _Output(args.json, sys.stderr if args.analyze and not args.json else sys.stdout)
+        worker = HeadlessWorker(on_log=lambda line: output.event("log", line, message=line))
+        worker.VERIFY_PAYLOAD = not args.no_verify
+        # Build farms re-upload identical files under new timestamps; hash them before re-analysing
+        worker.analysis_cache.hash_fallback = True
+        if args.trace:
+            worker.enable_tracing(args.trace)
+        password = _read_password(worker, args) if args.install else None
+        return run_watch(worker, args.paths[0], output, args.install, args.batch_interval, password)
+
+    try:
+        deb_paths = collect_deb_paths(args.paths)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.analyze:
+        messages = []
+        worker = HeadlessWorker(on_log=messages.append)
+        worker.VERIFY_PAYLOAD = not args.no_verify
+        worker.CHECK_FILE_CONFLICTS = args.conflicts
+        worker.ANALYZE_TRIGGERS = args.triggers
+        if args.trace:
+            worker.enable_tracing(args.trace)
+        result = run_analysis(worker, deb_paths, None)
+        for message in messages:
+            print(message, file=sys.stderr)
+        _print_analysis(result, deb_paths, args.json)
+        return 0 if result["success"] else 1
+
+    if not args.yes:
+        parser.error("--install requires --yes")
+    output = _Output(args.json)
+    worker = HeadlessWorker(on_log=lambda line: output.event("log", line, message=line))
+    worker.VERIFY_PAYLOAD = not args.no_verify
+    if args.trace:
+        worker.enable_tracing(args.trace)
+        worker.phaseTimed.connect(lambda span: output.event(
+            "span", f"[TRACE] {span['name']}: {span['duration'] * 1000:.1f} ms", span=span))
+    result = run_analysis(worker, deb_paths, output)
+    if not result["success"]:
+        output.event("finished", "Analysis failed.", success=False, message="Analysis failed.")
+        return 1
+    if _space_problems(result):
+        message = "Not enough space on " + "; ".join(_space_problems(result))
+        output.event("finished", message, success=False, message=message)
+        return 1
+
+    worker.prefetchStatus.connect(lambda text: output.event("prefetch", text, status=text))
+    if not args.no_prefetch:
+        worker.start_prefetch()
+    password = _read_password(worker, args)
+    finished = {}
+    _connect_install_output(worker, output, finished)
+    worker.install_packages(deb_paths, password)
+    output.event("finished", finished.get("message", ""), **finished)
+    return 0 if finished.get("success") else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
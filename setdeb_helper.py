@@ -0,0 +1,521 @@
+#!/usr/bin/env python3
+# Long-lived privileged helper for setdeb. The wizard or CLI starts it once through sudo; it then
+# serves every setdeb instance of the same user over a Unix socket until it has been idle for a
+# while. Install jobs need the dpkg lock and run one at a time; analysis jobs run in parallel.
+# Must never import PySide6.
+#
+# Protocol (one JSON object per line, see debcore.HelperClient):
+#   {"op": "hello"}                         -> hello {protocol, pid, executor}
+#   {"op": "install", "debs": [...], "archives": [...], "reinstall": false, "defer_triggers": false,
+#    "timeout": null}
+#                                           (archives: optional, already downloaded dependencies that are
+#                                              copied into apt's cache before apt runs; reinstall: optional,
+#                                              apt --reinstall for same-version packages with other contents;
+#                                              defer_triggers: optional, dpkg triggers wait until no more
+#                                              install jobs are queued and then run once, at the end of
+#                                              the job that finds the queue empty, or as soon as the
+#                                              queue is emptied by cancelling or shutting down)
+#                                           -> queued {job, position}, started {job, command},
+#                                              line {job, stream, text}, status {job, record},
+#                                              finished {job, returncode, cancelled, timed_out[, error]
+#                                                        [, triggers_deferred]}
+#   {"op": "analyze", "debs": [...]}        -> queued {job}, analysis {job, path, control | error},
+#                                              finished {job, returncode}
+#   {"op": "cancel", "job": N}              -> cancelling {job, found}
+#   {"op": "status"}                        -> status {running, queued}
+#   {"op": "shutdown"}                      -> bye; queued installs are cancelled, a running one finishes,
+#                                              deferred triggers run before the helper exits
+# Anything else gets {"event": "error", "message": ...}.
+
+import os
+import sys
+import json
+import time
+import stat
+import socket
+import argparse
+import threading
+from collections import deque
+
+from debcore import (APT_DEFER_TRIGGERS, APT_SKIP_CONFIGURE_PENDING, DPKG_TRIGGERS_DIR, HELPER_PROTOCOL, DebFile,
+                     ProcessRunner, StatusFdReader, TriggerRegistry, apt_status_command, dpkg_pending_command, package_triggers,
+                     peer_uid, seed_archives_command, trigger_preflight)
+
+IDLE_TIMEOUT = 300  # seconds without jobs or requests before the helper exits
+
+
+class Job:
+    def __init__(self, job_id, op, debs, connection, timeout=None, archives=(), reinstall=False,
+                 defer_triggers=False):
+        self.id = job_id
+        self.op = op
+        self.debs = debs
+        self.archives = list(archives)
+        self.reinstall = reinstall
+        self.defer_triggers = defer_triggers
+        self.connection = connection
+        self.timeout = timeout
+        self.cancel = threading.Event()
+
+    def emit(self, event, **fields):
+        self.connection.send(event, job=self.id, **fields)
+
+
+# --- Executors ---
+def job_command(job):
+    defer = APT_DEFER_TRIGGERS + APT_SKIP_CONFIGURE_PENDING if job.defer_triggers else []
+    return ['apt', 'install', '--yes'] + (['--reinstall'] if job.reinstall else []) + defer + job.debs
+
+
+class AptExecutor:
+    name = "apt"
+
+    def run_pending(self, job):
+        # The pass apt leaves out with deferred triggers; reported on the job that happens to run it
+        status_reader = StatusFdReader(lambda record: job.emit("status", record=record))
+        runner = ProcessRunner(dpkg_pending_command(status_reader.path),
+                               lambda stream, text: job.emit("line", stream=stream, text=text),
+                               timeout=job.timeout)
+        try:
+            return runner.run()
+        finally:
+            status_reader.close()
+
+    def run(self, job):
+        status_reader = StatusFdReader(lambda record: job.emit("status", record=record))
+        command = job_command(job)
+        job.emit("started", command=command)
+        runner = ProcessRunner(seed_archives_command(job.archives, apt_status_command(status_reader.path, command)),
+                               lambda stream, text: job.emit("line", stream=stream, text=text),
+                               timeout=job.timeout, cancel_event=job.cancel)
+        try:
+            returncode = runner.run()
+        finally:
+            status_reader.close()
+        return {"returncode": returncode, "cancelled": runner.cancelled, "timed_out": runner.timed_out}
+
+
+class StandInExecutor:
+    # Unprivileged replacement for apt: reads each package's control file and plays back the lines
+    # and Status-Fd records apt would produce, without touching the system. The lock models dpkg's,
+    # so two install jobs overlapping is reported as an error instead of passing silently. Triggers
+    # are found the way setdeb's analysis finds them and take trigger_delay each.
+    name = "stand-in"
+
+    def __init__(self, delay=0.05, trigger_delay=None, triggers_dir=DPKG_TRIGGERS_DIR):
+        self.delay = delay
+        self.trigger_delay = delay if trigger_delay is None else trigger_delay
+        self.triggers_dir = triggers_dir
+        self._dpkg_lock = threading.Lock()
+        self._triggered = []  # interested packages whose deferred triggers are pending
+
+    def run(self, job):
+        if not self._dpkg_lock.acquire(blocking=False):
+            return {"returncode": 100, "error": "dpkg lock is held by another job"}
+        try:
+            command = job_command(job)
+            job.emit("started", command=command)
+            names = [DebFile(path).control().get('Package', os.path.basename(path)) for path in job.debs]
+            if job.archives:
+                job.emit("line", stream="stdout", text=f"Using {len(job.archives)} archive(s) downloaded in advance")
+            job.emit("line", stream="stdout", text="The following NEW packages will be installed:")
+            job.emit("line", stream="stdout", text="  " + " ".join(names))
+            steps = [("Unpacking", name) for name in names] + [("Setting up", name) for name in names]
+            for done, (action, name) in enumerate(steps, 1):
+                if job.cancel.wait(self.delay):
+                    return {"returncode": -15, "cancelled": True}
+                job.emit("line", stream="stdout", text=f"{action} {name} ...")
+                percent = done * 100.0 / len(steps)
+                description = "Unpacking" if action == "Unpacking" else "Configuring"
+                job.emit("status", record=f"pmstatus:{name}:{percent:.4f}:{description} {name}")
+            for name in self._handlers(job):
+                if job.defer_triggers:
+                    if name not in self._triggered:
+                        self._triggered.append(name)
+                else:
+                    # dpkg's default: the triggers run within this job
+                    self._process_trigger(job, name, f"pmstatus:{name}:100:Processing triggers for {name}")
+            return {"returncode": 0}
+        finally:
+            self._dpkg_lock.release()
+
+    def _handlers(self, job):
+        registry = TriggerRegistry(self.triggers_dir).refresh()
+        packages = []
+        for path in job.debs:
+            deb = DebFile(path)
+            packages.append((deb.control().get('Package', ''), package_triggers(deb),
+                             [(entry.path, entry.size, entry.kind) for entry in deb.iter_entries()]))
+        return sorted(trigger_preflight(packages, registry).handlers)
+
+    def _process_trigger(self, job, name, record):
+        job.emit("line", stream="stdout", text=f"Processing triggers for {name} ...")
+        job.emit("status", record=record)
+        time.sleep(self.trigger_delay)
+
+    def run_pending(self, job):
+        triggered, self._triggered = self._triggered, []
+        for name in triggered:
+            self._process_trigger(job, name, f"processing: trigproc: {name}")
+        return 0
+
+
+# --- Server ---
+class _Connection:
+    # Writes come from the reader thread, the install lane and the analysis pool
+    def __init__(self, sock):
+        self.sock = sock
+        self._lock = threading.Lock()
+        self.closed = False
+
+    def send(self, event, **fields):
+        data = (json.dumps({"event": event, **fields}) + "\n").encode()
+        with self._lock:
+            if self.closed:
+                return
+            try:
+                self.sock.sendall(data)
+            except OSError:
+                # The client went away; its jobs keep running, dpkg must not be interrupted midway
+                self.closed = True
+
+
+class HelperServer:
+    def __init__(self, path, owner_uid, executor, analysis_workers=4, idle_timeout=IDLE_TIMEOUT):
+        self.path = path
+        self.owner_uid = owner_uid
+        self.executor = executor
+        self.analysis_workers = analysis_workers
+        self.idle_timeout = idle_timeout
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._running = None
+        self._configure_pending = False  # a job deferred its triggers and the pending pass has not run
+        self._deferred_by = None  # the last job that deferred its triggers; reports a pass run on its own
+        self._lane = None
+        self._analysis_jobs = {}
+        self._next_id = 1
+        self._last_activity = time.monotonic()
+        self._stopping = False
+        self._pool = None
+        self._dir_fd = None
+        self._socket_ino = None
+
+    def _listen(self):
+        # Runs as root in a directory the user can write to: everything goes through an fd of that
+        # directory and never follows a symlink, so swapping in a link cannot redirect unlink, bind or chown
+        directory, name = os.path.split(os.path.abspath(self.path))
+        try:
+            os.mkdir(directory, 0o700)
+            created = True
+        except FileExistsError:
+            created = False
+        try:
+            dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW)
+        except OSError as e:
+            raise SystemExit(f"cannot open socket directory {directory}: {e}")
+        try:
+            if created:
+                os.fchown(dir_fd, self.owner_uid, -1)
+            info = os.fstat(dir_fd)
+            if info.st_uid not in (self.owner_uid, 0) or info.st_mode & 0o022:
+                raise SystemExit(f"{directory} is writable by other users; refusing to listen there")
+            # bind() only takes a path; this one resolves to the directory already opened
+            address = f"/proc/self/fd/{dir_fd}/{name}"
+            try:
+                existing = os.lstat(name, dir_fd=dir_fd)
+            except FileNotFoundError:
+                existing = None
+            if existing is not None:
+                if not stat.S_ISSOCK(existing.st_mode):
+                    raise SystemExit(f"{self.path} exists and is not a socket")
+                probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                try:
+                    probe.connect(address)
+                    raise SystemExit(f"another helper is already listening on {self.path}")
+                except ConnectionRefusedError:
+                    os.unlink(name, dir_fd=dir_fd)
+                finally:
+                    probe.close()
+            server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            old_umask = os.umask(0o177)
+            try:
+                server.bind(address)
+            finally:
+                os.umask(old_umask)
+            os.chown(name, self.owner_uid, -1, dir_fd=dir_fd, follow_symlinks=False)
+            self._socket_ino = os.lstat(name, dir_fd=dir_fd).st_ino
+        except BaseException:
+            os.close(dir_fd)
+            raise
+        self._dir_fd = dir_fd
+        server.listen(16)
+        server.settimeout(1.0)
+        return server
+
+    def _remove_socket(self):
+        # Only our own socket: the user may have replaced the name with something else meanwhile
+        name = os.path.basename(self.path)
+        try:
+            if os.lstat(name, dir_fd=self._dir_fd).st_ino == self._socket_ino:
+                os.unlink(name, dir_fd=self._dir_fd)
+        except OSError:
+            pass
+        os.close(self._dir_fd)
+
+    def serve_forever(self, on_ready=None):
+        from concurrent.futures import ThreadPoolExecutor
+        server = self._listen()
+        self._pool = ThreadPoolExecutor(max_workers=self.analysis_workers)
+        self._lane = threading.Thread(target=self._install_lane, daemon=True)
+        self._lane.start()
+        if on_ready is not None:
+            on_ready()
+        try:
+            while not self._stopping and not self._idle_expired():
+                try:
+                    sock, _ = server.accept()
+                except socket.timeout:
+                    continue
+                if not self._peer_allowed(sock):
+                    sock.close()
+                    continue
+                threading.Thread(target=self._serve_client, args=(sock,), daemon=True).start()
+        finally:
+            server.close()
+            self._remove_socket()
+            self._shutdown_lane()
+            # Lets a running job finish and a deferred trigger pass run before the process exits
+            self._lane.join()
+            self._pool.shutdown(wait=True)
+
+    def _idle_expired(self):
+        # Idle means no job and no request for idle_timeout; a connection left open does not count
+        with self._cond:
+            busy = self._queue or self._running or self._analysis_jobs or self._configure_pending
+            if busy:
+                self._last_activity = time.monotonic()
+            return not busy and time.monotonic() - self._last_activity > self.idle_timeout
+
+    def _peer_allowed(self, sock):
+        # Only the user who authenticated (and root) may submit jobs
+        return peer_uid(sock) in (self.owner_uid, 0)
+
+    def _serve_client(self, sock):
+        connection = _Connection(sock)
+        pending = b""
+        try:
+            while chunk := sock.recv(1 << 16):
+                pending += chunk
+                *lines, pending = pending.split(b"\n")
+                for line in lines:
+                    if line.strip():
+                        self._handle_request(connection, line)
+        except OSError:
+            pass
+        finally:
+            connection.closed = True
+            sock.close()
+
+    def _handle_request(self, connection, line):
+        with self._cond:
+            self._last_activity = time.monotonic()
+        try:
+            request = json.loads(line)
+            op = request["op"]
+        except (ValueError, KeyError, TypeError):
+            connection.send("error", message="malformed request")
+            return
+        if op == "hello":
+            connection.send("hello", protocol=HELPER_PROTOCOL, pid=os.getpid(), executor=self.executor.name)
+        elif op in ("install", "analyze"):
+            debs = request.get("debs")
+            archives = request.get("archives") or []
+            problem = _check_debs(debs) or (archives and _check_archives(archives))
+            if problem:
+                connection.send("error", message=problem)
+                return
+            with self._cond:
+                job = Job(self._next_id, op, debs, connection, request.get("timeout"), archives,
+                          request.get("reinstall") is True, request.get("defer_triggers") is True)
+                self._next_id += 1
+                if op == "install":
+                    position = len(self._queue) + (self._running is not None)
+                    self._queue.append(job)
+                    self._cond.notify()
+                else:
+                    position = 0
+                    self._analysis_jobs[job.id] = job
+            job.emit("queued", position=position)
+            if op == "analyze":
+                self._pool.submit(self._run_analysis, job)
+        elif op == "cancel":
+            connection.send("cancelling", job=request.get("job"), found=self._cancel(request.get("job")))
+        elif op == "status":
+            with self._cond:
+                running = self._running.id if self._running else None
+                queued = [job.id for job in self._queue]
+            connection.send("status", running=running, queued=queued)
+        elif op == "shutdown":
+            self._stopping = True
+            connection.send("bye")
+        else:
+            connection.send("error", message=f"unknown op {op!r}")
+
+    def _cancel(self, job_id):
+        with self._cond:
+            for job in self._queue:
+                if job.id == job_id:
+                    self._queue.remove(job)
+                    job.emit("finished", returncode=-1, cancelled=True, timed_out=False)
+                    self._cond.notify_all()  # with the queue empty, the lane runs a deferred trigger pass
+                    return True
+            job = self._running if self._running and self._running.id == job_id else self._analysis_jobs.get(job_id)
+        if job is None:
+            return False
+        job.cancel.set()
+        return True
+
+    def _install_lane(self):
+        # The only place install jobs run, so at most one of them holds the dpkg lock at a time
+        while True:
+            with self._cond:
+                while not self._queue and not self._stopping and not self._configure_pending:
+                    self._cond.wait()
+                if not self._queue:
+                    if not self._configure_pending:
+                        return
+                    # The job meant to run the deferred pass was cancelled, or the helper is stopping:
+                    # run it now, or the packages stay triggers-pending. It reports on the job that deferred.
+                    self._configure_pending = False
+                    self._running = job = self._deferred_by
+                    orphaned = True
+                else:
+                    self._running = job = self._queue.popleft()
+                    orphaned = False
+            if orphaned:
+                self._run_pending(job)
+                with self._cond:
+                    self._running = None
+                continue
+            result = self._run_job(job)
+            # Deferred triggers wait only while another install is queued, which then runs right away
+            with self._cond:
+                run_pending = self._configure_pending and not self._queue
+                if run_pending:
+                    self._configure_pending = False
+            if run_pending:
+                returncode = self._run_pending(job)
+                if result.get("returncode") == 0:
+                    result["returncode"] = returncode
+            elif job.defer_triggers:
+                result["triggers_deferred"] = True
+            with self._cond:
+                self._running = None
+            job.emit("finished", **result)
+
+    def _run_job(self, job):
+        try:
+            result = {"cancelled": False, "timed_out": False, **self.executor.run(job)}
+        except Exception as e:
+            result = {"returncode": -1, "cancelled": False, "timed_out": False, "error": str(e)}
+        if job.defer_triggers:
+            # Even after a failure: what earlier packages activated still has to run
+            with self._cond:
+                self._configure_pending = True
+                self._deferred_by = job
+        return result
+
+    def _run_pending(self, job):
+        try:
+            return self.executor.run_pending(job)
+        except Exception as e:
+            job.emit("line", stream="stderr", text=f"E: Could not process deferred triggers: {e}")
+            return -1
+
+    def _shutdown_lane(self):
+        with self._cond:
+            self._stopping = True
+            queued, self._queue = list(self._queue), deque()
+            self._cond.notify_all()
+        for job in queued:
+            job.emit("finished", returncode=-1, cancelled=True, timed_out=False)
+
+    def _run_analysis(self, job):
+        failed = False
+        for path in job.debs:
+            if job.cancel.is_set():
+                break
+            try:
+                deb = DebFile(path)
+                control = deb.control()
+                deb.check_data()
+                job.emit("analysis", path=path, control=control)
+            except Exception as e:
+                failed = True
+                job.emit("analysis", path=path, error=str(e))
+        with self._cond:
+            self._analysis_jobs.pop(job.id, None)
+        job.emit("finished", returncode=1 if failed else 0, cancelled=job.cancel.is_set(), timed_out=False)
+
+
+def _check_debs(debs):
+    # Paths are handed to apt as root, so only absolute paths to existing .deb files are accepted
+    if not isinstance(debs, list) or not debs:
+        return "debs must be a non-empty list"
+    for path in debs:
+        if not isinstance(path, str) or not os.path.isabs(path) or not path.endswith(".deb"):
+            return f"not an absolute .deb path: {path!r}"
+        if not os.path.isfile(path):
+            return f"no such package file: {path}"
+    return None
+
+
+def _check_archives(archives):
+    # Archives are copied into apt's cache as root; a symlink could point anywhere, so only plain files
+    problem = _check_debs(archives)
+    if problem:
+        return problem
+    for path in archives:
+        if os.path.islink(path):
+            return f"archive must not be a symlink: {path}"
+    return None
+
+
+def _detach_output():
+    # The launcher stops reading after "ready"; later output must not block on a full pipe
+    sys.stdout.flush()
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    os.dup2(devnull, 2)
+    os.close(devnull)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="setdeb privileged install helper")
+    parser.add_argument("--socket", required=True, help="Unix socket path to listen on")
+    parser.add_argument("--owner-uid", type=int, default=os.getuid(), help="user allowed to submit jobs")
+    parser.add_argument("--stand-in", action="store_true", help="run unprivileged with a fake apt (testing)")
+    parser.add_argument("--delay", type=float, default=0.05, help="stand-in executor delay per step")
+    parser.add_argument("--idle-timeout", type=float, default=IDLE_TIMEOUT)
+    parser.add_argument("--analysis-workers", type=int, default=4)
+    args = parser.parse_args(argv)
+
+    if args.stand_in:
+        executor = StandInExecutor(args.delay)
+    elif os.geteuid() != 0:
+        parser.error("must run as root (or with --stand-in)")
+    else:
+        executor = AptExecutor()
+
+    def ready():
+        print("ready", flush=True)
+        _detach_output()
+
+    HelperServer(args.socket, args.owner_uid, executor, args.analysis_workers,
+                 args.idle_timeout).serve_forever(on_ready=ready)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
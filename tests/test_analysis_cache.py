@@ -0,0 +1,64 @@
+import shutil
+
+import debcore
+from debcore import AnalysisCache
+
+
+def test_put_merges_fields(tmp_path):
+    deb = tmp_path / "a.deb"
+    deb.write_bytes(b"payload")
+    cache = AnalysisCache(str(tmp_path / "cache"))
+    assert cache.put(str(deb), control={"Package": "a"})
+    assert cache.put(str(deb), depends="libc6")
+    assert cache.get(str(deb)) == {"format": AnalysisCache.FORMAT_VERSION, "control": {"Package": "a"},
+                                   "depends": "libc6"}
+
+
+def test_manifest_is_kept_beside_the_entry(tmp_path):
+    deb = tmp_path / "a.deb"
+    deb.write_bytes(b"payload")
+    cache = AnalysisCache(str(tmp_path / "cache"))
+    assert cache.get_manifest(str(deb)) is None and not cache.has_manifest(str(deb))
+    assert cache.put(str(deb), control={"Package": "a"})
+    assert cache.put_manifest(str(deb), [("/usr/bin/a", 1, "f")])
+    assert cache.has_manifest(str(deb))
+    assert cache.get_manifest(str(deb)) == [["/usr/bin/a", 1, "f"]]
+    assert "files" not in cache.get(str(deb))
+
+
+def test_entry_and_manifest_are_evicted_together(tmp_path):
+    cache = AnalysisCache(str(tmp_path / "cache"), max_entries=1)
+    debs = [tmp_path / f"{name}.deb" for name in "ab"]
+    for deb in debs:
+        deb.write_bytes(deb.name.encode())
+        cache.put(str(deb), control={"Package": deb.stem})
+        cache.put_manifest(str(deb), [])
+    assert cache.get(str(debs[0])) is None and cache.get_manifest(str(debs[0])) is None
+    assert cache.get(str(debs[1])) is not None and cache.get_manifest(str(debs[1])) == []
+
+
+def test_put_survives_values_json_cannot_encode(tmp_path):
+    deb = tmp_path / "a.deb"
+    deb.write_bytes(b"payload")
+    cache = AnalysisCache(str(tmp_path / "cache"))
+    assert cache.put(str(deb), control={"Package": "a"})
+    assert cache.put(str(deb), control={"Package": object()}) is False
+    assert cache.get(str(deb))["control"] == {"Package": "a"}
+
+
+def test_hash_fallback_finds_copies_and_hashes_once(tmp_path, monkeypatch):
+    deb = tmp_path / "a.deb"
+    deb.write_bytes(b"payload")
+    cache = AnalysisCache(str(tmp_path / "cache"), hash_fallback=True)
+    cache.put(str(deb), control={"Package": "a"})
+
+    copy = tmp_path / "copy.deb"
+    shutil.copy(deb, copy)
+    hashed = []
+    real = debcore.file_sha256
+    monkeypatch.setattr(debcore, "file_sha256", lambda path: hashed.append(path) or real(path))
+    assert cache.get(str(copy))["control"] == {"Package": "a"}
+    cache.put(str(copy), depends="")
+    cache.put_manifest(str(copy), [])
+    assert cache.get_manifest(str(copy)) == []
+    assert hashed == [str(copy)]
@@ -0,0 +1,45 @@
+import hashlib
+import os
+
+from debcore import ArtifactStore
+
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def test_a_users_file_is_copied_not_linked(tmp_path):
+    store = ArtifactStore(str(tmp_path / "cache"))
+    deb = tmp_path / "tool_1.0_all.deb"
+    deb.write_bytes(b"original")
+    stored = store.add(str(deb), "tool", "1.0", "all")
+    assert os.path.basename(stored) == sha256(b"original") + ".deb"
+    assert os.stat(stored).st_ino != os.stat(deb).st_ino
+    # Rewriting the user's file in place must not change what the store holds under the old hash
+    with open(deb, "r+b") as f:
+        f.write(b"tampered")
+    assert open(store.lookup("tool", "1.0", "all"), "rb").read() == b"original"
+
+
+def test_own_downloads_are_linked_and_checked_against_the_index(tmp_path):
+    store = ArtifactStore(str(tmp_path / "cache"))
+    archive = tmp_path / "dep_2.0_amd64.deb"
+    archive.write_bytes(b"downloaded")
+    assert store.add(str(archive), "dep", "2.0", "amd64", sha256(b"other"), owned=True) is None
+    assert store.lookup("dep", "2.0", "amd64") is None
+    stored = store.add(str(archive), "dep", "2.0", "amd64", sha256(b"downloaded"), owned=True)
+    assert os.path.samefile(stored, archive)
+    assert [name for name in os.listdir(os.path.dirname(stored)) if name.startswith(".tmp")] == []
+
+
+def test_materialize_places_stored_archives(tmp_path):
+    store = ArtifactStore(str(tmp_path / "cache"))
+    deb = tmp_path / "x.deb"
+    deb.write_bytes(b"payload")
+    store.add(str(deb), "lib", "1:1.0", "amd64")
+    staging = tmp_path / "staging"
+    staging.mkdir()
+    placed = store.materialize([{"name": "lib", "version": "1:1.0", "arch": "amd64"},
+                                {"name": "missing", "version": "1", "arch": "all"}], str(staging))
+    assert [os.path.basename(path) for path in placed] == ["lib_1%3a1.0_amd64.deb"]
+    assert open(placed[0], "rb").read() == b"payload"
@@ -0,0 +1,65 @@
+import os
+
+import pytest
+
+from bench_fixtures import make_synthetic_deb
+from debcore import DebFile, DebFormatError, parse_md5sums, verify_payload
+
+
+@pytest.mark.parametrize("compression", ["gz", "xz", "zst", "none"])
+def test_reads_control_and_payload(tmp_path, compression):
+    path = make_synthetic_deb(str(tmp_path / "pkg.deb"), files=8, file_size=1000, compression=compression,
+                              name="pkg", version="1:2.0-1", depends="libc6 (>= 2.34)")
+    deb = DebFile(path)
+    control = deb.control()
+    assert (control["Package"], control["Version"], control["Depends"]) == ("pkg", "1:2.0-1", "libc6 (>= 2.34)")
+    deb.check_data()
+    entries = list(deb.iter_entries())
+    files = [entry for entry in entries if entry.kind == "f"]
+    assert len(files) == 8 and all(entry.size == 1000 for entry in files)
+    assert all(entry.path.startswith("/usr/share/pkg/") for entry in files)
+    assert "/usr/share" in [entry.path for entry in entries if entry.kind == "d"]
+    sums = parse_md5sums(deb.control_file("md5sums").decode())
+    assert sorted(sums) == sorted(entry.path for entry in files)
+
+
+def test_control_files_and_missing_members(tmp_path):
+    path = make_synthetic_deb(str(tmp_path / "pkg.deb"), files=2, compression="gz", triggers="activate ldconfig\n")
+    deb = DebFile(path)
+    assert set(deb.control_files()) == {"control", "md5sums", "triggers"}
+    assert deb.control_file("postinst") is None
+
+
+def test_verify_payload_detects_tampering(tmp_path):
+    path = make_synthetic_deb(str(tmp_path / "pkg.deb"), files=4, file_size=4096, compression="none")
+    assert verify_payload(DebFile(path), workers=1).ok
+    data = bytearray(open(path, "rb").read())
+    data[-20000] ^= 0xFF  # inside the last file's contents
+    open(path, "wb").write(bytes(data))
+    report = verify_payload(DebFile(path), workers=1)
+    assert not report.ok and len(report.mismatched) == 1
+
+
+@pytest.mark.parametrize("damage, message", [
+    (lambda data: b"notanar!" + data[8:], "not a Debian archive"),
+    (lambda data: data[:len(data) // 2], "truncated"),
+    (lambda data: data[:130] + b"X" + data[131:], "ar header"),
+])
+def test_rejects_damaged_archives(tmp_path, damage, message):
+    path = make_synthetic_deb(str(tmp_path / "pkg.deb"), files=4, compression="gz")
+    data = open(path, "rb").read()
+    open(path, "wb").write(damage(data))
+    with pytest.raises(DebFormatError, match=message):
+        DebFile(path)
+
+
+def test_rejects_a_corrupt_data_member(tmp_path):
+    path = make_synthetic_deb(str(tmp_path / "pkg.deb"), files=4, compression="none")
+    size = os.path.getsize(path)
+    data = bytearray(open(path, "rb").read())
+    offset, _ = DebFile(path).members["data.tar"]
+    data[offset:offset + 512] = b"\x01" * 512
+    open(path, "wb").write(bytes(data))
+    assert os.path.getsize(path) == size
+    with pytest.raises(DebFormatError):
+        DebFile(path).check_data()
@@ -0,0 +1,38 @@
+import pytest
+
+from debcore import FileConflict, FileOwnerIndex
+
+
+@pytest.fixture
+def index(tmp_path):
+    info = tmp_path / "info"
+    info.mkdir()
+    (info / "base.list").write_text("/.\n/usr\n/usr/bin\n/usr/bin/shared\n")
+    (info / "old-tool.list").write_text("/usr\n/usr/bin\n/usr/bin/tool\n")
+    diversions = tmp_path / "diversions"
+    diversions.write_text("/usr/bin/diverted\n/usr/bin/diverted.distrib\ndiverter\n")
+    index = FileOwnerIndex(str(info), str(diversions), cache_dir=str(tmp_path / "cache"))
+    index.refresh()
+    return index
+
+
+def test_installed_owner_is_a_conflict_unless_replaced(index):
+    manifest = [("/usr", 0, "d"), ("/usr/bin", 0, "d"), ("/usr/bin/tool", 10, "f"), ("/usr/bin/new", 5, "f")]
+    assert index.conflicts(manifest, "tool") == [FileConflict("/usr/bin/tool", ["old-tool"])]
+    assert index.conflicts(manifest, "tool", replaces=["old-tool"]) == []
+    assert index.conflicts(manifest, "old-tool") == []
+
+
+def test_packages_of_a_batch_conflict_with_each_other(index):
+    batch = [("a", [("/usr", 0, "d"), ("/usr/bin/x", 1, "f")], []),
+             ("b", [("/usr", 0, "d"), ("/usr/bin/x", 1, "f"), ("/usr/bin/y", 1, "f")], []),
+             ("c", [("/usr/bin/y", 1, "f")], ["b"])]
+    assert index.batch_conflicts(batch) == [FileConflict("/usr/bin/x", ["a", "b"])]
+
+
+def test_batch_conflicts_respect_diversions_and_multiarch_copies(index):
+    batch = [("diverter", [("/usr/bin/diverted", 1, "f")], []),
+             ("other", [("/usr/bin/diverted", 1, "f")], []),
+             ("lib", [("/usr/share/doc/lib/copyright", 1, "f")], []),
+             ("lib", [("/usr/share/doc/lib/copyright", 1, "f")], [])]
+    assert index.batch_conflicts(batch) == []
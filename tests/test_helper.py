@@ -0,0 +1,341 @@
+import os
+import json
+import shutil
+import socket
+import tempfile
+import threading
+import time
+
+import pytest
+
+import debcore
+from bench_fixtures import make_synthetic_deb
+from debcore import HelperClient, HelperError, apt_record_phase
+from setdeb_helper import HelperServer, Job, StandInExecutor, _Connection
+
+
+def start_server(path, owner_uid=None, idle_timeout=60, delay=0.05, triggers_dir=None):
+    executor = StandInExecutor(delay, triggers_dir=triggers_dir or os.path.join(os.path.dirname(path), "no-triggers"))
+    server = HelperServer(path, os.getuid() if owner_uid is None else owner_uid, executor, idle_timeout=idle_timeout)
+    ready = threading.Event()
+    thread = threading.Thread(target=server.serve_forever, kwargs={"on_ready": ready.set}, daemon=True)
+    thread.start()
+    assert ready.wait(10)
+    return server, thread
+
+
+@pytest.fixture
+def helper(tmp_path):
+    path = str(tmp_path / "helper.sock")
+    server, thread = start_server(path)
+    yield path
+    server._stopping = True
+    thread.join(10)
+
+
+@pytest.fixture
+def debs(tmp_path):
+    return [make_synthetic_deb(str(tmp_path / f"pkg{i}.deb"), files=1, file_size=256, compression="gz",
+                               name=f"pkg{i}", seed=i) for i in range(3)]
+
+
+def events_until_finished(client, count):
+    events, finished = [], 0
+    while finished < count:
+        event = client.read_event(10)
+        assert event is not None, "the helper stopped answering"
+        events.append(event)
+        finished += event["event"] == "finished"
+    return events
+
+
+def test_hello_reports_protocol_and_executor(helper):
+    with HelperClient(helper, stand_in=True) as client:
+        assert client.info["protocol"] == debcore.HELPER_PROTOCOL
+        assert client.info["executor"] == "stand-in"
+
+
+def test_malformed_and_unknown_requests_are_rejected(helper):
+    with HelperClient(helper, stand_in=True) as client:
+        client._sock.sendall(b"not json\n")
+        assert client.read_event(5) == {"event": "error", "message": "malformed request"}
+        client.send("frobnicate")
+        assert client.read_event(5)["message"] == "unknown op 'frobnicate'"
+        client.send("install", debs=["relative.deb"])
+        assert "not an absolute .deb path" in client.read_event(5)["message"]
+
+
+def test_archives_must_not_be_symlinks(helper, debs, tmp_path):
+    link = tmp_path / "dep_1.0_all.deb"
+    link.symlink_to(debs[1])
+    with HelperClient(helper, stand_in=True) as client:
+        client.send("install", debs=[debs[0]], archives=[str(link)])
+        assert "symlink" in client.read_event(5)["message"]
+
+
+def test_install_jobs_queue_and_run_in_order(helper, debs):
+    with HelperClient(helper, stand_in=True) as client:
+        for deb in debs:
+            client.send("install", debs=[deb])
+        events = events_until_finished(client, len(debs))
+    assert [e["position"] for e in events if e["event"] == "queued"] == [0, 1, 2]
+    started = [e["job"] for e in events if e["event"] == "started"]
+    finished = [e["job"] for e in events if e["event"] == "finished"]
+    assert started == finished == sorted(started)
+    assert all(e["returncode"] == 0 and "error" not in e for e in events if e["event"] == "finished")
+
+
+def test_cancelling_a_queued_job_removes_it(helper, debs):
+    with HelperClient(helper, stand_in=True) as client:
+        for deb in debs:
+            client.send("install", debs=[deb])
+        queued = []
+        while len(queued) < len(debs):
+            event = client.read_event(10)
+            if event["event"] == "queued":
+                queued.append(event["job"])
+        client.send("cancel", job=queued[-1])
+        events = events_until_finished(client, len(debs))
+    assert {"event": "cancelling", "job": queued[-1], "found": True} in events
+    last = [e for e in events if e["event"] == "finished" and e["job"] == queued[-1]]
+    assert last[0]["cancelled"] is True
+    assert queued[-1] not in [e["job"] for e in events if e["event"] == "started"]
+
+
+def test_analysis_reports_each_package(helper, debs):
+    with HelperClient(helper, stand_in=True) as client:
+        client.send("analyze", debs=debs)
+        events = events_until_finished(client, 1)
+    names = [e["control"]["Package"] for e in events if e["event"] == "analysis"]
+    assert sorted(names) == ["pkg0", "pkg1", "pkg2"]
+
+
+def test_deferred_triggers_run_once_after_the_last_job(tmp_path):
+    triggers_dir = tmp_path / "triggers"
+    triggers_dir.mkdir()
+    (triggers_dir / "demo-cache").write_text("demo-handler\n")
+    debs = [make_synthetic_deb(str(tmp_path / f"t{i}.deb"), files=1, file_size=256, compression="gz",
+                               name=f"t{i}", seed=i, triggers="activate-noawait demo-cache\n")
+            for i in range(3)]
+    path = str(tmp_path / "helper.sock")
+    server, thread = start_server(path, triggers_dir=str(triggers_dir))
+    try:
+        runs = {}
+        for defer in (False, True):
+            with HelperClient(path, stand_in=True) as client:
+                for deb in debs:
+                    client.send("install", debs=[deb], defer_triggers=defer)
+                events = events_until_finished(client, len(debs))
+            runs[defer] = sum(e["event"] == "status" and apt_record_phase(e["record"]) == "triggers" for e in events)
+        assert runs == {False: 3, True: 1}
+    finally:
+        server._stopping = True
+        thread.join(10)
+
+
+class CountingExecutor(StandInExecutor):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pending_runs = 0
+
+    def run_pending(self, job):
+        self.pending_runs += 1
+        return super().run_pending(job)
+
+
+def start_deferring(tmp_path, delay=0.05, idle_timeout=60):
+    triggers_dir = tmp_path / "triggers"
+    triggers_dir.mkdir()
+    (triggers_dir / "demo-cache").write_text("demo-handler\n")
+    debs = [make_synthetic_deb(str(tmp_path / f"d{i}.deb"), files=1, file_size=256, compression="gz",
+                               name=f"d{i}", seed=i, triggers="activate-noawait demo-cache\n") for i in range(2)]
+    executor = CountingExecutor(delay, triggers_dir=str(triggers_dir))
+    server = HelperServer(str(tmp_path / "helper.sock"), os.getuid(), executor, idle_timeout=idle_timeout)
+    ready = threading.Event()
+    thread = threading.Thread(target=server.serve_forever, kwargs={"on_ready": ready.set}, daemon=True)
+    thread.start()
+    assert ready.wait(10)
+    return server, thread, executor, debs
+
+
+def leave_triggers_pending(server, executor, deb):
+    # The state a deferring job leaves when the job queued after it disappears between the lane's
+    # queue check and its next pop: triggers activated, pass pending, nothing left to run it
+    job = Job(999, "install", [deb], _Connection(None), defer_triggers=True)
+    job.connection.closed = True
+    executor._triggered.append("demo-handler")
+    with server._cond:
+        server._configure_pending = True
+        server._deferred_by = job
+        server._cond.notify_all()
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return condition()
+
+
+def test_a_pending_pass_without_a_queued_job_runs_right_away(tmp_path):
+    server, thread, executor, debs = start_deferring(tmp_path)
+    try:
+        leave_triggers_pending(server, executor, debs[0])
+        assert wait_for(lambda: executor.pending_runs == 1)
+        assert executor._triggered == []
+    finally:
+        server._stopping = True
+        thread.join(10)
+
+
+def test_cancelling_the_last_queued_job_still_runs_the_deferred_triggers(tmp_path):
+    server, thread, executor, debs = start_deferring(tmp_path, delay=0.2)
+    try:
+        with HelperClient(server.path, stand_in=True) as client:
+            for deb in debs:
+                client.send("install", debs=[deb], defer_triggers=True)
+            queued = []
+            while len(queued) < 2:
+                event = client.read_event(10)
+                if event["event"] == "queued":
+                    queued.append(event["job"])
+            client.send("cancel", job=queued[1])
+            events_until_finished(client, 2)
+        assert wait_for(lambda: executor.pending_runs == 1)
+        assert executor._triggered == []
+    finally:
+        server._stopping = True
+        thread.join(10)
+
+
+def test_shutdown_waits_for_the_running_job_and_its_deferred_triggers(tmp_path):
+    server, thread, executor, debs = start_deferring(tmp_path, delay=0.5)
+    with HelperClient(server.path, stand_in=True) as client:
+        for deb in debs:
+            client.send("install", debs=[deb], defer_triggers=True)
+        while client.read_event(10)["event"] != "started":
+            pass
+        client.send("shutdown")
+        thread.join(10)
+    assert not thread.is_alive()
+    assert executor.pending_runs == 1 and executor._triggered == []
+
+
+def test_idle_exit_does_not_drop_a_pending_pass(tmp_path):
+    server, thread, executor, debs = start_deferring(tmp_path, idle_timeout=0.5)
+    leave_triggers_pending(server, executor, debs[0])
+    thread.join(10)
+    assert not thread.is_alive()
+    assert executor.pending_runs == 1 and executor._triggered == []
+
+
+def test_an_open_connection_does_not_keep_the_helper_alive(tmp_path):
+    server, thread = start_server(str(tmp_path / "helper.sock"), idle_timeout=0.5)
+    with HelperClient(str(tmp_path / "helper.sock"), stand_in=True):
+        thread.join(5)
+        assert not thread.is_alive()
+    assert not os.path.exists(tmp_path / "helper.sock")
+
+
+def test_requests_count_as_activity(tmp_path):
+    server, thread = start_server(str(tmp_path / "helper.sock"), idle_timeout=1.5)
+    with HelperClient(str(tmp_path / "helper.sock"), stand_in=True) as client:
+        for _ in range(4):
+            time.sleep(0.5)
+            client.send("status")
+            assert client.read_event(5)["event"] == "status"
+        assert thread.is_alive()
+        thread.join(5)
+        assert not thread.is_alive()
+
+
+def test_client_refuses_a_helper_not_run_by_root(helper, monkeypatch):
+    monkeypatch.setattr(debcore, "peer_uid", lambda sock: 4242)
+    with pytest.raises(HelperError, match="not root"):
+        HelperClient(helper)
+    monkeypatch.setattr(debcore.os, "getuid", lambda: 4242)
+    HelperClient(helper, stand_in=True).close()
+    assert not debcore.helper_alive(helper)
+
+
+def connect_as(uid, path):
+    # A forked child switched to uid says hello; returns whatever the helper answered
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.close(read_fd)
+            os.setuid(uid)
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(5)
+            sock.connect(path)
+            sock.sendall(b'{"op": "hello"}\n')
+            os.write(write_fd, sock.recv(4096))
+        finally:
+            os._exit(0)
+    os.close(write_fd)
+    with os.fdopen(read_fd, "rb") as f:
+        reply = f.read()
+    os.waitpid(pid, 0)
+    return reply.decode()
+
+
+@pytest.mark.skipif(os.geteuid() != 0, reason="needs root to connect as another user")
+def test_server_rejects_other_users():
+    directory = tempfile.mkdtemp()
+    try:
+        os.chmod(directory, 0o755)
+        path = os.path.join(directory, "helper.sock")
+        server, thread = start_server(path, owner_uid=4242)
+        os.chmod(path, 0o666)
+        replies = {uid: connect_as(uid, path) for uid in (4242, 4243)}
+        assert json.loads(replies[4242])["event"] == "hello"
+        assert replies[4243] == ""
+        server._stopping = True
+        thread.join(10)
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_listen_refuses_a_shared_directory(tmp_path):
+    shared = tmp_path / "shared"
+    shared.mkdir()
+    os.chmod(shared, 0o777)
+    with pytest.raises(SystemExit, match="writable by other users"):
+        HelperServer(str(shared / "helper.sock"), os.getuid(), StandInExecutor())._listen()
+
+
+def test_listen_does_not_follow_a_planted_symlink(tmp_path):
+    target = tmp_path / "target"
+    target.write_text("keep")
+    (tmp_path / "helper.sock").symlink_to(target)
+    with pytest.raises(SystemExit, match="not a socket"):
+        HelperServer(str(tmp_path / "helper.sock"), os.getuid(), StandInExecutor())._listen()
+    assert target.read_text() == "keep"
+    link_dir = tmp_path / "linked"
+    link_dir.symlink_to(tmp_path)
+    with pytest.raises(SystemExit, match="cannot open socket directory"):
+        HelperServer(str(link_dir / "other.sock"), os.getuid(), StandInExecutor())._listen()
+
+
+def test_listen_replaces_a_stale_socket_but_not_a_live_one(tmp_path, helper):
+    stale = socket.socket(socket.AF_UNIX)
+    stale.bind(str(tmp_path / "stale.sock"))
+    stale.close()
+    server = HelperServer(str(tmp_path / "stale.sock"), os.getuid(), StandInExecutor())
+    server._listen().close()
+    server._remove_socket()
+    assert not os.path.exists(tmp_path / "stale.sock")
+    with pytest.raises(SystemExit, match="already listening"):
+        HelperServer(helper, os.getuid(), StandInExecutor())._listen()
+
+
+def test_private_dir_must_belong_to_the_user(tmp_path):
+    assert debcore._private_dir(str(tmp_path / "mine")) == str(tmp_path / "mine")
+    open_dir = tmp_path / "open"
+    open_dir.mkdir()
+    os.chmod(open_dir, 0o755)
+    (tmp_path / "link").symlink_to(tmp_path / "mine")
+    for path in (open_dir, tmp_path / "link"):
+        with pytest.raises(HelperError, match="not a private directory"):
+            debcore._private_dir(str(path))
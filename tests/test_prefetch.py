@@ -0,0 +1,63 @@
+import os
+import shutil
+
+import pytest
+
+from bench_fixtures import file_repository_options, make_file_repository, make_synthetic_deb, update_file_repository
+from debcore import AptListsIndex, DebFile, DependencyPrefetcher, DependencyResolver, DpkgStatusIndex
+
+pytestmark = pytest.mark.skipif(shutil.which("apt-get") is None, reason="needs apt-get")
+
+
+@pytest.fixture
+def repository(tmp_path):
+    names = make_file_repository(str(tmp_path / "repo"), count=3, files=2, file_size=1024)
+    options = file_repository_options(str(tmp_path / "repo"), str(tmp_path / "apt"))
+    update_file_repository(options)
+    app = make_synthetic_deb(str(tmp_path / "app.deb"), files=1, compression="gz", name="prefetchapp",
+                             depends=", ".join(names))
+    status = tmp_path / "status"
+    status.write_text("Package: dpkg\nStatus: install ok installed\nArchitecture: amd64\nVersion: 1.21\n")
+    resolver = DependencyResolver(DpkgStatusIndex(str(status), None), AptListsIndex(str(tmp_path / "apt" / "lists")),
+                                  arch="amd64")
+    plan = resolver.resolve([DebFile(app).control()]).to_dict()
+    return app, options, plan
+
+
+def test_downloads_the_planned_archives_from_a_file_repository(tmp_path, repository):
+    app, options, plan = repository
+    assert sorted(entry["name"] for entry in plan["install"]) == ["benchdep0", "benchdep1", "benchdep2"]
+    prefetcher = DependencyPrefetcher(str(tmp_path / "archives"), options)
+    done = []
+    prefetcher.start([app], on_done=done.append)
+    assert prefetcher.wait(60)
+    assert prefetcher.returncode == 0, list(prefetcher.output)
+    assert done == [prefetcher]
+    found = prefetcher.archives_for(plan["install"])
+    assert len(found) == 3
+    assert all(os.path.dirname(path) == str(tmp_path / "archives") for path in found)
+
+    # A second run finds everything in place
+    stamps = {path: os.stat(path).st_mtime_ns for path in found}
+    again = DependencyPrefetcher(str(tmp_path / "archives"), options)
+    again.start([app])
+    assert again.wait(60) and again.returncode == 0
+    assert {path: os.stat(path).st_mtime_ns for path in again.archives_for(plan["install"])} == stamps
+
+
+def test_a_stale_archive_is_not_reported(tmp_path, repository):
+    app, options, plan = repository
+    archives = tmp_path / "archives"
+    archives.mkdir()
+    entry = plan["install"][0]
+    (archives / f"{entry['name']}_{entry['version']}_{entry['arch']}.deb").write_bytes(b"partial")
+    assert DependencyPrefetcher(str(archives), options).archives_for(plan["install"]) == []
+
+
+def test_cancel_stops_apt_get(tmp_path, repository):
+    app, options, _ = repository
+    prefetcher = DependencyPrefetcher(str(tmp_path / "archives"), options)
+    prefetcher.cancel()
+    prefetcher.start([app])
+    assert prefetcher.wait(60)
+    assert prefetcher.cancelled
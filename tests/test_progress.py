@@ -0,0 +1,53 @@
+import os
+
+from debcore import AptProgressEngine, apt_record_phase, read_transcript, replay_transcript
+
+TRANSCRIPT = os.path.join(os.path.dirname(__file__), "data", "apt-status-fd.txt")
+
+
+def replay(**weights):
+    engine = AptProgressEngine(**weights)
+    return engine, list(replay_transcript(read_transcript(TRANSCRIPT), engine))
+
+
+def test_replay_is_monotonic_and_ends_in_the_setup_phase():
+    engine, updates = replay(download_bytes=2 << 20, install_bytes=4 << 20, package_count=2)
+    percents = [percent for percent, _ in updates]
+    assert percents == sorted(percents)
+    assert 10 <= percents[0] and percents[-1] <= 98
+    texts = [text for _, text in updates]
+    assert texts[0] == "Downloading..."
+    assert "Unpacking..." in texts
+    assert "Setting up (2/2)" in texts
+    assert engine.configured == {"libfoo1", "app"}
+    assert engine.errors == ["app: installed app package post-installation script subprocess returned error "
+                             "exit status 1"]
+
+
+def test_download_weight_follows_bytes():
+    # With nothing to download, the download records cannot move the bar
+    _, updates = replay(download_bytes=0, install_bytes=4 << 20, package_count=2)
+    assert all(percent == 10 for percent, text in updates if text == "Downloading...")
+    # With a download dominating the transaction, fetching it is most of the bar
+    _, updates = replay(download_bytes=500 << 20, install_bytes=1 << 20, package_count=2)
+    downloaded = max(percent for percent, text in updates if text == "Downloading...")
+    assert downloaded > 90
+
+
+def test_deferred_trigger_pass_is_its_own_step():
+    engine = AptProgressEngine(install_bytes=1 << 20, package_count=1, trigger_seconds=4, trigger_count=2)
+    engine.feed("pmstatus:app:100:Installed app")
+    setup = engine.percent
+    assert engine.feed("processing: configure: app") is None
+    assert engine.feed("processing: trigproc: man-db") == (setup, "Processing triggers (1/2)...")
+    percent, text = engine.feed("processing: trigproc: libc-bin")
+    assert text == "Processing triggers (2/2)..." and percent > setup + 30
+
+
+def test_record_phases():
+    phases = [apt_record_phase(record) for _, record in read_transcript(TRANSCRIPT)]
+    assert phases[:4] == ["download"] * 4
+    assert phases.count("unpack") == 4 and phases.count("configure") == 4
+    assert phases[-1] == "triggers"
+    assert apt_record_phase("processing: trigproc: man-db") == "triggers"
+    assert apt_record_phase("pmerror:app:77:failed") is None
@@ -0,0 +1,113 @@
+import pytest
+
+from debcore import AptListsIndex, DependencyResolver, DpkgStatusIndex
+
+STATUS = """\
+Package: dpkg
+Status: install ok installed
+Architecture: amd64
+Version: 1.21.22
+
+Package: libc6
+Status: install ok installed
+Architecture: amd64
+Version: 2.36-9
+
+Package: exim4
+Status: install ok installed
+Architecture: amd64
+Version: 4.96-15
+Provides: mail-transport-agent
+"""
+
+PACKAGES = """\
+Package: libfoo1
+Version: 1.0-1
+Architecture: amd64
+Depends: libc6 (>= 2.34)
+Size: 1000
+Installed-Size: 10
+SHA256: aa
+
+Package: libfoo1
+Version: 1.2-1
+Architecture: amd64
+Depends: libc6 (>= 2.34)
+Size: 1200
+Installed-Size: 12
+SHA256: bb
+
+Package: libbar2
+Version: 2.0-1
+Architecture: amd64
+Size: 300
+Installed-Size: 3
+
+Package: python3-baz
+Version: 0.5-1
+Architecture: all
+Provides: baz-api (= 5)
+Size: 50
+Installed-Size: 1
+
+Package: libc6
+Version: 2.40-1
+Architecture: amd64
+Size: 9000
+Installed-Size: 90
+"""
+
+
+@pytest.fixture
+def resolver(tmp_path):
+    status = tmp_path / "status"
+    status.write_text(STATUS)
+    lists = tmp_path / "lists"
+    lists.mkdir()
+    (lists / "deb.example.org_dists_stable_main_binary-amd64_Packages").write_text(PACKAGES)
+    return DependencyResolver(DpkgStatusIndex(str(status), None), AptListsIndex(str(lists)), arch="amd64")
+
+
+def app(depends="", **fields):
+    return {"Package": "app", "Version": "1.0", "Architecture": "amd64", "Depends": depends, **fields}
+
+
+def test_picks_the_newest_candidate_and_skips_what_is_installed(resolver):
+    plan = resolver.resolve([app("libfoo1 (>= 1.0), libc6")])
+    assert [(e.name, e.version, e.size) for e in plan.install] == [("libfoo1", "1.2-1", 1200)]
+    assert plan.unmet == [] and plan.conflicts == []
+
+
+def test_version_constraint_on_installed_package_pulls_an_upgrade(resolver):
+    plan = resolver.resolve([app("libc6 (>= 2.38)")])
+    assert [(e.name, e.version) for e in plan.install] == [("libc6", "2.40-1")]
+
+
+def test_upper_bound_excludes_newer_candidates(resolver):
+    plan = resolver.resolve([app("libfoo1 (<< 1.1)")])
+    assert [(e.name, e.version) for e in plan.install] == [("libfoo1", "1.0-1")]
+
+
+def test_alternatives_prefer_an_installed_one_then_the_first_available(resolver):
+    assert resolver.resolve([app("libmissing | libc6")]).install == []
+    plan = resolver.resolve([app("libmissing | libbar2 | libfoo1")])
+    assert [e.name for e in plan.install] == ["libbar2"]
+
+
+def test_provides_from_installed_and_available_packages(resolver):
+    assert resolver.resolve([app("mail-transport-agent")]).install == []
+    plan = resolver.resolve([app("baz-api (>= 4)")])
+    assert [e.name for e in plan.install] == ["python3-baz"]
+    assert resolver.resolve([app("baz-api (>= 6)")]).unmet == ["app depends on baz-api (>= 6)"]
+
+
+def test_unmet_and_conflicts(resolver):
+    plan = resolver.resolve([app("nonexistent", Conflicts="exim4")])
+    assert plan.unmet == ["app depends on nonexistent"]
+    assert len(plan.conflicts) == 1 and plan.conflicts[0].startswith("app conflicts exim4")
+
+
+def test_local_packages_satisfy_each_other(resolver):
+    other = {"Package": "helper", "Version": "3.0", "Architecture": "all", "Provides": "helper-api"}
+    plan = resolver.resolve([app("helper (>= 3), helper-api"), other])
+    assert plan.install == [] and plan.local == ["app", "helper"]
@@ -0,0 +1,58 @@
+import threading
+
+from debcore import TaskScheduler
+
+
+def test_tasks_enqueued_together_get_their_own_threads():
+    scheduler = TaskScheduler(workers=4)
+    scheduler.submit("warm-up", lambda task: None)
+    assert scheduler.join(timeout=5)
+    # One idle thread now; holding the lock keeps it from waking while all four tasks are enqueued
+    barrier = threading.Barrier(4, timeout=5)
+    with scheduler._cond:
+        tasks = [scheduler.submit(f"task{i}", lambda task: barrier.wait()) for i in range(4)]
+    assert scheduler.join(timeout=10)
+    assert [task.state for task in tasks] == ["done"] * 4
+    assert scheduler._threads["pool"] == 4
+
+
+def test_pool_never_exceeds_its_workers():
+    scheduler = TaskScheduler(workers=2)
+    release = threading.Event()
+    tasks = [scheduler.submit(f"task{i}", lambda task: release.wait(5)) for i in range(6)]
+    release.set()
+    assert scheduler.join(timeout=10)
+    assert all(task.state == "done" for task in tasks)
+    assert scheduler._threads["pool"] == 2
+
+
+def test_dependent_task_is_skipped_after_a_failure():
+    scheduler = TaskScheduler(workers=2)
+
+    def fail(task):
+        raise RuntimeError("boom")
+
+    parent = scheduler.submit("parent", fail)
+    child = scheduler.submit("child", lambda task: "ran", after=[parent])
+    cleanup = scheduler.submit("cleanup", lambda task: "ran", after=[parent], always=True, lane="dpkg")
+    assert scheduler.join(timeout=5)
+    assert (parent.state, child.state, cleanup.state) == ("failed", "skipped", "done")
+    assert cleanup.result == "ran"
+
+
+def test_a_task_raising_base_exception_still_finishes(monkeypatch):
+    # The SystemExit still ends the worker thread; keep it from being reported as unhandled
+    monkeypatch.setattr(threading, "excepthook", lambda args: None)
+    scheduler = TaskScheduler(workers=1)
+    dying = []
+
+    def leave(task):
+        dying.append(threading.current_thread())
+        raise SystemExit(3)
+
+    quitting = scheduler.submit("quit", leave)
+    after = scheduler.submit("after", lambda task: "ran")
+    assert scheduler.join(timeout=5)
+    dying[0].join(5)
+    assert (quitting.state, after.state, after.result) == ("failed", "done", "ran")
+    assert scheduler._threads["pool"] == 1
@@ -0,0 +1,34 @@
+import os
+import subprocess
+
+from debcore import seed_archives_command
+
+
+def test_without_archives_the_command_is_unchanged():
+    assert seed_archives_command([], ["true"]) == ["true"]
+
+
+def test_archives_are_copied_not_linked(tmp_path):
+    cache = tmp_path / "cache"
+    cache.mkdir()
+    source = tmp_path / "dep_1.0_all.deb"
+    source.write_bytes(b"archive")
+    result = subprocess.run(seed_archives_command([str(source)], ["cat", str(cache / source.name)], str(cache)),
+                            capture_output=True)
+    assert result.returncode == 0 and result.stdout == b"archive"
+    assert os.stat(cache / source.name).st_ino != os.stat(source).st_ino
+    source.write_bytes(b"swapped")
+    assert (cache / source.name).read_bytes() == b"archive"
+    assert sorted(os.listdir(cache)) == [source.name]
+
+
+def test_symlinks_are_skipped(tmp_path):
+    cache = tmp_path / "cache"
+    cache.mkdir()
+    secret = tmp_path / "secret"
+    secret.write_text("secret")
+    link = tmp_path / "dep_1.0_all.deb"
+    link.symlink_to(secret)
+    missing = tmp_path / "gone_1.0_all.deb"
+    subprocess.run(seed_archives_command([str(link), str(missing)], ["true"], str(cache)), check=True)
+    assert os.listdir(cache) == []
@@ -0,0 +1,46 @@
+from debcore import DpkgStatusIndex
+
+STATUS = """\
+Package: libfoo1
+Status: install ok triggers-pending
+Architecture: amd64
+Version: 1.2-1
+
+Package: bar
+Status: install ok triggers-awaited
+Architecture: all
+Version: 2.0
+
+Package: mailer
+Status: install ok half-configured
+Architecture: amd64
+Version: 3.0
+Provides: mail-transport-agent
+
+Package: gone
+Status: deinstall ok config-files
+Architecture: amd64
+Version: 0.9
+Provides: old-virtual
+"""
+
+
+def index(tmp_path):
+    status = tmp_path / "status"
+    status.write_text(STATUS)
+    return DpkgStatusIndex(str(status), None)
+
+
+def test_pending_triggers_count_as_installed(tmp_path):
+    status = index(tmp_path)
+    assert status.is_installed("libfoo1", "amd64")
+    assert status.installed_version("bar") == "2.0"
+    assert [q.relation for q in status.query([("libfoo1", "1.2-1"), ("bar", "1.0")])] == ["same", "newer"]
+
+
+def test_half_configured_is_not_installed_but_still_provides(tmp_path):
+    status = index(tmp_path)
+    assert not status.is_installed("mailer")
+    assert status.providers("mail-transport-agent") == [("mailer", "3.0")]
+    assert not status.is_installed("gone")
+    assert status.providers("old-virtual") == []
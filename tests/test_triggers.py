@@ -0,0 +1,19 @@
+from debcore import TriggerRegistry
+
+
+def test_interested_packages_are_bare_names(tmp_path):
+    (tmp_path / "File").write_text("/usr/share/icons/hicolor gtk-update-icon-cache:amd64/noawait\n"
+                                   "/usr/lib/x86_64-linux-gnu/gdk-pixbuf-2.0/2.10.0/loaders libgdk-pixbuf-2.0-0:amd64\n"
+                                   "/usr/share/man/ man-db\n")
+    (tmp_path / "ldconfig").write_text("libc-bin:amd64/noawait\n")
+    (tmp_path / "Lock").write_text("")
+    registry = TriggerRegistry(str(tmp_path)).refresh()
+    assert registry.files == {"/usr/share/icons/hicolor": {"gtk-update-icon-cache"},
+                              "/usr/lib/x86_64-linux-gnu/gdk-pixbuf-2.0/2.10.0/loaders": {"libgdk-pixbuf-2.0-0"},
+                              "/usr/share/man": {"man-db"}}
+    assert registry.explicit == {"ldconfig": {"libc-bin"}}
+
+
+def test_missing_directory_gives_an_empty_registry(tmp_path):
+    registry = TriggerRegistry(str(tmp_path / "missing")).refresh()
+    assert registry.files == {} and registry.explicit == {}
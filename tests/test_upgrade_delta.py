@@ -0,0 +1,51 @@
+from debcore import _describe_delta, upgrade_delta
+
+MD5 = {"/usr/bin/tool": "a" * 32, "/usr/share/doc/tool/README": "b" * 32}
+
+
+def installed_root(tmp_path, files):
+    for path, data in files.items():
+        target = tmp_path / path.lstrip("/")
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(data)
+    return str(tmp_path)
+
+
+def test_same_checksums_are_identical(tmp_path):
+    manifest = [("/usr", 0, "d"), ("/usr/bin/tool", 4, "f"), ("/usr/share/doc/tool/README", 6, "f")]
+    delta = upgrade_delta(manifest, MD5, ["/.", "/usr", "/usr/bin/tool", "/usr/share/doc/tool/README"], MD5,
+                          root=str(tmp_path))
+    assert delta.identical and not delta.differs
+    assert delta.counts == {"added": 0, "removed": 0, "changed": 0, "unchanged": 2}
+
+
+def test_a_file_without_checksum_is_not_reported_identical(tmp_path):
+    root = installed_root(tmp_path, {"/etc/tool.conf": b"old=1\n"})
+    manifest = [("/usr/bin/tool", 4, "f"), ("/etc/tool.conf", 6, "f")]
+    paths = ["/usr/bin/tool", "/etc/tool.conf"]
+    delta = upgrade_delta(manifest, {"/usr/bin/tool": MD5["/usr/bin/tool"]}, paths,
+                          {"/usr/bin/tool": MD5["/usr/bin/tool"]}, root=root)
+    assert delta.comparable and not delta.differs and not delta.identical
+    assert delta.unverified == 1
+    assert delta.counts["unchanged"] == 1
+    report = delta.to_dict()
+    assert (report["identical"], report["differs"], report["unverified"]) == (False, False, 1)
+    assert _describe_delta(report).endswith("1 unchanged, 1 not compared")
+
+
+def test_a_file_without_checksum_and_another_size_is_changed(tmp_path):
+    root = installed_root(tmp_path, {"/etc/tool.conf": b"old=1\n"})
+    delta = upgrade_delta([("/etc/tool.conf", 20, "f")], {"/usr/bin/tool": "a" * 32}, ["/etc/tool.conf"],
+                          {"/usr/bin/tool": "a" * 32}, root=root)
+    assert delta.differs and delta.counts["changed"] == 1 and delta.unverified == 0
+
+
+def test_added_removed_and_changed_files(tmp_path):
+    root = installed_root(tmp_path, {"/usr/share/old": b"12345678"})
+    new_sums = {"/usr/bin/tool": "c" * 32, "/usr/share/new": "d" * 32}
+    old_sums = {"/usr/bin/tool": "a" * 32, "/usr/share/old": "e" * 32}
+    delta = upgrade_delta([("/usr/bin/tool", 4, "f"), ("/usr/share/new", 3, "f")], new_sums,
+                          ["/usr/bin/tool", "/usr/share/old"], old_sums, root=root)
+    assert delta.counts == {"added": 1, "removed": 1, "changed": 1, "unchanged": 0}
+    assert delta.bytes["removed"] == 8
+    assert delta.differs and not delta.identical
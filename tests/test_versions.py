@@ -0,0 +1,50 @@
+import pytest
+
+from debcore import compare_versions, parse_relations, split_version, version_satisfies
+
+
+@pytest.mark.parametrize("lower, higher", [
+    ("1.0", "1.1"),
+    ("1.0~rc1", "1.0"),
+    ("1.0~~", "1.0~"),
+    ("1.0", "1.0+deb12u1"),
+    ("1.0", "1.0.0"),
+    ("1.0-1", "1.0-2"),
+    ("1.0-9", "1.0-10"),
+    ("2.0", "1:0.1"),
+    ("1:1.0", "2:0.5"),
+    ("1.2a", "1.2b"),
+    ("1.2z", "1.2+"),
+    ("1.0-1", "1.0-1.1"),
+    ("1:2.0:3-1", "1:2.0:4-1"),
+    ("1:9.9-1", "2:1.0:3-1"),
+])
+def test_debian_ordering(lower, higher):
+    assert compare_versions(lower, higher) == -1
+    assert compare_versions(higher, lower) == 1
+
+
+@pytest.mark.parametrize("a, b", [("1.0", "1.0"), ("0:1.0", "1.0"), ("1.0-0", "1.0"), ("01", "1")])
+def test_equal_versions(a, b):
+    assert compare_versions(a, b) == 0
+
+
+def test_split_version():
+    assert split_version("2:1.4.3-2ubuntu1") == (2, "1.4.3", "2ubuntu1")
+    assert split_version("1.0-rc-1") == (0, "1.0-rc", "1")
+    assert split_version("1:2.0:3-1") == (1, "2.0:3", "1")
+
+
+def test_version_satisfies_operators():
+    assert version_satisfies("1.0", ">=", "1.0")
+    assert version_satisfies("1.0~beta", "<<", "1.0")
+    assert not version_satisfies("1.0", ">>", "1.0")
+    assert version_satisfies("1.0", None, None)
+    assert not version_satisfies(None, ">=", "1.0")
+
+
+def test_parse_relations():
+    groups = parse_relations("libc6 (>= 2.34), bash | dash, foo:any (<< 2~)")
+    assert [[(r.name, r.op, r.version) for r in group] for group in groups] == [
+        [("libc6", ">=", "2.34")], [("bash", None, None), ("dash", None, None)], [("foo", "<<", "2~")]]
+    assert groups[2][0].arch == "any"
@@ -0,0 +1,22 @@
+import threading
+
+from setdeb_cli import HeadlessWorker
+
+
+def test_released_signals_can_be_emitted_from_their_slots():
+    worker = HeadlessWorker()
+    worker.hold_signals()
+    worker.analysisComplete.emit(True, "done")
+    seen = []
+    worker.prefetchStatus.connect(lambda *args: seen.append(("prefetch", args)))
+    # As the wizard does: the slot of a replayed signal starts more work that emits
+    worker.analysisComplete.connect(lambda *args: (seen.append(("complete", args)),
+                                                    worker.prefetchStatus.emit("started", {})))
+    releasing = threading.Thread(target=worker.release_signals, daemon=True)
+    releasing.start()
+    releasing.join(5)
+    assert not releasing.is_alive(), "release_signals deadlocked"
+    assert seen == [("complete", (True, "done")), ("prefetch", ("started", {}))]
+    assert not worker.signals_held()
+    worker.analysisComplete.emit(False, "again")
+    assert seen[-2:] == [("complete", (False, "again")), ("prefetch", ("started", {}))]